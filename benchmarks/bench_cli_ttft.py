@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time-to-first-token for Gemini CLI turns, cold vs warm pool.
+
+By default runs against tests/stub_gemini_cli.py with a simulated startup
+cost (--startup, seconds). Pass --cmd to measure the real CLI instead (this
+sends real prompts). Turns are spaced by --gap so the pool can refill, as
+it would between messages in a real conversation.
+
+Usage:
+    python3 benchmarks/bench_cli_ttft.py [--turns 10] [--startup 0.8] [--gap 1.5] [--cmd gemini]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+_TMP = tempfile.mkdtemp(prefix="bench_ttft_")
+os.environ["GEMINI_DB_PATH"] = os.path.join(_TMP, "gemini.db")
+
+from src.app import runner  # noqa: E402
+from src.app.cli_pool import GeminiCliPool  # noqa: E402
+
+runner.GEMINI_TRACES_DIR = os.path.join(_TMP, "traces")
+runner.GEMINI_RESPONSES_LOG = os.path.join(_TMP, "gemini_responses.log")
+STUB_CLI = os.path.join(REPO_ROOT, "tests", "stub_gemini_cli.py")
+
+
+async def one_turn(cmd, pool, i):
+    env = dict(os.environ, DISCORD_CONTEXT_ID=f"bench-{i}", DISCORD_TURN_START_TS=str(time.time()))
+    start = time.perf_counter()
+    ttft = None
+    async for event in runner.call_gemini_cli(
+        "Reply with the single word: pong", f"bench-{i}", gemini_cmd=cmd, env=env, cli_pool=pool,
+    ):
+        if event.type == "text" and ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+async def run(cmd, turns, gap, use_pool):
+    pool = None
+    if use_pool:
+        pool = GeminiCliPool(cmd, size=1, session_slots=0, traces_dir=runner.GEMINI_TRACES_DIR,
+                             pool_dir=os.path.join(_TMP, "pool"))
+        await pool.start()
+        await asyncio.sleep(gap)
+    ttfts = []
+    for i in range(turns):
+        ttfts.append(await one_turn(cmd, pool, i))
+        await asyncio.sleep(gap)
+    if pool:
+        await pool.close()
+    return [t for t in ttfts if t is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--startup", type=float, default=0.8, help="simulated CLI startup for the stub")
+    parser.add_argument("--gap", type=float, default=1.5)
+    parser.add_argument("--cmd", default=None, help="real CLI to measure instead of the stub")
+    args = parser.parse_args()
+
+    cmd = args.cmd or STUB_CLI
+    if not args.cmd:
+        os.environ["STUB_GEMINI_STARTUP_S"] = str(args.startup)
+    os.makedirs(runner.GEMINI_TRACES_DIR, exist_ok=True)
+
+    for label, use_pool in (("cold", False), ("warm pool", True)):
+        ttfts = asyncio.run(run(cmd, args.turns, args.gap, use_pool))
+        print(f"{label:>9}: TTFT p50={statistics.median(ttfts) * 1000:7.1f}ms "
+              f"max={max(ttfts) * 1000:7.1f}ms over {len(ttfts)} turns")
+
+
+if __name__ == "__main__":
+    main()
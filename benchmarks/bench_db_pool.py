@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: queries/sec for the hot queries, with the pooled get_db()
+versus the old connect-per-query behaviour.
+
+Usage:
+    python3 benchmarks/bench_db_pool.py [--iterations 2000]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+os.environ["GEMINI_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_db_pool_"), "gemini.db")
+
+from src.db import database, queries  # noqa: E402
+
+database.migrate()
+
+
+@contextlib.contextmanager
+def legacy_get_db():
+    """The pre-pool behaviour: open, set PRAGMAs, run, close."""
+    conn = database.get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def seed():
+    ctx = queries.create_context(reply_channel_id=1, reply_thread_id=2)
+    for i in range(200):
+        msg = queries.insert_message("bench", f"seed {i}", "user" if i % 2 else "bot", channel_id=1, thread_id=2)
+        queries.add_message_to_context(ctx, msg["id"])
+    return ctx
+
+
+def hot_queries(ctx):
+    return {
+        "find_context_by_reply_thread": lambda: queries.find_context_by_reply_thread(2),
+        "get_latest_user_message_for_context": lambda: queries.get_latest_user_message_for_context(ctx),
+        "get_undelivered_bot_messages": queries.get_undelivered_bot_messages,
+        "get_context": lambda: queries.get_context(ctx),
+        "insert_message": lambda: queries.insert_message("bench", "x", "user", channel_id=1),
+    }
+
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    ctx = seed()
+    print(f"{'query':<38} {'legacy q/s':>12} {'pooled q/s':>12} {'speedup':>8}")
+    for name, fn in hot_queries(ctx).items():
+        queries.get_db = legacy_get_db
+        legacy = measure(fn, args.iterations)
+        queries.get_db = database.get_db
+        pooled = measure(fn, args.iterations)
+        print(f"{name:<38} {legacy:>12.0f} {pooled:>12.0f} {pooled / legacy:>7.1f}x")
+    print(f"connections opened by pool: {database.get_pool().opened}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: import-to-first-query time of the helper tools.
+
+Builds a database of --rows messages, then starts --runs fresh Python
+processes per mode. Each one times from importing src.db.queries to the
+first query returning. That query is get_new_messages.py's context read, or
+send_message.py's outbox insert:
+
+    legacy   every schema step on import, as init_db() did before user_version
+    ensure   ensure_schema() first (send_message.py): one PRAGMA read
+    none     no schema work at all (get_new_messages.py)
+
+Reports the median and p90 in ms, and the median whole-process time
+(interpreter start to exit).
+
+Usage:
+    python3 benchmarks/bench_helper_startup.py [--rows 100000] [--runs 30]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+TMP_DIR = tempfile.mkdtemp(prefix="bench_helper_startup_")
+os.environ["GEMINI_DB_PATH"] = os.path.join(TMP_DIR, "gemini.db")
+
+from src.db.database import get_db, migrate  # noqa: E402
+from src.db.ids import new_id  # noqa: E402
+
+migrate()
+
+DRIVER = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from src.db import queries
+from src.db.database import MIGRATIONS, ensure_schema, get_db
+if {mode!r} == "legacy":
+    with get_db() as conn:
+        for step in MIGRATIONS:
+            step(conn)
+elif {mode!r} == "ensure":
+    ensure_schema()
+if {query!r} == "read":
+    queries.get_messages_for_context({context_id!r}, limit=100)
+else:
+    queries.insert_message("bench", "hello", "bot", delivered=True)
+print(time.perf_counter() - start)
+"""
+
+MODES = (
+    ("get_new_messages", "read", ("legacy", "none")),
+    ("send_message", "write", ("legacy", "ensure")),
+)
+
+
+def build(rows, per_context=200):
+    with get_db() as conn:
+        contexts = []
+        for start in range(0, rows, 10000):
+            messages, links = [], []
+            for i in range(start, min(rows, start + 10000)):
+                ts = 1.7e9 + i
+                if i % per_context == 0:
+                    contexts.append(new_id(ts))
+                    conn.execute("INSERT INTO contexts (id, created_at, updated_at) VALUES (?, ?, ?)",
+                                 (contexts[-1], ts, ts))
+                msg_id = new_id(ts)
+                user = i % 2 == 0
+                messages.append((msg_id, "alice" if user else "gemini", f"message {i}", "user" if user else "bot",
+                                 ts, 1, ts, "sent"))
+                links.append((contexts[-1], msg_id, ts, ts))
+            conn.executemany(
+                "INSERT INTO messages (id, author, content, source, timestamp, delivered, delivered_at, delivery_status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                messages,
+            )
+            conn.executemany("INSERT INTO context_messages VALUES (?, ?, ?, ?)", links)
+    with get_db() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return contexts[-1]
+
+
+def run(mode, query, context_id, runs):
+    code = DRIVER.format(root=REPO_ROOT, mode=mode, query=query, context_id=context_id)
+    inner, outer = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        outer.append(time.perf_counter() - start)
+        inner.append(float(out.strip().splitlines()[-1]))
+    return inner, outer
+
+
+def ms(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.9) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    context_id = build(args.rows)
+    print(f"{args.rows:,} messages, {args.runs} processes per mode")
+    print(f"{'tool':>17} {'mode':>7} {'import->query p50':>18} {'p90':>8} {'process p50':>12}")
+    for tool, query, modes in MODES:
+        for mode in modes:
+            inner, outer = run(mode, query, context_id, args.runs)
+            p50, p90 = ms(inner)
+            print(f"{tool:>17} {mode:>7} {p50:>18.1f} {p90:>8.1f} {ms(outer)[0]:>12.1f}")
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ingest throughput for a burst of inbound user messages.
+
+Compares the old handle_message sequence (insert, route, maybe create,
+link, plus a silent insert + link for unprocessed messages: up to six
+transactions) against queries.ingest_user_message (one transaction).
+
+Usage:
+    python3 benchmarks/bench_ingest.py [--messages 10000] [--channels 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+os.environ["GEMINI_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_ingest_"), "gemini.db")
+
+from src.db import queries  # noqa: E402
+from src.db.database import migrate  # noqa: E402
+
+migrate()
+
+
+def legacy_ingest(content, channel_id, trigger):
+    msg = queries.insert_message("bench", content, "user", timestamp=time.time(), channel_id=channel_id)
+    ctx = queries.find_active_context_by_channel(channel_id)
+    if not ctx:
+        ctx = queries.create_context(reply_channel_id=channel_id)
+    queries.add_message_to_context(ctx, msg["id"])
+    if not trigger:
+        silent = queries.insert_message("system", "", "bot", timestamp=time.time(), channel_id=channel_id,
+                                        delivered=True, delivered_at=time.time())
+        queries.add_message_to_context(ctx, silent["id"])
+
+
+def new_ingest(content, channel_id, trigger):
+    queries.ingest_user_message("bench", content, timestamp=time.time(), channel_id=channel_id, trigger=trigger)
+
+
+def run(label, fn, messages, channels, channel_base):
+    start = time.perf_counter()
+    for i in range(messages):
+        # Every other message is untriggered chatter, which costs the extra silent insert.
+        fn(f"burst message {i}", channel_base + i % channels, i % 2 == 0)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>7}: {messages} msgs in {elapsed:.2f}s = {messages / elapsed:,.0f} msgs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--channels", type=int, default=50)
+    args = parser.parse_args()
+
+    run("legacy", legacy_ingest, args.messages, args.channels, 100_000)
+    run("ingest", new_ingest, args.messages, args.channels, 200_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop time spent logging stream-json events.
+
+Compares, per 1000 events, the old synchronous open/append/close of
+gemini_responses.log against LogSink.write(), which only enqueues. Runs
+with N concurrent "turns" on one loop, and reports how long the sink's
+background thread then needs to get everything to disk.
+
+Usage:
+    python3 benchmarks/bench_log_sink.py [--events 20000] [--turns 4] [--event-bytes 300]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+
+from src.app.log_sink import LogSink  # noqa: E402
+
+
+async def run_turns(log_line, events, turns, payload):
+    busy = 0.0
+
+    async def turn(t):
+        nonlocal busy
+        for i in range(events // turns):
+            start = time.perf_counter()
+            log_line(f"[{time.ctime()}] [Ctx: turn-{t}] {payload}\n")
+            busy += time.perf_counter() - start
+            if i % 50 == 0:
+                await asyncio.sleep(0)
+
+    await asyncio.gather(*(turn(t) for t in range(turns)))
+    return busy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--event-bytes", type=int, default=300)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_log_sink_")
+    payload = '{"type": "message", "content": "' + "x" * args.event_bytes + '"}'
+    per_k = 1000 / args.events
+
+    legacy_path = os.path.join(tmp, "legacy.log")
+
+    def legacy(line):
+        try:
+            with open(legacy_path, "a") as f:
+                f.write(line)
+        except Exception:
+            pass
+
+    legacy_busy = asyncio.run(run_turns(legacy, args.events, args.turns, payload))
+
+    sink = LogSink(os.path.join(tmp, "sink.log"), queue_size=max(args.events, 1))
+    sink_busy = asyncio.run(run_turns(sink.write, args.events, args.turns, payload))
+    start = time.perf_counter()
+    sink.flush(timeout=60)
+    drain_s = time.perf_counter() - start
+    sink.close()
+
+    print(f"{args.events} events over {args.turns} concurrent turns, {len(payload)} B each")
+    print(f"  open/append/close on loop: {legacy_busy * 1000 * per_k:8.2f}ms loop time per 1000 events")
+    print(f"  LogSink.write on loop:     {sink_busy * 1000 * per_k:8.2f}ms loop time per 1000 events")
+    print(f"  saved per 1000 events:     {(legacy_busy - sink_busy) * 1000 * per_k:8.2f}ms")
+    print(f"  sink drain after last write: {drain_s * 1000:.1f}ms, stats {sink.stats()}")
+
+
+if __name__ == "__main__":
+    main()
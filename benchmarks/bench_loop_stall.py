@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: how long does the event loop stall while messages are ingested?
+
+Runs the handle_message DB sequence (insert, route, link) from many
+concurrent coroutines, first calling src.db.queries directly on the loop
+(the old behaviour) and then through src.db.async_queries. A probe task
+ticks every 1ms and records how late each tick fires.
+
+Usage:
+    python3 benchmarks/bench_loop_stall.py [--writers 10] [--messages 100]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+os.environ["GEMINI_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_loop_stall_"), "gemini.db")
+
+from src.db import queries, async_queries  # noqa: E402
+from src.db.database import migrate  # noqa: E402
+
+migrate()
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def ingest_sync(channel_id, count):
+    for i in range(count):
+        msg = queries.insert_message("bench", f"message {i}", "user", channel_id=channel_id)
+        ctx = queries.find_active_context_by_channel(channel_id) or queries.create_context(reply_channel_id=channel_id)
+        queries.add_message_to_context(ctx, msg["id"])
+        await asyncio.sleep(0)
+
+
+async def ingest_async(channel_id, count):
+    for i in range(count):
+        msg = await async_queries.insert_message("bench", f"message {i}", "user", channel_id=channel_id)
+        ctx = (await async_queries.find_active_context_by_channel(channel_id)
+               or await async_queries.create_context(reply_channel_id=channel_id))
+        await async_queries.add_message_to_context(ctx, msg["id"])
+
+
+async def run(label, ingest, writers, messages, channel_base):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(ingest(channel_base + w, messages) for w in range(writers)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(f"{label:>6}: {writers * messages} msgs in {elapsed:.2f}s | "
+          f"ticks={len(lags)} mean_lag={statistics.mean(lags) * 1000:.2f}ms "
+          f"p99_lag={p99 * 1000:.2f}ms max_lag={lags[-1] * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"DB: {os.environ['GEMINI_DB_PATH']}")
+    asyncio.run(run("sync", ingest_sync, args.writers, args.messages, 10_000))
+    asyncio.run(run("async", ingest_async, args.writers, args.messages, 20_000))
+    async_queries.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark: uuid4 vs UUIDv7 message and context keys.
+
+Appends --rows messages to two copies of the schema, keyed by uuid4() (the
+old layout) and by new_id(), in transactions of --batch messages spread
+over --active concurrently active contexts, the way the bot writes them
+(messages row + context_messages link). After each transaction it
+checkpoints the WAL and counts the pages that transaction wrote, so the
+"pages/msg" column is the write amplification. It then reports the file
+size, free pages, a full scan of messages in key order, and a context's
+latest page. With --rekey it also times bin/rekey_messages.py's batches
+over the uuid4 copy, and VACUUMs it.
+
+Usage:
+    python3 benchmarks/bench_message_keys.py [--rows 1000000] [--batch 100] [--active 50] [--rekey]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+TMP_DIR = tempfile.mkdtemp(prefix="bench_keys_")
+os.environ["GEMINI_DB_PATH"] = os.path.join(TMP_DIR, "schema.db")
+
+from src.db.database import migrate, rekey_message_batch  # noqa: E402
+from src.db.ids import new_id  # noqa: E402
+from src.db.queries import MESSAGE_COLUMNS, _M_MESSAGE_COLUMNS  # noqa: E402
+
+migrate()
+
+WORDS = ("the build failed again last night can you check logs deploy test branch merge please "
+         "thanks looks good what about this one error timeout retry").split()
+
+CONTEXT_PAGE_SQL = f"""
+    SELECT {_M_MESSAGE_COLUMNS} FROM messages m JOIN context_messages cm ON cm.message_id = m.id
+    WHERE cm.context_id = ? ORDER BY m.timestamp DESC LIMIT 50
+"""
+
+
+def legacy_id(timestamp=None):
+    return str(uuid.uuid4())
+
+
+def copy_schema(name):
+    path = os.path.join(TMP_DIR, f"{name}.db")
+    src = sqlite3.connect(os.environ["GEMINI_DB_PATH"])
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+    dst.execute("PRAGMA journal_mode=WAL")
+    dst.execute("PRAGMA wal_autocheckpoint=0")
+    return path, dst
+
+
+def build(name, make_id, rows, batch, active, seed=4):
+    path, conn = copy_schema(name)
+    rng = random.Random(seed)
+    contexts = []
+    live = []
+    pages = 0
+    tail_pages = tail_rows = 0
+    tail_start = rows - rows // 10
+    insert_s = tail_s = 0.0
+    ts = 1.7e9
+    for start in range(0, rows, batch):
+        ctx_rows, messages, links = [], [], []
+        for i in range(start, min(rows, start + batch)):
+            ts += 0.5
+            if len(live) < active or rng.random() < 0.005:
+                ctx = make_id()
+                ctx_rows.append((ctx, ts, ts))
+                contexts.append(ctx)
+                if len(live) < active:
+                    live.append(ctx)
+                else:
+                    live[rng.randrange(active)] = ctx
+            ctx = live[rng.randrange(len(live))]
+            msg_id = make_id(ts)
+            user = i % 2 == 0
+            messages.append((msg_id, "alice" if user else "gemini", " ".join(rng.choices(WORDS, k=rng.randint(5, 60))),
+                             "user" if user else "bot", ts, 5000, None, 1, ts, "sent", None, 0, None,
+                             1290000000000000000 + i if user else None, 0))
+            links.append((ctx, msg_id, ts, ts))
+        began = time.perf_counter()
+        with conn:
+            conn.executemany("INSERT INTO contexts (id, created_at, updated_at) VALUES (?, ?, ?)", ctx_rows)
+            conn.executemany(f"INSERT INTO messages ({MESSAGE_COLUMNS}) VALUES ({', '.join('?' * len(messages[0]))})",
+                             messages)
+            conn.executemany("INSERT INTO context_messages VALUES (?, ?, ?, ?)", links)
+        elapsed = time.perf_counter() - began
+        written = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()[1]
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        insert_s += elapsed
+        pages += written
+        if start >= tail_start:
+            tail_s += elapsed
+            tail_pages += written
+            tail_rows += len(messages)
+    conn.close()
+    return path, contexts, {
+        "insert_s": insert_s, "pages": pages, "tail_s": tail_s, "tail_pages": tail_pages, "tail_rows": tail_rows,
+    }
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, path, contexts, stats, rows):
+    conn = sqlite3.connect(path)
+    file_mb = os.path.getsize(path) / 1e6
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    scan = timed(lambda: conn.execute("SELECT id, timestamp FROM messages ORDER BY id").fetchall(), repeat=2)
+    sample = random.Random(5).sample(contexts, min(2000, len(contexts)))
+    page = timed(lambda: [conn.execute(CONTEXT_PAGE_SQL, (c,)).fetchall() for c in sample])
+    print(f"{name:>6} {rows / stats['insert_s']:>10,.0f} {stats['tail_rows'] / stats['tail_s']:>12,.0f} "
+          f"{stats['pages'] / rows:>10.3f} {stats['tail_pages'] / stats['tail_rows']:>13.3f} {file_mb:>8.1f} "
+          f"{free:>6} {scan:>11.2f} {page * 1000 / len(sample):>12.3f}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=100, help="messages per transaction")
+    parser.add_argument("--active", type=int, default=50, help="contexts receiving messages at once")
+    parser.add_argument("--rekey", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'keys':>6} {'insert/s':>10} {'last10% /s':>12} {'pages/msg':>10} {'last10% pg/m':>13} "
+          f"{'file MB':>8} {'free':>6} {'scan by id':>11} {'ctx page ms':>12}")
+    built = {}
+    for name, make_id in (("uuid4", legacy_id), ("uuid7", new_id)):
+        path, contexts, stats = build(name, make_id, args.rows, args.batch, args.active)
+        built[name] = (path, contexts)
+        report(name, path, contexts, stats, args.rows)
+
+    if args.rekey:
+        path, contexts = built["uuid4"]
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        rowid = rekeyed = 0
+        start = time.perf_counter()
+        while True:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                next_rowid, _, moved = rekey_message_batch(conn, rowid, 500)
+            if next_rowid == rowid:
+                break
+            rowid, rekeyed = next_rowid, rekeyed + moved
+        rekey_s = time.perf_counter() - start
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_before = os.path.getsize(path) / 1e6
+        start = time.perf_counter()
+        conn.execute("VACUUM")
+        vacuum_s = time.perf_counter() - start
+        conn.close()
+        print(f"rekeyed {rekeyed:,} messages in {rekey_s:.1f}s ({rekeyed / rekey_s:,.0f}/s, 500 per transaction); "
+              f"{size_before:.1f} MB after, VACUUM {vacuum_s:.1f}s")
+        report("rekeyd", path, contexts, {"insert_s": float("nan"), "pages": float("nan"), "tail_s": float("nan"),
+                                          "tail_pages": float("nan"), "tail_rows": 1}, args.rows)
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
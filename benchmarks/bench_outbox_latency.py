@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark: outbox delivery latency and idle DB load.
+
+Runs the real outbox_watcher against a fake Discord client in three modes:
+  polling  - wakeups disabled, 1s poll (the old idle behaviour)
+  event    - in-process wakeups from insert_message
+  socket   - wakeups over the Unix socket, as scripts/send_message.py does
+
+For each mode it measures p50/p99 insert-to-send latency for a stream of
+bot messages, then counts outbox queries during an idle period.
+
+Usage:
+    python3 benchmarks/bench_outbox_latency.py [--messages 50] [--idle 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+_TMP = tempfile.mkdtemp(prefix="bench_outbox_")
+os.environ["GEMINI_DB_PATH"] = os.path.join(_TMP, "gemini.db")
+os.environ["GEMINI_OUTBOX_SOCKET"] = os.path.join(_TMP, "outbox.sock")
+
+from src.app import workers  # noqa: E402
+from src.app.resolver import DiscordResolver  # noqa: E402
+from src.db import queries  # noqa: E402
+from src.db.database import migrate  # noqa: E402
+
+migrate()
+
+
+class FakeTarget:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content):
+        self.sent.append((content, time.time()))
+
+
+class FakeClient:
+    def __init__(self):
+        self.target = FakeTarget()
+        self.closed = False
+        self.resolver = DiscordResolver(self)
+
+    async def wait_until_ready(self):
+        return None
+
+    def is_closed(self):
+        return self.closed
+
+    def get_channel(self, _id):
+        return self.target
+
+    def get_user(self, _id):
+        return self.target
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * pct) - 1)]
+
+
+async def run_mode(mode, messages, idle_s):
+    client = FakeClient()
+    query_count = 0
+    real_query = workers.get_undelivered_bot_messages
+
+    async def counting_query():
+        nonlocal query_count
+        query_count += 1
+        return await real_query()
+
+    no_listener = lambda callback: None  # noqa: E731
+
+    async def no_socket(callback, path=None):
+        return None
+
+    patches = {"get_undelivered_bot_messages": counting_query}
+    if mode == "polling":
+        patches.update(add_outbox_listener=no_listener, serve_outbox_socket=no_socket,
+                       OUTBOX_SAFETY_POLL_INTERVAL=1.0)
+    elif mode == "socket":
+        patches.update(add_outbox_listener=no_listener)
+    saved = {name: getattr(workers, name) for name in patches}
+    for name, value in patches.items():
+        setattr(workers, name, value)
+
+    try:
+        watcher = asyncio.create_task(workers.outbox_watcher(client, ["1"]))
+        await asyncio.sleep(0.2)
+
+        loop = asyncio.get_running_loop()
+        inserted = {}
+        for i in range(messages):
+            await asyncio.sleep(random.uniform(0.0, 0.2))
+            content = f"{mode}-{i}"
+            # Write from another thread, as the DB writer thread / another process would.
+            await loop.run_in_executor(None, lambda c=content: queries.insert_message("bench", c, "bot", channel_id=1))
+            inserted[content] = time.time()
+
+        deadline = time.time() + 5
+        while len(client.target.sent) < messages and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        latencies = [sent_at - inserted[content] for content, sent_at in client.target.sent if content in inserted]
+
+        query_count = 0
+        await asyncio.sleep(idle_s)
+        idle_queries = query_count
+
+        client.closed = True
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+    finally:
+        for name, value in saved.items():
+            setattr(workers, name, value)
+
+    print(f"{mode:>8}: delivered {len(latencies)}/{messages} | "
+          f"p50={percentile(latencies, 0.50) * 1000:7.1f}ms p99={percentile(latencies, 0.99) * 1000:7.1f}ms | "
+          f"idle queries: {idle_queries} in {idle_s:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--idle", type=float, default=5.0)
+    args = parser.parse_args()
+
+    for mode in ("polling", "event", "socket"):
+        asyncio.run(run_mode(mode, args.messages, args.idle))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: paging replies into Discord messages.
+
+Builds markdown replies of each --sizes KB (prose, lists and code blocks)
+and pages them with the old outbox chunker (1900 chars, rfind("\\n") and
+re-slicing the remainder) and with paginate(). For each it reports the
+throughput, the number of messages, and how many of them split a code block
+without closing it. plan_pages() REST calls include the attachment fallback.
+
+Usage:
+    python3 benchmarks/bench_paginator.py [--sizes 10,100,1000,5000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+
+from src.app.paginator import open_fence, paginate, plan_pages  # noqa: E402
+
+
+def legacy_chunk_for_discord(content, limit=1900):
+    chunks = []
+    remaining = (content or "").strip()
+    while len(remaining) > limit:
+        split_at = remaining.rfind("\n", 0, limit)
+        if split_at < 0:
+            split_at = limit
+        chunks.append(remaining[:split_at].rstrip())
+        remaining = remaining[split_at:].lstrip("\n")
+    if remaining:
+        chunks.append(remaining)
+    return chunks
+
+
+def make_reply(size, seed=11):
+    rng = random.Random(seed)
+    words = ["the", "reply", "model", "discord", "message", "page", "fence", "code", "list", "item"]
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.15:
+            body = "\n".join(f"    value_{i} = compute({i}, {rng.randint(0, 999)})" for i in range(rng.randint(5, 80)))
+            part = f"```python\n{body}\n```"
+        elif roll < 0.35:
+            part = "\n".join(f"- {' '.join(rng.choices(words, k=rng.randint(3, 15)))}" for _ in range(rng.randint(2, 8)))
+        else:
+            part = " ".join(rng.choices(words, k=rng.randint(10, 120)))
+        parts.append(part)
+        length += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def broken_fences(pages):
+    return sum(1 for page in pages if open_fence(page) is not None)
+
+
+def timed(fn, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="reply sizes in KB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size KB':>8} {'legacy MB/s':>12} {'msgs':>6} {'broken':>7} "
+          f"{'paginate MB/s':>14} {'msgs':>6} {'broken':>7} {'plan_pages calls':>17}")
+    for kb in (int(s) for s in args.sizes.split(",")):
+        text = make_reply(kb * 1024)
+        mb = len(text) / (1024 * 1024)
+        old, old_s = timed(legacy_chunk_for_discord, text, args.repeat)
+        new, new_s = timed(paginate, text, args.repeat)
+        planned = plan_pages(text)
+        print(f"{kb:>8} {mb / old_s:>12.1f} {len(old):>6} {broken_fences(old):>7} "
+              f"{mb / new_s:>14.1f} {len(new):>6} {broken_fences(new):>7} {len(planned):>17}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Benchmark: storing raw Discord payloads inline vs in message_payloads.
+
+Builds two copies of a synthetic message log of --rows messages (half user
+messages with a payload, half bot replies without one; --per-context
+messages per context). The "inline" copy keeps the old layout: json.dumps()
+text in messages.raw_discord_payload, read back by SELECT *. The "side"
+copy stores the zlib+dictionary payloads in message_payloads, and its
+queries list their columns. The benchmark reports each copy's file size,
+a full scan of messages, the context queries, and the encode/decode cost
+per payload. With --migrate it also times migrate_inline_payloads() on the
+inline copy.
+
+Usage:
+    python3 benchmarks/bench_payload_storage.py [--rows 1000000] [--per-context 200] [--migrate]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+TMP_DIR = tempfile.mkdtemp(prefix="bench_payloads_")
+os.environ["GEMINI_DB_PATH"] = os.path.join(TMP_DIR, "side.db")
+
+from src.db.database import migrate, migrate_inline_payloads  # noqa: E402
+from src.db.payloads import Payload  # noqa: E402
+from src.db.queries import MESSAGE_COLUMNS, _M_MESSAGE_COLUMNS  # noqa: E402
+
+migrate()
+
+WORDS = ("the build failed again last night can you check logs deploy test branch merge please "
+         "thanks looks good what about this one error timeout retry").split()
+
+
+def make_payload(rng, i, channel_id):
+    content = " ".join(rng.choices(WORDS, k=rng.randint(3, 60)))
+    payload = {
+        "id": str(1290000000000000000 + i),
+        "channel_id": str(channel_id),
+        "author": {"id": str(1100000000000000000 + rng.randint(0, 20)), "username": f"user{rng.randint(0, 20)}",
+                   "bot": False},
+        "content": content,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000000+00:00", time.gmtime(1.7e9 + i)),
+        "type": "MessageType.default",
+    }
+    if rng.random() < 0.2:
+        payload["mentions"] = [{"id": "1000000000000000001", "username": "gemini-bot"}]
+    if rng.random() < 0.1:
+        payload["message_reference"] = {"message_id": str(1290000000000000000 + i - 1),
+                                        "channel_id": str(channel_id), "guild_id": None}
+    if rng.random() < 0.05:
+        payload["attachments"] = [{"id": str(1300000000000000000 + i), "filename": "screenshot.png",
+                                   "url": f"https://cdn.discordapp.com/attachments/{channel_id}/{i}/screenshot.png",
+                                   "content_type": "image/png"}]
+    if rng.random() < 0.02:
+        payload["embeds"] = [{"type": "rich", "title": "Build #%d" % i, "description": content,
+                              "url": "https://ci.example.com/builds/%d" % i, "color": 15158332}]
+    payload["pinned"] = False
+    payload["tts"] = False
+    return payload
+
+
+def build(rows, per_context, seed=3):
+    side = sqlite3.connect(os.environ["GEMINI_DB_PATH"])
+    inline_path = os.path.join(TMP_DIR, "inline.db")
+    inline = sqlite3.connect(inline_path)
+    side.backup(inline)
+    inline.execute("ALTER TABLE messages ADD COLUMN raw_discord_payload TEXT")
+    rng = random.Random(seed)
+    batch = 10000
+    contexts = []
+    for start in range(0, rows, batch):
+        messages, links, payloads, inline_rows, ctx_rows = [], [], [], [], []
+        for i in range(start, min(rows, start + batch)):
+            if i % per_context == 0:
+                ctx = str(uuid.uuid4())
+                contexts.append(ctx)
+                ctx_rows.append((ctx, 1.7e9 + i, 1.7e9 + i))
+            msg_id = str(uuid.uuid4())
+            user = i % 2 == 0
+            channel_id = 5000 + len(contexts)
+            payload = make_payload(rng, i, channel_id) if user else None
+            content = payload["content"] if user else " ".join(rng.choices(WORDS, k=rng.randint(5, 120)))
+            row = (msg_id, "alice" if user else "gemini", content, "user" if user else "bot", 1.7e9 + i,
+                   channel_id, None, 1, 1.7e9 + i, "sent", None, 0, None, int(payload["id"]) if user else None, 0)
+            messages.append(row)
+            inline_rows.append(row + (json.dumps(payload) if payload else None,))
+            links.append((contexts[-1], msg_id, 1.7e9 + i, 1.7e9 + i))
+            if payload:
+                p = Payload.encode(payload)
+                payloads.append((msg_id, p.codec, p.data, p.raw_bytes))
+        for conn in (side, inline):
+            conn.executemany("INSERT INTO contexts (id, created_at, updated_at) VALUES (?, ?, ?)", ctx_rows)
+            conn.executemany("INSERT INTO context_messages VALUES (?, ?, ?, ?)", links)
+        side.executemany(f"INSERT INTO messages ({MESSAGE_COLUMNS}) VALUES ({', '.join('?' * len(messages[0]))})", messages)
+        side.executemany("INSERT INTO message_payloads VALUES (?, ?, ?, ?)", payloads)
+        inline.executemany(f"INSERT INTO messages ({MESSAGE_COLUMNS}, raw_discord_payload) "
+                           f"VALUES ({', '.join('?' * len(inline_rows[0]))})", inline_rows)
+        side.commit()
+        inline.commit()
+    for conn in (side, inline):
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+    return inline_path, os.environ["GEMINI_DB_PATH"], contexts
+
+
+def table_bytes(conn, table):
+    try:
+        return conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (table,)).fetchone()[0] or 0
+    except sqlite3.OperationalError:  # dbstat not compiled in
+        return None
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+LEGACY_CONTEXT_SQL = """
+    SELECT * FROM (
+        SELECT m.* FROM messages m JOIN context_messages cm ON cm.message_id = m.id
+        WHERE cm.context_id = ? ORDER BY m.timestamp DESC LIMIT 50
+    ) recent ORDER BY timestamp ASC
+"""
+CONTEXT_SQL = f"""
+    SELECT * FROM (
+        SELECT {_M_MESSAGE_COLUMNS} FROM messages m JOIN context_messages cm ON cm.message_id = m.id
+        WHERE cm.context_id = ? ORDER BY m.timestamp DESC LIMIT 50
+    ) recent ORDER BY timestamp ASC
+"""
+LEGACY_LATEST_SQL = """
+    SELECT m.* FROM messages m JOIN context_messages cm ON cm.message_id = m.id
+    WHERE cm.context_id = ? AND m.source = 'user' ORDER BY m.timestamp DESC LIMIT 1
+"""
+LATEST_SQL = f"""
+    SELECT {_M_MESSAGE_COLUMNS} FROM messages m JOIN context_messages cm ON cm.message_id = m.id
+    WHERE cm.context_id = ? AND m.source = 'user' ORDER BY m.timestamp DESC LIMIT 1
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--per-context", type=int, default=200)
+    parser.add_argument("--migrate", action="store_true")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    inline_path, side_path, contexts = build(args.rows, args.per_context)
+    print(f"built {args.rows:,} messages in {len(contexts):,} contexts in {time.perf_counter() - start:.1f}s")
+
+    sample = random.Random(5).sample(contexts, min(2000, len(contexts)))
+    layouts = (
+        ("inline", inline_path, "SELECT * FROM messages", LEGACY_CONTEXT_SQL, LEGACY_LATEST_SQL),
+        ("side", side_path, f"SELECT {MESSAGE_COLUMNS} FROM messages", CONTEXT_SQL, LATEST_SQL),
+    )
+    print(f"{'layout':>7} {'file MB':>8} {'messages MB':>12} {'payloads MB':>12} "
+          f"{'sql scan s':>11} {'full scan s':>12} {'ctx page ms':>12} {'latest ms':>10}")
+    for name, path, scan_sql, context_sql, latest_sql in layouts:
+        conn = sqlite3.connect(path)
+        file_mb = os.path.getsize(path) / 1e6
+        messages_mb = (table_bytes(conn, "messages") or 0) / 1e6
+        payloads_mb = (table_bytes(conn, "message_payloads") or 0) / 1e6
+        # Reading every messages page inside SQLite, then the same scan returning rows to Python.
+        sql_scan = timed(lambda: conn.execute("SELECT SUM(length(content)) FROM messages").fetchone(), repeat=2)
+        scan = timed(lambda: conn.execute(scan_sql).fetchall(), repeat=2)
+        page = timed(lambda: [conn.execute(context_sql, (c,)).fetchall() for c in sample])
+        latest = timed(lambda: [conn.execute(latest_sql, (c,)).fetchone() for c in sample])
+        print(f"{name:>7} {file_mb:>8.1f} {messages_mb:>12.1f} {payloads_mb:>12.1f} {sql_scan:>11.2f} {scan:>12.2f} "
+              f"{page * 1000 / len(sample):>12.3f} {latest * 1000 / len(sample):>10.3f}")
+        conn.close()
+
+    rng = random.Random(9)
+    samples = [make_payload(rng, i, 5000) for i in range(20000)]
+    dumps = timed(lambda: [json.dumps(p) for p in samples])
+    encoded = [Payload.encode(p) for p in samples]
+    encode = timed(lambda: [Payload.encode(p) for p in samples])
+    decode = timed(lambda: [Payload(p.codec, p.data, p.raw_bytes).value() for p in encoded])
+    raw = sum(len(json.dumps(p)) for p in samples) / len(samples)
+    packed = sum(len(p.data) for p in encoded) / len(encoded)
+    print(f"payload: {raw:.0f} B as json.dumps text, {packed:.0f} B stored; "
+          f"json.dumps {dumps * 1e6 / len(samples):.1f} µs, encode {encode * 1e6 / len(samples):.1f} µs, "
+          f"decode {decode * 1e6 / len(samples):.1f} µs")
+
+    if args.migrate:
+        conn = sqlite3.connect(inline_path)
+        conn.row_factory = sqlite3.Row
+        start = time.perf_counter()
+        with conn:
+            moved = migrate_inline_payloads(conn)
+        print(f"migrated {moved:,} inline payloads in {time.perf_counter() - start:.1f}s")
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pending-turn detection on a large synthetic DB.
+
+Builds N contexts with M messages each, then times the old correlated
+subquery against the denormalized contexts.last_message_* lookup that
+the pending_turns upgrade seeding uses, plus the one-off backfill migration.
+
+Usage:
+    python3 benchmarks/bench_pending_scan.py [--contexts 100000] [--messages-per-context 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+os.environ["GEMINI_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_pending_"), "gemini.db")
+
+from src.db.database import backfill_context_last_message, get_db, migrate  # noqa: E402
+
+migrate()
+
+LEGACY_QUERY = """
+    SELECT c.id
+    FROM contexts c
+    WHERE c.status = 'idle'
+      AND (
+          SELECT m.source
+          FROM context_messages cm
+          JOIN messages m ON cm.message_id = m.id
+          WHERE cm.context_id = c.id
+          ORDER BY m.timestamp DESC
+          LIMIT 1
+      ) = 'user'
+"""
+# What the turn finder ran once contexts tracked their last message (see idx_contexts_pending).
+PENDING_QUERY = "SELECT id FROM contexts WHERE status = 'idle' AND last_message_source = 'user'"
+
+
+def build(contexts, per_context):
+    now = time.time()
+    ctx_rows, msg_rows, link_rows = [], [], []
+    for c in range(contexts):
+        ctx_id = str(uuid.uuid4())
+        ctx_rows.append((ctx_id, c, now, now))
+        last = None
+        for i in range(per_context):
+            msg_id = str(uuid.uuid4())
+            source = "user" if i % 2 == 0 else "bot"
+            if i == per_context - 1:
+                # Every 100th context ends on a user message (a pending turn).
+                source = "user" if c % 100 == 0 else "bot"
+            ts = now + c * per_context + i
+            msg_rows.append((msg_id, "bench", f"message {i}", source, ts, c, 1, "sent" if source == "bot" else "pending"))
+            link_rows.append((ctx_id, msg_id, ts))
+            last = (msg_id, source, ts)
+        ctx_rows[-1] = ctx_rows[-1] + last
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT INTO contexts (id, reply_channel_id, status, created_at, updated_at,"
+            " last_message_id, last_message_source, last_message_ts) VALUES (?, ?, 'idle', ?, ?, ?, ?, ?)",
+            ctx_rows,
+        )
+        conn.executemany(
+            "INSERT INTO messages (id, author, content, source, timestamp, channel_id, delivered, delivery_status)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            msg_rows,
+        )
+        conn.executemany("INSERT INTO context_messages (context_id, message_id, added_at) VALUES (?, ?, ?)", link_rows)
+        conn.execute("ANALYZE")
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contexts", type=int, default=100_000)
+    parser.add_argument("--messages-per-context", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build(args.contexts, args.messages_per_context)
+    print(f"built {args.contexts} contexts x {args.messages_per_context} msgs in {time.perf_counter() - start:.1f}s")
+
+    def legacy():
+        with get_db() as conn:
+            return [row["id"] for row in conn.execute(LEGACY_QUERY).fetchall()]
+
+    legacy_s, legacy_ids = timed(legacy)
+    def pending():
+        with get_db() as conn:
+            return [row["id"] for row in conn.execute(PENDING_QUERY).fetchall()]
+
+    new_s, new_ids = timed(pending, repeat=10)
+    assert sorted(legacy_ids) == sorted(new_ids), "denormalized state disagrees with history"
+    print(f"legacy correlated subquery: {legacy_s * 1000:9.1f}ms ({len(legacy_ids)} pending)")
+    print(f"last_message_source index:  {new_s * 1000:9.1f}ms ({len(new_ids)} pending)")
+
+    def backfill():
+        with get_db() as conn:
+            backfill_context_last_message(conn)
+
+    backfill_s, _ = timed(backfill, repeat=1)
+    print(f"one-off backfill migration: {backfill_s * 1000:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: build_prompt_text latency with a large prompts/components directory.
+
+Compares the old per-turn listdir + read of every component against the
+shared PromptComponentCache, both when the check interval absorbs the call
+(the common case) and when every call re-stats the directory
+(check_interval=0). History lookup is skipped so only prompt assembly is
+measured.
+
+Usage:
+    python3 benchmarks/bench_prompt_build.py [--files 50] [--file-bytes 2000] [--calls 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+os.environ["GEMINI_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_prompt_db_"), "gemini.db")
+
+from src.app import prompt_cache, runner  # noqa: E402
+from src.app.prompt_cache import PromptComponentCache  # noqa: E402
+from src.db.database import migrate  # noqa: E402
+
+migrate()
+
+
+def legacy_rules(components_dir):
+    system_rules = []
+    if os.path.exists(components_dir):
+        for filename in sorted(os.listdir(components_dir)):
+            if filename.endswith(".md"):
+                with open(os.path.join(components_dir, filename), "r") as f:
+                    system_rules.append(f.read().strip())
+    return "\n".join(system_rules)
+
+
+def measure(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--file-bytes", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    components_dir = tempfile.mkdtemp(prefix="bench_prompt_")
+    for i in range(args.files):
+        with open(os.path.join(components_dir, f"{i:03d}_rule.md"), "w") as f:
+            f.write(f"# Rule {i}\n" + "lorem ipsum " * (args.file_bytes // 12) + "\n")
+
+    message = {"content": "what's the weather like?", "timestamp": time.time()}
+    legacy_text = legacy_rules(components_dir)
+
+    def legacy_build():
+        rules = legacy_rules(components_dir)
+        return "\n".join([rules, "---", "turn", message["content"]])
+
+    prompt_cache.PROMPT_COMPONENTS_DIR = components_dir
+    cached_build = lambda: runner.build_prompt_text(message, "bench", ignore_history=True)  # noqa: E731
+    assert cached_build().startswith(legacy_text + "\n---\n")
+
+    print(f"{args.files} components x {args.file_bytes} bytes, {args.calls} calls (microseconds)")
+    print(f"{'variant':<34} {'mean':>9} {'p50':>9} {'p99':>9}")
+    print(f"{'legacy listdir + read':<34} " + " ".join(f"{v:9.1f}" for v in measure(legacy_build, args.calls)))
+    print(f"{'cached (check interval 1s)':<34} " + " ".join(f"{v:9.1f}" for v in measure(cached_build, args.calls)))
+    prompt_cache._default_cache = PromptComponentCache(components_dir, check_interval=0)
+    print(f"{'cached (re-stat every call)':<34} " + " ".join(f"{v:9.1f}" for v in measure(cached_build, args.calls)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: paging a large streamed reply into Discord messages.
+
+Replays a reply of --mb megabytes as text events of --event-bytes each
+(with a ---NEW_MESSAGE--- marker every --marker-every events). It compares
+the old sync_discord string handling (+= accumulators, `in`/split/strip on
+every event, recursion per split) against StreamingReplyBuffer. Discord
+calls are left out; only the text work per event is timed.
+
+Usage:
+    python3 benchmarks/bench_reply_buffer.py [--mb 5] [--event-bytes 40,1000,65536,1048576] [--marker-every 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+
+from src.app.reply_buffer import NEW_MESSAGE_MARKER, StreamingReplyBuffer  # noqa: E402
+
+
+def legacy(events):
+    reply_accumulator = ""
+    full_reply_accumulator = ""
+    pages = 0
+
+    def sync_discord():
+        nonlocal reply_accumulator, pages
+        if "---NEW_MESSAGE---" in reply_accumulator:
+            parts = reply_accumulator.split("---NEW_MESSAGE---", 1)
+            parts[0].strip()[:1800]
+            pages += 1
+            reply_accumulator = parts[1]
+            return sync_discord()
+        if len(reply_accumulator) > 1800:
+            split_at = reply_accumulator.rfind("\n", 1500, 1800)
+            if split_at == -1:
+                split_at = 1800
+            reply_accumulator[:split_at].strip()[:1800]
+            pages += 1
+            reply_accumulator = reply_accumulator[split_at:]
+            return sync_discord()
+        (reply_accumulator.strip() or "...")[:1800]
+
+    for chunk in events:
+        reply_accumulator += chunk
+        full_reply_accumulator += chunk
+        sync_discord()
+    full_reply_accumulator.replace("---NEW_MESSAGE---", "").strip()
+    return pages
+
+
+def buffered(events):
+    buffer = StreamingReplyBuffer()
+    pages = 0
+    for chunk in events:
+        pages += len(buffer.append(chunk))
+        (buffer.current() or "...")[:1800]
+    pages += len(buffer.finish())
+    buffer.text()
+    return pages
+
+
+def make_events(total_bytes, event_bytes, marker_every, seed=7):
+    rng = random.Random(seed)
+    events = []
+    size = 0
+    while size < total_bytes:
+        words = []
+        length = 0
+        while length < event_bytes:
+            word = "\n" if rng.random() < 0.05 else "w" * rng.randint(1, 10)
+            words.append(word)
+            length += len(word) + 1
+        chunk = " ".join(words)[:event_bytes]
+        if marker_every and len(events) % marker_every == marker_every - 1:
+            chunk += NEW_MESSAGE_MARKER
+        events.append(chunk)
+        size += len(chunk)
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=5)
+    parser.add_argument("--event-bytes", default="40,1000,65536,1048576")
+    parser.add_argument("--marker-every", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{args.mb:g} MB reply, marker every {args.marker_every} events")
+    print(f"{'event bytes':>11} {'events':>8} {'legacy ms':>10} {'buffer ms':>10} {'pages':>7}")
+    for event_bytes in (int(b) for b in args.event_bytes.split(",")):
+        events = make_events(int(args.mb * 1024 * 1024), event_bytes, args.marker_every)
+        start = time.perf_counter()
+        legacy_pages = legacy(events)
+        legacy_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        pages = buffered(events)
+        buffer_ms = (time.perf_counter() - start) * 1000
+        print(f"{event_bytes:>11} {len(events):>8} {legacy_ms:>10.1f} {buffer_ms:>10.1f} {pages:>7}"
+              + ("" if pages == legacy_pages else f"  (legacy: {legacy_pages})"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parsing multi-megabyte stream-json output from the Gemini CLI.
+
+Part 1 feeds a synthetic JSONL stream in 64 KiB reads through the old
+split-and-copy loop (json.loads + strip-compare echo check per message)
+and through JsonlScanner + PromptEchoFilter with each JSON backend.
+
+Part 2 runs call_gemini_cli end to end against tests/stub_gemini_cli.py
+emitting the same volume, and reports wall time.
+
+Usage:
+    python3 benchmarks/bench_stream_json.py [--events 50000] [--event-bytes 120] [--prompt-kb 40]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+sys.path.insert(0, REPO_ROOT)
+_TMP = tempfile.mkdtemp(prefix="bench_stream_json_")
+os.environ["GEMINI_DB_PATH"] = os.path.join(_TMP, "gemini.db")
+
+from src.app import runner, stream_json  # noqa: E402
+from src.app.stream_json import JsonlScanner, PromptEchoFilter  # noqa: E402
+
+runner.GEMINI_TRACES_DIR = os.path.join(_TMP, "traces")
+runner.GEMINI_RESPONSES_LOG = os.path.join(_TMP, "gemini_responses.log")
+STUB_CLI = os.path.join(REPO_ROOT, "tests", "stub_gemini_cli.py")
+READ_SIZE = 65536
+
+
+def make_stream(events, event_bytes, prompt):
+    lines = [json.dumps({"type": "message", "content": prompt, "metadata": {"role": "user"}})]
+    lines.extend(json.dumps({"type": "message", "content": "x" * event_bytes}) for _ in range(events))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def legacy_parse(stream, prompt):
+    buffer = bytearray()
+    count = 0
+    for start in range(0, len(stream), READ_SIZE):
+        buffer.extend(stream[start:start + READ_SIZE])
+        while b"\n" in buffer:
+            line_b, remaining = buffer.split(b"\n", 1)
+            buffer = bytearray(remaining)
+            line = line_b.decode("utf-8", errors="replace").strip()
+            event = json.loads(line)
+            if event.get("content", "").strip() == prompt.strip():
+                continue
+            count += 1
+    return count
+
+
+def scanner_parse(stream, prompt, loads):
+    scanner = JsonlScanner()
+    echo = PromptEchoFilter(prompt)
+    count = 0
+    for start in range(0, len(stream), READ_SIZE):
+        for line in scanner.feed(stream[start:start + READ_SIZE]):
+            event = loads(line.strip())
+            if echo.matches(event.get("content", "")):
+                continue
+            count += 1
+    return count
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+async def end_to_end(prompt):
+    events = 0
+    start = time.perf_counter()
+    async for event in runner.call_gemini_cli(prompt, "bench", gemini_cmd=STUB_CLI, env=dict(os.environ)):
+        events += event.type == "text"
+    return time.perf_counter() - start, events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--event-bytes", type=int, default=120)
+    parser.add_argument("--prompt-kb", type=int, default=40)
+    args = parser.parse_args()
+
+    prompt = ("rule line\n" * (args.prompt_kb * 100))[: args.prompt_kb * 1024]
+    stream = make_stream(args.events, args.event_bytes, prompt)
+    print(f"stream: {len(stream) / 1e6:.1f} MB, {args.events} events, prompt {len(prompt) // 1024} KiB")
+
+    legacy_s, n = timed(legacy_parse, stream, prompt)
+    print(f"legacy split/copy + strip compare: {legacy_s * 1000:8.1f}ms ({n} events)")
+    backends = [("json", json.loads)]
+    if stream_json.orjson is not None:
+        backends.append(("orjson", stream_json.orjson.loads))
+    for name, loads in backends:
+        scan_s, n = timed(scanner_parse, stream, prompt, loads)
+        print(f"JsonlScanner + echo filter ({name:>6}): {scan_s * 1000:8.1f}ms ({n} events)")
+
+    os.environ["STUB_GEMINI_REPLY_EVENTS"] = str(args.events)
+    os.environ["STUB_GEMINI_REPLY_BYTES"] = str(args.event_bytes)
+    os.makedirs(runner.GEMINI_TRACES_DIR, exist_ok=True)
+    wall_s, n = asyncio.run(end_to_end(prompt))
+    print(f"call_gemini_cli via stub CLI ({stream_json.JSON_BACKEND}): {wall_s * 1000:8.1f}ms wall ({n} text events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,16 +6,35 @@ Usage (agent calls this via run_command):
     python3 discord_bot/bin/get_new_messages.py
 
 Reads DISCORD_CONTEXT_ID and DISCORD_TURN_START_TS from the environment
-(already set by the bot's runner). Prints any new user messages as plain text.
+(already set by the bot's runner). A pre-spawned (warm) CLI process can't
+get them in its environment, so it has DISCORD_CONTEXT_FILE instead: a JSON
+file with the same keys, written when the turn starts. Prints any new user
+messages as plain text.
 Exit code: 0 always (don't interrupt the agent on failure).
 """
+import json
 import os
 import sys
 import time
 
+def load_turn_env():
+    turn_env = {}
+    context_file = os.environ.get("DISCORD_CONTEXT_FILE", "").strip()
+    if context_file:
+        try:
+            with open(context_file) as f:
+                turn_env.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+    for key in ("DISCORD_CONTEXT_ID", "DISCORD_TURN_START_TS"):
+        if os.environ.get(key):
+            turn_env[key] = os.environ[key]
+    return turn_env
+
 def main():
-    context_id = os.environ.get("DISCORD_CONTEXT_ID", "").strip()
-    turn_start = os.environ.get("DISCORD_TURN_START_TS", "").strip()
+    turn_env = load_turn_env()
+    context_id = str(turn_env.get("DISCORD_CONTEXT_ID", "")).strip()
+    turn_start = str(turn_env.get("DISCORD_TURN_START_TS", "")).strip()
 
     if not context_id:
         print("(get_new_messages: no DISCORD_CONTEXT_ID set — not in a bot context)")
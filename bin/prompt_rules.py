@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+prompt_rules — print the system rules the bot currently prepends to every prompt.
+
+Usage:
+    python3 discord_bot/bin/prompt_rules.py [--stats]
+
+Assembles prompts/components/*.md exactly as the bot does (see
+src/app/prompt_cache.py). Prints the text to stdout and its size, hash and
+component files to stderr. With --stats, prints only the latter.
+"""
+import argparse
+import os
+import sys
+
+# discord_bot/bin -> discord_bot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.app.prompt_cache import prompt_rules  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the assembled prompt rules.")
+    parser.add_argument("--stats", action="store_true", help="only print size, hash and files")
+    args = parser.parse_args(argv)
+
+    rules = prompt_rules()
+    if not args.stats:
+        print(rules.text)
+    print(f"--- {len(rules.files)} component(s), {len(rules.text)} chars, {rules.size} bytes, "
+          f"sha256 {rules.sha256} ---", file=sys.stderr)
+    for filename in rules.files:
+        print(f"  {filename}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
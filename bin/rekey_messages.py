@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+rekey_messages — move legacy uuid4 message ids to time-ordered UUIDv7 ids.
+
+Usage:
+    python3 discord_bot/bin/rekey_messages.py [--batch 500] [--min-age 600] [--pause 0.01] [--vacuum]
+
+Safe to run while the bot is up: each batch is its own short write
+transaction, so the bot's writes interleave with it. Messages newer than
+--min-age seconds and bot messages still waiting in the outbox are skipped,
+since the bot may hold their ids; run it again later to pick them up.
+Stopping it at any point is fine: rows it already moved carry v7 ids and
+are skipped on the next run. Context ids are not changed: they also name
+trace files and Gemini sessions. --vacuum rebuilds the file afterwards so
+the rewritten B-trees are packed (this one does block the bot while it runs).
+"""
+import argparse
+import os
+import sys
+import time
+
+# discord_bot/bin -> discord_bot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.database import DB_PATH, ensure_schema, get_db, rekey_message_batch  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rekey legacy message ids to UUIDv7.")
+    parser.add_argument("--batch", type=int, default=500, help="messages per transaction")
+    parser.add_argument("--min-age", type=float, default=600, help="skip messages newer than this many seconds")
+    parser.add_argument("--pause", type=float, default=0.01, help="seconds to sleep between batches")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database when done")
+    args = parser.parse_args(argv)
+
+    ensure_schema()  # needs idx_ctx_msg_message
+    before_ts = time.time() - args.min_age
+    rowid = scanned = rekeyed = 0
+    start = time.monotonic()
+    while True:
+        with get_db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            next_rowid, batch_scanned, batch_rekeyed = rekey_message_batch(conn, rowid, args.batch, before_ts)
+        if next_rowid == rowid:
+            break
+        rowid = next_rowid
+        scanned += batch_scanned
+        rekeyed += batch_rekeyed
+        if scanned % (args.batch * 100) < args.batch:
+            print(f"[{time.ctime()}] scanned {scanned}, rekeyed {rekeyed} (rowid {rowid})", flush=True)
+        if args.pause:
+            time.sleep(args.pause)
+    print(f"[{time.ctime()}] Rekeyed {rekeyed} of {scanned} message(s) in {DB_PATH} "
+          f"in {time.monotonic() - start:.1f}s", flush=True)
+
+    if args.vacuum:
+        with get_db() as conn:
+            conn.execute("VACUUM")
+        print(f"[{time.ctime()}] Vacuumed {DB_PATH}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
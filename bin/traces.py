@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+traces — inspect the Gemini CLI trace store (discord_bot/logs/gemini_traces).
+
+Usage:
+    python3 discord_bot/bin/traces.py stats
+    python3 discord_bot/bin/traces.py list <context_id> [--since TS] [--last N]
+    python3 discord_bot/bin/traces.py cat <context_id> [--since TS] [--last N]
+    python3 discord_bot/bin/traces.py import
+    python3 discord_bot/bin/traces.py prune
+
+`cat` streams a context's recorded responses to stdout, oldest first,
+decompressing only that context's members of each segment. `import` folds
+loose per-turn <context_id>_<ms>.json files into segments; `prune` applies
+the retention policy (GEMINI_TRACE_RETENTION_DAYS, GEMINI_TRACE_MAX_BYTES).
+"""
+import argparse
+import os
+import sys
+import time
+
+# discord_bot/bin -> discord_bot
+DISCORD_BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DISCORD_BOT_DIR)
+
+from src.app.trace_store import TraceStore  # noqa: E402
+
+DEFAULT_TRACES_DIR = os.path.join(DISCORD_BOT_DIR, "logs", "gemini_traces")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the Gemini CLI trace store.")
+    parser.add_argument("--dir", default=DEFAULT_TRACES_DIR, help="traces directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="summary of the store")
+    for name, help_text in (("list", "list a context's traces"), ("cat", "print a context's traces")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("context_id")
+        cmd.add_argument("--since", type=float, default=None, help="only turns at or after this unix time")
+        cmd.add_argument("--last", type=int, default=None, help="only the newest N turns")
+    sub.add_parser("import", help="fold loose per-turn trace files into segments")
+    sub.add_parser("prune", help="apply the retention policy")
+    args = parser.parse_args(argv)
+
+    store = TraceStore(args.dir)
+    try:
+        if args.command == "stats":
+            for key, value in store.stats().items():
+                print(f"{key}: {value}")
+        elif args.command == "list":
+            for row in store.list(args.context_id, since=args.since, limit=args.last):
+                print(f"{time.ctime(row['turn_ts'])}  {row['turn_ts']:.3f}  {row['raw_bytes']:>9} bytes  "
+                      f"{row['segment']}@{row['offset']}")
+        elif args.command == "cat":
+            out = sys.stdout.buffer
+            for _, data in store.iter_traces(args.context_id, since=args.since, limit=args.last):
+                out.write(data.rstrip(b"\n") + b"\n")
+            out.flush()
+        elif args.command == "import":
+            print(f"imported {store.import_loose_files()} trace(s)")
+        elif args.command == "prune":
+            print(f"pruned {store.prune()} segment(s)")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,9 @@ if __package__ is None or __package__ == "":
     if parent_dir not in sys.path:
         sys.path.insert(0, parent_dir)
 
-from src.db.queries import insert_message as append_message, mark_delivered
+from src.app.paginator import plan_pages, send_page
+from src.db.database import ensure_schema
+from src.db.queries import insert_message as append_message, mark_delivered, record_pages_sent
 
 # Placeholder for the bot token
 BOT_TOKEN = os.environ.get('DISCORD_BOT_TOKEN')
@@ -27,44 +29,41 @@ intents = discord.Intents.default()
 client = discord.Client(intents=intents)
 
 DISCORD_OUTBOX_ONLY = os.environ.get("DISCORD_OUTBOX_ONLY", "").strip() in {"1", "true", "TRUE", "yes", "YES"}
+# While this script sends a message itself, the bot's outbox leaves the row alone for this long.
+SEND_MESSAGE_CLAIM_SECONDS = 300
 
 
-def _chunk_for_discord(content: str, limit: int = 1900):
-    # 2000 is Discord's hard limit; keep a margin for safety.
-    text = (content or "").strip()
-    if not text:
-        return []
-
-    chunks = []
-    while len(text) > limit:
-        split_at = text.rfind("\n", 0, limit)
-        if split_at < 0:
-            split_at = limit
-        chunks.append(text[:split_at].rstrip())
-        text = text[split_at:].lstrip("\n")
-    if text:
-        chunks.append(text)
-    return chunks
-
 async def send_message(message):
     # Always log first, so failures still show up and can be retried by the main app's outbox watcher.
+    # Sending directly, the row is claimed: a pending row would wake the bot's outbox,
+    # which would send the same text.
+    ensure_schema()
+    now = time.time()
     log_entry = append_message(
         author="discord_bot/send_message.py",
         content=message,
         source="bot",
-        timestamp=time.time(),
+        timestamp=now,
         delivered=False,
+        next_attempt_at=None if DISCORD_OUTBOX_ONLY else now + SEND_MESSAGE_CLAIM_SECONDS,
     )
 
     if DISCORD_OUTBOX_ONLY:
         return
 
-    await client.login(BOT_TOKEN)
+    pages_sent = 0
     try:
+        await client.login(BOT_TOKEN)
         user = await client.fetch_user(USER_ID)
-        for chunk in _chunk_for_discord(message):
-            await user.send(chunk)
+        for page in plan_pages(message):
+            await send_page(user, page)
+            pages_sent += 1
         mark_delivered(log_entry["id"], delivered=True, delivered_at=time.time())
+    except Exception:
+        # Hand the rest to the outbox now rather than when the claim runs out.
+        record_pages_sent(log_entry["id"], pages_sent)
+        mark_delivered(log_entry["id"], delivered=False)
+        raise
     finally:
         await client.close()
 
@@ -18,6 +18,8 @@ from src.app.client import GeminiClient
 from src.app.commands import setup_commands
 from src.app.workers import outbox_watcher, gemini_worker
 from src.app.message_handlers import handle_message
+from src.db import async_queries
+from src.db.database import migrate
 
 load_dotenv()
 
@@ -46,9 +48,6 @@ if os.path.exists(PID_FILE):
 with open(PID_FILE, "w") as f:
     f.write(str(os.getpid()))
 
-# All runtime state files live in discord_bot/
-LAST_MESSAGE_TIMESTAMP_FILE = os.path.join(DISCORD_BOT_DIR, "last_message_timestamp.txt")
-
 # Initialization
 intents = discord.Intents.default()
 intents.dm_messages = True
@@ -64,10 +63,9 @@ async def on_ready():
         return
     client.tasks_started = True
     
-    client.gemini_queue = asyncio.Queue()
+    client.gemini_wakeup = asyncio.Event()
     asyncio.create_task(outbox_watcher(client, USER_IDS))
-    asyncio.create_task(gemini_worker(client, client.gemini_queue, USER_IDS, 
-                                      LAST_MESSAGE_TIMESTAMP_FILE, GEMINI_CLI_CMD, PROJECT_ROOT))
+    asyncio.create_task(gemini_worker(client, client.gemini_wakeup, USER_IDS, GEMINI_CLI_CMD, PROJECT_ROOT))
 
 @client.event
 async def on_message(message):
@@ -75,7 +73,12 @@ async def on_message(message):
 
 def run_bot():
     os.environ["DISCORD_OUTBOX_ONLY"] = "1"
-    client.run(BOT_TOKEN)
+    migrate()
+    try:
+        client.run(BOT_TOKEN)
+    finally:
+        # client.run() has closed the loop; let queued DB writes finish.
+        async_queries.shutdown()
 
 if __name__ == '__main__':
     run_bot()
@@ -0,0 +1,327 @@
+"""
+Warm pool of pre-spawned Gemini CLI processes.
+
+A cold `gemini` start pays for Node startup, module loading and auth before
+it even reads the prompt. The pool keeps a few processes already started
+and blocked on stdin, so a turn only has to write its prompt.
+
+Per-turn details that normally go on the command line or in the
+environment are handled as follows:
+  - `-r <session>`: generic processes start without a session. After a
+    turn, a process is pre-spawned with `-r` for that session (session
+    affinity), on the bet that the conversation continues. Turns whose
+    session has no warm process fall back to a cold start.
+  - DISCORD_CONTEXT_ID / DISCORD_TURN_START_TS: written to the file named
+    by the process's DISCORD_CONTEXT_FILE just before the prompt is sent
+    (bin/get_new_messages.py reads it).
+  - --record-responses: each process records to its own file, which the
+    runner renames to the usual <context>_<ts>.json after the turn (and
+    hands to the trace store), or deletes if the turn is not sampled.
+
+The CLI handles exactly one prompt per process, so every process is
+recycled after a single turn. Idle processes are health-checked: dead ones,
+ones idle for longer than max_idle and ones above max_rss_mb are replaced.
+
+The pool is off by default. Each idle process is a full Node CLI (a few
+hundred MB of RSS), so GEMINI_CLI_POOL_SIZE + GEMINI_CLI_POOL_SESSION_SLOTS
+processes stay resident while the bot is idle.
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+import uuid
+from typing import Any, Deque, Dict, List, Optional
+
+_DISCORD_BOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+GEMINI_POOL_DIR = os.path.join(_DISCORD_BOT_DIR, "logs", "gemini_pool")
+
+GEMINI_CLI_POOL_SIZE = int(os.environ.get("GEMINI_CLI_POOL_SIZE", "0"))
+GEMINI_CLI_POOL_SESSION_SLOTS = int(os.environ.get("GEMINI_CLI_POOL_SESSION_SLOTS", "0"))
+# Recent turns kept for the time-to-first-event figures in stats()
+FIRST_EVENT_SAMPLES = 100
+GEMINI_CLI_POOL_MAX_IDLE = float(os.environ.get("GEMINI_CLI_POOL_MAX_IDLE", "900"))
+GEMINI_CLI_POOL_MAX_RSS_MB = float(os.environ.get("GEMINI_CLI_POOL_MAX_RSS_MB", "800"))
+GEMINI_CLI_POOL_HEALTHCHECK_INTERVAL = float(os.environ.get("GEMINI_CLI_POOL_HEALTHCHECK_INTERVAL", "30"))
+
+# Environment a cold start passes per turn; warm processes read it from DISCORD_CONTEXT_FILE.
+HANDOFF_ENV_KEYS = ("DISCORD_CONTEXT_ID", "DISCORD_TURN_START_TS")
+
+
+def build_cli_args(gemini_cmd: str, session_id: Optional[str], responses_path: Optional[str]) -> List[str]:
+    args = [gemini_cmd]
+    if session_id:
+        args.extend(["-r", session_id])
+    args.extend([
+        "--output-format", "stream-json",
+        "--approval-mode", "yolo",
+    ])
+    if responses_path:
+        args.extend(["--record-responses", responses_path])
+    if os.environ.get("GEMINI_RUNNER_DEBUG") == "1":
+        args.append("--debug")
+    return args
+
+
+def cli_env(base: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    env = dict(os.environ if base is None else base)
+    # Force non-interactive/dumb terminal behavior
+    env["TERM"] = "dumb"
+    env["GEMINI_CLI_NON_INTERACTIVE"] = "1"
+    env.setdefault("DISCORD_OUTBOX_ONLY", "1")
+    return env
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None  # not Linux, or the process is gone
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class WarmProcess:
+    def __init__(self, proc: asyncio.subprocess.Process, session_id: Optional[str],
+                 trace_path: str, context_file: str):
+        self.proc = proc
+        self.session_id = session_id
+        self.trace_path = trace_path
+        self.context_file = context_file
+        self.spawned_at = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    def handoff(self, env: Dict[str, str]) -> None:
+        """Publish the turn's context for tools the agent runs (see bin/get_new_messages.py)."""
+        payload = {key: env[key] for key in HANDOFF_ENV_KEYS if key in env}
+        tmp_path = f"{self.context_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self.context_file)
+
+    async def kill(self) -> None:
+        if self.alive:
+            try:
+                self.proc.kill()
+            except ProcessLookupError:
+                pass
+        try:
+            await self.proc.wait()
+        except Exception:
+            pass
+        self.cleanup()
+        try:
+            os.remove(self.trace_path)  # never served a turn, nothing worth keeping
+        except OSError:
+            pass
+
+    def cleanup(self) -> None:
+        for path in (self.context_file, f"{self.context_file}.tmp"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class GeminiCliPool:
+    def __init__(
+        self,
+        gemini_cmd: str,
+        *,
+        cwd: Optional[str] = None,
+        size: int = GEMINI_CLI_POOL_SIZE,
+        session_slots: int = GEMINI_CLI_POOL_SESSION_SLOTS,
+        max_idle: float = GEMINI_CLI_POOL_MAX_IDLE,
+        max_rss_mb: float = GEMINI_CLI_POOL_MAX_RSS_MB,
+        healthcheck_interval: float = GEMINI_CLI_POOL_HEALTHCHECK_INTERVAL,
+        traces_dir: Optional[str] = None,
+        pool_dir: str = GEMINI_POOL_DIR,
+    ):
+        self.gemini_cmd = gemini_cmd
+        self.cwd = cwd
+        self.size = max(0, size)
+        self.session_slots = max(0, session_slots)
+        self.max_idle = max_idle
+        self.max_rss_mb = max_rss_mb
+        self.healthcheck_interval = healthcheck_interval
+        self.traces_dir = traces_dir or pool_dir
+        self.pool_dir = pool_dir
+        self._generic: Deque[WarmProcess] = collections.deque()
+        # session id -> warm `-r` process, least recently requested first
+        self._sessions: "collections.OrderedDict[str, WarmProcess]" = collections.OrderedDict()
+        self._spawning = 0
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.hits = 0  # generic processes handed out
+        self.session_hits = 0  # warm `-r` processes handed out
+        self.misses = 0
+        self.spawned = 0
+        self.recycled = 0
+        self.spawn_failures = 0
+        # seconds from the start of a turn to the CLI's first event, for warm and cold starts
+        self._first_event: Dict[str, Deque[float]] = {
+            "warm": collections.deque(maxlen=FIRST_EVENT_SAMPLES),
+            "cold": collections.deque(maxlen=FIRST_EVENT_SAMPLES),
+        }
+
+    async def start(self) -> None:
+        os.makedirs(self.pool_dir, exist_ok=True)
+        os.makedirs(self.traces_dir, exist_ok=True)
+        await self._replenish()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def acquire(self, session_id: Optional[str] = None) -> Optional[WarmProcess]:
+        """Take a warm process for this session (or a generic one if there is no session). None on a miss."""
+        warm = None
+        if session_id:
+            warm = self._sessions.pop(session_id, None)
+            if warm is not None and warm.alive:
+                self.session_hits += 1
+            elif warm is not None:
+                warm.cleanup()
+                warm = None
+        else:
+            while self._generic:
+                candidate = self._generic.popleft()
+                if candidate.alive:
+                    warm = candidate
+                    self.hits += 1
+                    break
+                candidate.cleanup()
+        if warm is None:
+            self.misses += 1
+        if not self._closed:
+            asyncio.ensure_future(self._replenish())
+        return warm
+
+    def prewarm_session(self, session_id: Optional[str]) -> None:
+        """Start a `-r session_id` process in the background for this session's next turn."""
+        if self._closed or not session_id or self.session_slots == 0 or session_id in self._sessions:
+            return
+        asyncio.ensure_future(self._spawn_for_session(session_id))
+
+    def record_first_event(self, warm: bool, seconds: float) -> None:
+        self._first_event["warm" if warm else "cold"].append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        def median(samples):
+            return sorted(samples)[len(samples) // 2] if samples else None
+
+        return {
+            "idle": len(self._generic),
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "session_hits": self.session_hits,
+            "misses": self.misses,
+            "spawned": self.spawned,
+            "recycled": self.recycled,
+            "spawn_failures": self.spawn_failures,
+            "first_event_warm_p50": median(self._first_event["warm"]),
+            "first_event_cold_p50": median(self._first_event["cold"]),
+        }
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+        idle = list(self._generic) + list(self._sessions.values())
+        self._generic.clear()
+        self._sessions.clear()
+        await asyncio.gather(*(warm.kill() for warm in idle), return_exceptions=True)
+
+    async def _spawn(self, session_id: Optional[str]) -> Optional[WarmProcess]:
+        token = uuid.uuid4().hex
+        trace_path = os.path.join(self.traces_dir, f"pool_{token}.json")
+        context_file = os.path.join(self.pool_dir, f"{token}.json")
+        env = cli_env()
+        env["DISCORD_CONTEXT_FILE"] = context_file
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *build_cli_args(self.gemini_cmd, session_id, trace_path),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=self.cwd,
+                env=env,
+            )
+        except Exception as e:
+            self.spawn_failures += 1
+            print(f"[{time.ctime()}] WARNING: could not pre-spawn Gemini CLI: {e}", flush=True)
+            return None
+        self.spawned += 1
+        return WarmProcess(proc, session_id, trace_path, context_file)
+
+    async def _replenish(self) -> None:
+        missing = self.size - len(self._generic) - self._spawning
+        if missing <= 0 or self._closed:
+            return
+        self._spawning += missing
+        try:
+            spawned = await asyncio.gather(*(self._spawn(None) for _ in range(missing)))
+        finally:
+            self._spawning -= missing
+        for warm in spawned:
+            if warm is None:
+                continue
+            if self._closed:
+                await warm.kill()
+            else:
+                self._generic.append(warm)
+
+    async def _spawn_for_session(self, session_id: str) -> None:
+        warm = await self._spawn(session_id)
+        if warm is None:
+            return
+        if self._closed or session_id in self._sessions:
+            await warm.kill()
+            return
+        self._sessions[session_id] = warm
+        while len(self._sessions) > self.session_slots:
+            _, evicted = self._sessions.popitem(last=False)
+            self.recycled += 1
+            await evicted.kill()
+
+    def _needs_recycling(self, warm: WarmProcess) -> Optional[str]:
+        if not warm.alive:
+            return f"exited with code {warm.proc.returncode}"
+        if self.max_idle and time.monotonic() - warm.spawned_at > self.max_idle:
+            return "idle too long"
+        rss = _rss_mb(warm.proc.pid)
+        if self.max_rss_mb and rss is not None and rss > self.max_rss_mb:
+            return f"RSS {rss:.0f}MB over limit"
+        return None
+
+    async def check_health(self) -> int:
+        """Replace idle processes that died, aged out or grew too big. Returns how many were recycled."""
+        stale = []
+        for warm in list(self._generic):
+            reason = self._needs_recycling(warm)
+            if reason:
+                self._generic.remove(warm)
+                stale.append((warm, reason))
+        for session_id, warm in list(self._sessions.items()):
+            reason = self._needs_recycling(warm)
+            if reason:
+                # Session processes are not replaced: the next turn for it cold-starts.
+                del self._sessions[session_id]
+                stale.append((warm, reason))
+        for warm, reason in stale:
+            print(f"[{time.ctime()}] Recycling warm Gemini CLI pid {warm.proc.pid}: {reason}", flush=True)
+            await warm.kill()
+        self.recycled += len(stale)
+        await self._replenish()
+        return len(stale)
+
+    async def _health_loop(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(self.healthcheck_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                print(f"[{time.ctime()}] WARNING: Gemini CLI pool health check failed: {e}", flush=True)
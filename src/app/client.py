@@ -3,6 +3,9 @@ import json
 import discord
 from discord import app_commands
 
+from src.app.resolver import DiscordResolver
+from src.app.edit_scheduler import EditScheduler
+
 class GeminiClient(discord.Client):
     def __init__(self, *, intents: discord.Intents, user_ids: list, project_root: str, guild_id: str = None):
         super().__init__(intents=intents)
@@ -10,7 +13,11 @@ class GeminiClient(discord.Client):
         self.user_ids = user_ids
         self.project_root = project_root
         self.guild_id = guild_id
-        self.gemini_queue = None # Will be set by workers
+        self.gemini_wakeup = None # Will be set by workers
+        self.turn_scheduler = None # Will be set by gemini_worker
+        self.cli_pool = None # Warm Gemini CLI processes, set by gemini_worker
+        self.resolver = DiscordResolver(self) # Shared channel/user lookup cache
+        self.edit_scheduler = EditScheduler() # Paces live edits of streamed replies
         self.tasks_started = False
 
     async def setup_hook(self):
@@ -6,6 +6,8 @@ import re
 from pathlib import Path
 from discord import app_commands
 
+from src.db.async_queries import get_turn_queue_stats
+
 def setup_commands(client):
     allowed_user_ids = {str(uid) for uid in client.user_ids}
 
@@ -214,6 +216,48 @@ def setup_commands(client):
         
         await interaction.response.send_message(embed=embed)
 
+    @client.tree.command(name="queue", description="Show the Gemini turn queue")
+    async def queue_command(interaction: discord.Interaction):
+        if not await ensure_authorized(interaction):
+            return
+        db_stats = await get_turn_queue_stats()
+        sched = client.turn_scheduler.stats() if client.turn_scheduler else {}
+
+        def fmt_wait(seconds):
+            return "—" if seconds is None else f"{seconds:.1f}s"
+
+        oldest = db_stats["oldest_enqueued_at"]
+        oldest_wait = None if oldest is None else datetime.datetime.now().timestamp() - oldest
+        embed = discord.Embed(title="Gemini Turn Queue", color=discord.Color.purple())
+        embed.add_field(name="Running", value=f"{sched.get('running', 0)}/{sched.get('max_concurrent', '?')} here, "
+                                               f"{db_stats['running']} leased total", inline=False)
+        embed.add_field(name="Queued (priority)", value=str(db_stats["queued_high"]), inline=True)
+        embed.add_field(name="Queued (normal)", value=str(db_stats["queued_normal"]), inline=True)
+        embed.add_field(name="Oldest waiting", value=fmt_wait(oldest_wait), inline=True)
+        embed.add_field(name="Queue wait p50 / p95 / max",
+                        value=f"{fmt_wait(sched.get('wait_p50'))} / {fmt_wait(sched.get('wait_p95'))} / {fmt_wait(sched.get('wait_max'))}",
+                        inline=False)
+        embed.add_field(name="Turns", value=f"{sched.get('started', 0)} started, {sched.get('completed', 0)} completed, "
+                                             f"{sched.get('failed', 0)} failed", inline=False)
+        if client.cli_pool is not None:
+            pool = client.cli_pool.stats()
+            embed.add_field(name="Gemini CLI pool",
+                            value=f"{pool['idle']} idle + {pool['sessions']} session, {pool['hits']} hits, "
+                                  f"{pool['session_hits']} session hits, {pool['misses']} misses, "
+                                  f"{pool['recycled']} recycled\nFirst event p50: "
+                                  f"{fmt_wait(pool['first_event_warm_p50'])} warm / "
+                                  f"{fmt_wait(pool['first_event_cold_p50'])} cold", inline=False)
+        lookups = client.resolver.stats()
+        embed.add_field(name="Discord lookups", value=f"{lookups['hits']} hits, {lookups['negative_hits']} negative hits, "
+                                                      f"{lookups['misses']} misses, {lookups['coalesced']} coalesced, "
+                                                      f"{lookups['size']} cached", inline=False)
+        edits = client.edit_scheduler.stats()
+        embed.add_field(name="Live edits", value=f"{edits['edits']} sent, {edits['coalesced']} coalesced, "
+                                                 f"{edits['skipped']} skipped, {edits['rate_limited']} rate limited, "
+                                                 f"{edits['failed']} failed, {edits['pending']} pending "
+                                                 f"(slowest channel every {edits['max_interval']:.1f}s)", inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @client.tree.command(name="aws", description="Check AWS cost summary")
     async def aws_command(interaction: discord.Interaction):
         if not await ensure_authorized(interaction):
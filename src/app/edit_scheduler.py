@@ -0,0 +1,204 @@
+"""
+Shared scheduler for live-editing streamed replies.
+
+Turns stream their reply into a Discord message by editing it over and over.
+Instead of each turn editing on its own fixed timer, they all submit the
+content they want shown, and the scheduler does the editing:
+  - only the latest content per message is kept; intermediate versions are
+    never sent;
+  - an edit that would not change what the message shows is skipped;
+  - edits are paced per channel. The interval starts at min_interval, backs
+    off when Discord answers 429 (or when discord.py held the request back
+    for its own bucket) and relaxes again after successful edits;
+  - finalize() sends a message's last content right away, without waiting
+    for the interval (a 429 pause is still honoured).
+
+The outbox reports its own 429s through block_channel(), so streamed edits
+and outbox sends to the same channel do not keep colliding.
+"""
+import asyncio
+import collections
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from src.app.outbox import rate_limit_delay
+
+EDIT_MIN_INTERVAL = float(os.environ.get("GEMINI_EDIT_MIN_INTERVAL", "1.0"))
+EDIT_MAX_INTERVAL = float(os.environ.get("GEMINI_EDIT_MAX_INTERVAL", "10.0"))
+EDIT_MAX_RATE_LIMIT_RETRIES = 5
+EDIT_TRACKED_MESSAGES = 1024  # messages whose shown content is remembered for no-op detection
+
+
+class _PendingEdit:
+    def __init__(self, message: Any, content: str):
+        self.message = message
+        self.content = content
+        self.urgent = False
+        self.rate_limited = 0
+        self.waiters: List[asyncio.Future] = []
+
+
+class _ChannelBucket:
+    def __init__(self, key: Any, interval: float):
+        self.key = key
+        self.interval = interval
+        self.next_at = 0.0        # time.monotonic() before which no routine edit is sent
+        self.blocked_until = 0.0  # time.monotonic() deadline set by a 429
+        self.pending: "collections.OrderedDict[Any, _PendingEdit]" = collections.OrderedDict()
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class EditScheduler:
+    def __init__(self, *, min_interval: float = EDIT_MIN_INTERVAL, max_interval: float = EDIT_MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self._buckets: Dict[Any, _ChannelBucket] = {}
+        # message id -> content it currently shows, least recently touched first
+        self._shown: "collections.OrderedDict[Any, str]" = collections.OrderedDict()
+        self.edits = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def shown(self, message: Any, content: str) -> None:
+        """Record what a message shows now (e.g. right after channel.send())."""
+        self._shown[message.id] = content
+        self._shown.move_to_end(message.id)
+        while len(self._shown) > EDIT_TRACKED_MESSAGES:
+            self._shown.popitem(last=False)
+
+    def submit(self, message: Any, content: str) -> None:
+        """Ask for `message` to show `content`; replaces any edit still waiting for it."""
+        bucket = self._bucket(message)
+        edit = bucket.pending.get(message.id)
+        if edit is not None:
+            edit.content = content
+            self.coalesced += 1
+        elif self._shown.get(message.id) == content:
+            self.skipped += 1
+            return
+        else:
+            bucket.pending[message.id] = _PendingEdit(message, content)
+        self._start(bucket)
+
+    async def finalize(self, message: Any, content: str) -> None:
+        """Show `content` on `message` now, wait until it is sent, and stop tracking the message."""
+        bucket = self._bucket(message)
+        self.submit(message, content)
+        edit = bucket.pending.get(message.id)
+        if edit is not None:
+            edit.urgent = True
+            bucket.pending.move_to_end(message.id, last=False)
+            waiter = asyncio.get_running_loop().create_future()
+            edit.waiters.append(waiter)
+            bucket.wake.set()
+            await waiter
+        self._shown.pop(message.id, None)
+
+    def block_channel(self, channel_id: Any, delay: float) -> None:
+        """Pause edits in a channel, e.g. because another sender there was rate limited."""
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = _ChannelBucket(channel_id, self.min_interval)
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+        bucket.interval = min(self.max_interval, bucket.interval * 2)
+
+    def interval(self, channel_id: Any) -> float:
+        bucket = self._buckets.get(channel_id)
+        return bucket.interval if bucket is not None else self.min_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "edits": self.edits,
+            "coalesced": self.coalesced,
+            "skipped": self.skipped,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+            "pending": sum(len(bucket.pending) for bucket in self._buckets.values()),
+            "max_interval": max((bucket.interval for bucket in self._buckets.values()), default=self.min_interval),
+        }
+
+    async def close(self) -> None:
+        tasks = [bucket.task for bucket in self._buckets.values() if bucket.task and not bucket.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _bucket(self, message: Any) -> _ChannelBucket:
+        channel = getattr(message, "channel", None)
+        key = getattr(channel, "id", None)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _ChannelBucket(key, self.min_interval)
+        return bucket
+
+    def _start(self, bucket: _ChannelBucket) -> None:
+        if bucket.task is None or bucket.task.done():
+            bucket.task = asyncio.create_task(self._run(bucket))
+
+    async def _run(self, bucket: _ChannelBucket) -> None:
+        while bucket.pending:
+            urgent = next(iter(bucket.pending.values())).urgent
+            deadline = bucket.blocked_until if urgent else max(bucket.blocked_until, bucket.next_at)
+            wait = deadline - time.monotonic()
+            if wait > 0:
+                bucket.wake.clear()
+                try:
+                    # A finalize() arriving mid-wait cuts the routine interval short.
+                    await asyncio.wait_for(bucket.wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, edit = bucket.pending.popitem(last=False)
+            await self._send(bucket, edit)
+        if bucket.blocked_until <= time.monotonic() and bucket.interval <= self.min_interval:
+            self._buckets.pop(bucket.key, None)
+
+    async def _send(self, bucket: _ChannelBucket, edit: _PendingEdit) -> None:
+        message_id = edit.message.id
+        if self._shown.get(message_id) == edit.content:
+            self.skipped += 1
+            self._resolve(edit)
+            return
+        started = time.monotonic()
+        try:
+            await edit.message.edit(content=edit.content)
+        except Exception as err:
+            delay = rate_limit_delay(err)
+            if delay is None or edit.rate_limited >= EDIT_MAX_RATE_LIMIT_RETRIES:
+                self.failed += 1
+                print(f"[{time.ctime()}] WARNING: could not edit message {message_id}: {err}", flush=True)
+                self._resolve(edit)
+                return
+            self.rate_limited += 1
+            edit.rate_limited += 1
+            self.block_channel(bucket.key, delay)
+            newer = bucket.pending.pop(message_id, None)
+            if newer is not None:
+                # Content moved on while we were waiting: send the newest instead.
+                edit.content = newer.content
+                edit.urgent = edit.urgent or newer.urgent
+                edit.waiters.extend(newer.waiters)
+            bucket.pending[message_id] = edit
+            bucket.pending.move_to_end(message_id, last=False)
+            return
+        self.edits += 1
+        self.shown(edit.message, edit.content)
+        now = time.monotonic()
+        took = now - started
+        if took > bucket.interval:
+            # discord.py waited on its own rate-limit bucket before sending.
+            bucket.interval = min(self.max_interval, took)
+        else:
+            bucket.interval = max(self.min_interval, bucket.interval * 0.8)
+        bucket.next_at = now + bucket.interval
+        self._resolve(edit)
+
+    @staticmethod
+    def _resolve(edit: _PendingEdit) -> None:
+        for waiter in edit.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
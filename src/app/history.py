@@ -0,0 +1,175 @@
+"""
+Conversation history for cold-start prompts.
+
+A turn without a Gemini session (first turn, or after the session was
+invalidated) has no memory of the conversation, so its prompt carries a
+window of the context's history. The window is built backwards from the
+current message, a page at a time, until HISTORY_BUDGET_TOKENS (estimated
+at HISTORY_CHARS_PER_TOKEN) is used up. Only id, source, content and
+timestamp are read, and a message longer than HISTORY_MESSAGE_CHARS is
+shortened.
+
+Messages that no longer fit are folded into a digest stored in
+context_digests: the first HISTORY_DIGEST_LINE_CHARS of each message, one
+line per message, keeping the newest HISTORY_DIGEST_CHARS. It is not a
+summary, only a shortened transcript. The window stops where the digest's
+coverage ends, so every turn reads the digest once plus at most a budget's
+worth of recent rows, however long the context is. Folding starts from the
+window the prompt was built with (its overflow_before) and only reads the
+rows between that and the digest's covers_until position.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.db.queries import get_context_digest, get_context_history_page, save_context_digest
+
+HISTORY_BUDGET_TOKENS = int(os.environ.get("GEMINI_HISTORY_BUDGET_TOKENS", "4000"))
+HISTORY_CHARS_PER_TOKEN = 4
+HISTORY_MESSAGE_CHARS = int(os.environ.get("GEMINI_HISTORY_MESSAGE_CHARS", "2000"))
+HISTORY_DIGEST_CHARS = int(os.environ.get("GEMINI_HISTORY_DIGEST_CHARS", "3000"))
+HISTORY_DIGEST_LINE_CHARS = 160  # per message in the digest
+HISTORY_PAGE_SIZE = 25
+
+
+@dataclass(frozen=True)
+class HistoryWindow:
+    lines: Tuple[str, ...]  # rendered messages, oldest first
+    digest: Optional[str]
+    # (timestamp, id) of the oldest message in the window if older, undigested
+    # messages did not fit; None if the window reaches the digest (or the start).
+    overflow_before: Optional[Tuple[float, str]]
+
+    @property
+    def chars(self) -> int:
+        return len(self.digest or "") + sum(len(line) + 1 for line in self.lines)
+
+
+def _role(row: Dict[str, Any]) -> str:
+    return "User" if row.get("source") == "user" else "Bot"
+
+
+def _line(row: Dict[str, Any]) -> Optional[str]:
+    content = (row.get("content") or "").strip()
+    if not content:
+        return None
+    if len(content) > HISTORY_MESSAGE_CHARS:
+        content = content[:HISTORY_MESSAGE_CHARS].rstrip() + " …[truncated]"
+    return f"{_role(row)}: {content}"
+
+
+def _digest(row: Dict[str, Any]) -> Optional[str]:
+    content = " ".join((row.get("content") or "").split())
+    if not content:
+        return None
+    if len(content) > HISTORY_DIGEST_LINE_CHARS:
+        content = content[:HISTORY_DIGEST_LINE_CHARS].rstrip() + "…"
+    return f"{_role(row)}: {content}"
+
+
+def _position(row: Dict[str, Any]) -> Tuple[float, str]:
+    return float(row["timestamp"]), row["id"]
+
+
+def _digest_boundary(digest: Optional[Dict[str, Any]]) -> Optional[Tuple[float, str]]:
+    return (digest["covers_until_ts"], digest["covers_until_id"]) if digest else None
+
+
+def build_history_window(
+    context_id: str,
+    before: Tuple[float, str],
+    budget_chars: Optional[int] = None,
+) -> HistoryWindow:
+    """The context's history before `before` (a (timestamp, id) position) that fits the budget."""
+    if budget_chars is None:
+        budget_chars = HISTORY_BUDGET_TOKENS * HISTORY_CHARS_PER_TOKEN
+    digest = get_context_digest(context_id)
+    remaining = budget_chars - (len(digest["digest"]) if digest else 0)
+    after = _digest_boundary(digest)
+
+    lines: List[str] = []
+    overflow_before = None
+    cursor = before
+    while remaining > 0:
+        page = get_context_history_page(context_id, cursor, after=after, limit=HISTORY_PAGE_SIZE)
+        for row in page:
+            line = _line(row)
+            if line is None:
+                cursor = _position(row)
+                continue
+            if len(line) + 1 > remaining:
+                overflow_before = cursor
+                break
+            lines.append(line)
+            remaining -= len(line) + 1
+            cursor = _position(row)
+        if overflow_before is not None or len(page) < HISTORY_PAGE_SIZE:
+            break
+    else:
+        overflow_before = cursor
+    lines.reverse()
+    return HistoryWindow(tuple(lines), digest["digest"] if digest else None, overflow_before)
+
+
+def render_history(window: HistoryWindow) -> str:
+    """The window as a prompt prefix ("" if there is no history)."""
+    if not window.lines and not window.digest:
+        return ""
+    parts = ["--- CONVERSATION SO FAR (oldest first) ---"]
+    if window.digest:
+        parts.append("Earlier messages (shortened):")
+        parts.append(window.digest)
+        if window.lines:
+            parts.append("Most recent messages:")
+    parts.extend(window.lines)
+    parts.append("------------------------------------------")
+    return "\n".join(parts) + "\n\n"
+
+
+def refresh_context_digest(context_id: str, overflow_before: Tuple[float, str]) -> int:
+    """
+    Fold the messages before `overflow_before` (the overflow_before of the
+    window a cold start was prompted with) that the digest does not cover
+    yet into it. Returns how many were folded. Writes, so call it through
+    the DB writer (async_queries.run_write).
+    """
+    digest = get_context_digest(context_id)
+    after = _digest_boundary(digest)
+
+    # Newest first, only as far back as the digest has room for.
+    digests: List[str] = []
+    room = HISTORY_DIGEST_CHARS
+    covers_until = None
+    folded = 0
+    cursor = overflow_before
+    while True:
+        page = get_context_history_page(context_id, cursor, after=after, limit=HISTORY_PAGE_SIZE)
+        for row in page:
+            cursor = _position(row)
+            covers_until = covers_until or cursor
+            folded += 1
+            line = _digest(row)
+            if line and room > 0:
+                digests.append(line)
+                room -= len(line) + 1
+        if len(page) < HISTORY_PAGE_SIZE or room <= 0:
+            break
+    if covers_until is None:
+        return 0
+    if room <= 0 and len(page) == HISTORY_PAGE_SIZE:
+        # Older undigested messages remain; they are now out of reach for good.
+        digests.append("…")
+
+    lines = digests[::-1]
+    if digest and room > 0:
+        old_lines = digest["digest"].split("\n")
+        kept: List[str] = []
+        for line in reversed(old_lines):
+            if len(line) + 1 > room:
+                break
+            kept.append(line)
+            room -= len(line) + 1
+        lines = kept[::-1] + lines
+    count = folded + (digest["message_count"] if digest else 0)
+    save_context_digest(context_id, "\n".join(lines), covers_until, count)
+    return folded
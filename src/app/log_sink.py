@@ -0,0 +1,207 @@
+"""
+Background, batching file sink for high-volume logs (gemini_responses.log).
+
+write() only enqueues the line, so callers on the event loop never touch the
+disk. A daemon thread drains the queue and writes in batches (by size or
+after flush_interval). It rotates the file when it would grow past
+max_bytes or the day changes, gzips the rotated segment and keeps the newest
+backup_count segments.
+
+Under backpressure the sink sheds load instead of blocking. Above half the
+queue capacity only every sample_every-th line is kept; when the queue is
+full, lines are dropped. Both are counted, and a note with the counts is
+written to the log.
+"""
+import atexit
+import glob
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+LOG_SINK_MAX_BYTES = int(os.environ.get("GEMINI_RESPONSES_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_SINK_BACKUPS = int(os.environ.get("GEMINI_RESPONSES_LOG_BACKUPS", "10"))
+LOG_SINK_QUEUE_SIZE = int(os.environ.get("GEMINI_RESPONSES_LOG_QUEUE", "20000"))
+
+_STOP = object()
+
+
+class LogSink:
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_bytes: int = LOG_SINK_MAX_BYTES,
+        backup_count: int = LOG_SINK_BACKUPS,
+        rotate_daily: bool = True,
+        queue_size: int = LOG_SINK_QUEUE_SIZE,
+        sample_every: int = 10,
+        batch_bytes: int = 64 * 1024,
+        flush_interval: float = 0.5,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_daily = rotate_daily
+        self.queue_size = max(1, queue_size)
+        self.sample_every = max(1, sample_every)
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        self._sample_counter = 0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._file_day: Optional[str] = None
+        self._reported_dropped = 0
+        self._reported_sampled = 0
+        self.accepted = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.rotations = 0
+
+    def write(self, line: str) -> bool:
+        """Queue a line (newline included) for writing. Never blocks; returns False if it was shed."""
+        self._ensure_started()
+        if self._queue.qsize() * 2 >= self.queue_size:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_every:
+                self.sampled_out += 1
+                return False
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is on disk."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "rotations": self.rotations,
+            "queued": self._queue.qsize(),
+        }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                thread.start()
+                self._thread = thread
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        batch: List[str] = []
+        batch_size = 0
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, str):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                batch_size += len(item)
+                if batch_size < self.batch_bytes:
+                    continue
+            self._write_batch(batch)
+            batch = []
+            batch_size = 0
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write_batch(self, batch: List[str]) -> None:
+        shed_note = self._shed_note()
+        if shed_note:
+            batch = [shed_note] + batch
+        if not batch:
+            return
+        data = "".join(batch)
+        try:
+            self._rotate_if_needed(len(data.encode("utf-8")))
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._file_day = time.strftime("%Y%m%d")
+            self._file.write(data)
+            self._file.flush()
+            self.written += len(batch)
+        except Exception as e:
+            print(f"[{time.ctime()}] WARNING: log sink could not write {self.path}: {e}", flush=True)
+
+    def _shed_note(self) -> Optional[str]:
+        dropped, sampled = self.dropped, self.sampled_out
+        if dropped == self._reported_dropped and sampled == self._reported_sampled:
+            return None
+        note = (f"[{time.ctime()}] [log sink] shed under backpressure: "
+                f"{dropped - self._reported_dropped} dropped, {sampled - self._reported_sampled} sampled out\n")
+        self._reported_dropped, self._reported_sampled = dropped, sampled
+        return note
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        if not os.path.isfile(self.path):
+            return  # nothing written yet, or not a regular file (e.g. /dev/null)
+        size = os.path.getsize(self.path)
+        today = time.strftime("%Y%m%d")
+        file_day = self._file_day or time.strftime("%Y%m%d", time.localtime(os.path.getmtime(self.path)))
+        too_big = self.max_bytes and size > 0 and size + incoming > self.max_bytes
+        new_day = self.rotate_daily and file_day != today
+        if not (too_big or new_day):
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        segment = f"{self.path}.{file_day}-{time.strftime('%H%M%S')}-{self.rotations}"
+        os.replace(self.path, segment)
+        with open(segment, "rb") as src, gzip.open(f"{segment}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(segment)
+        self.rotations += 1
+        self._prune()
+
+    def _prune(self) -> None:
+        segments = sorted(glob.glob(f"{glob.escape(self.path)}.*.gz"), key=os.path.getmtime)
+        for old in segments[:-self.backup_count] if self.backup_count else segments:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
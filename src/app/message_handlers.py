@@ -1,13 +1,8 @@
 import json
 import time
 import discord
-from src.db.queries import (
-    insert_message,
-    create_context,
-    find_context_by_reply_thread,
-    find_active_context_by_channel,
-    add_message_to_context,
-)
+from src.db.async_queries import ingest_user_message
+from src.db.payloads import encode_payload_async
 
 
 def _discord_message_to_payload(message: discord.Message) -> dict:
@@ -111,60 +106,25 @@ async def handle_message(client, message, user_ids):
         channel_id = message.channel.parent_id if is_thread else message.channel.id
         thread_id = message.channel.id if is_thread else None
 
-        # 4. Store the raw message (pure append-only log)
-        raw_payload = _discord_message_to_payload(message)
-        msg_entry = insert_message(
+        # 4. Store, route and link the message in one transaction
+        #    If the message came from a thread, it goes to the context that owns it.
+        #    Otherwise, it joins the active context for this channel (e.g. DM).
+        #    If none found, a fresh context is created.
+        #    Only process if DM, bot mentioned, or the thread is already a Gemini context;
+        #    anything else is stored with a silent bot reply so no turn is queued.
+        #    The payload is compressed on a worker thread, not the loop or the DB writer.
+        raw_payload = await encode_payload_async(_discord_message_to_payload(message))
+        trigger = isinstance(message.channel, discord.DMChannel) or client.user in message.mentions
+        await ingest_user_message(
             author=str(message.author),
             content=message.content,
-            source="user",
             timestamp=time.time(),
             channel_id=channel_id,
             thread_id=thread_id,
             raw_discord_payload=raw_payload,
+            discord_message_id=message.id,
+            trigger=trigger,
+            dm=isinstance(message.channel, discord.DMChannel),
         )
-
-        # 5. Route to a context
-        #    If the message came from a thread, find the context that owns it.
-        #    Otherwise, check if there's an active context for this channel (e.g. DM).
-        #    If none found, create a fresh context.
-        context_id = None
-        if thread_id:
-            context_id = find_context_by_reply_thread(thread_id)
-        else:
-            # Look for an active context in this channel (DMs/standard channels)
-            context_id = find_active_context_by_channel(channel_id)
-
-        if not context_id:
-            context_id = create_context(reply_channel_id=channel_id, reply_thread_id=thread_id)
-
-        # 6. Link message to context
-        add_message_to_context(context_id, msg_entry["id"])
-
-        # 7. Enqueue for processing
-        # Filter: Only process if DM, bot mentioned, or already in a thread
-        should_process = False
-        if isinstance(message.channel, discord.DMChannel):
-            should_process = True
-        elif client.user in message.mentions:
-            should_process = True
-        elif is_thread:
-            # If it's a thread, we only process if it's already linked to a Gemini context
-            if find_context_by_reply_thread(thread_id):
-                should_process = True
-
-        if should_process:
-            if client.gemini_queue:
-                client.gemini_queue.put_nowait({"context_id": context_id})
-        else:
-            # Insert a silent bot message to prevent the polling loop from picking this up as pending
-            silent_msg = insert_message(
-                author="system",
-                content="",
-                source="bot",
-                timestamp=time.time(),
-                channel_id=channel_id,
-                thread_id=thread_id,
-                delivered=True,
-                delivered_at=time.time(),
-            )
-            add_message_to_context(context_id, silent_msg["id"])
+        # 5. Turns to process were queued in pending_turns by the same
+        #    transaction; the commit wakes gemini_worker.
@@ -0,0 +1,227 @@
+"""
+Per-destination delivery lanes for the outbox.
+
+Each destination (thread, channel or DM user) gets its own lane: messages in
+a lane are sent strictly in order, while different lanes deliver
+concurrently up to a global limit. A 429 only pauses the lane (route) that
+hit it, for as long as Discord asked, so one slow or rate-limited channel no
+longer holds up every other channel and DM.
+"""
+import asyncio
+import collections
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from src.app.paginator import Page, plan_pages, send_page
+
+# How many lanes may be inside target.send() at once.
+OUTBOX_MAX_CONCURRENT_SENDS = int(os.environ.get("OUTBOX_MAX_CONCURRENT_SENDS", "4"))
+# How many 429s a single page may absorb before the message counts as failed.
+OUTBOX_MAX_RATE_LIMIT_RETRIES = 5
+# Fallback pause when a 429 carries no usable Retry-After.
+DEFAULT_RATE_LIMIT_DELAY = 1.0
+# Failed or unresolvable messages are retried with exponential backoff, then dead-lettered.
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_DELAY = float(os.environ.get("OUTBOX_RETRY_BASE_DELAY", "2"))
+OUTBOX_RETRY_MAX_DELAY = float(os.environ.get("OUTBOX_RETRY_MAX_DELAY", "300"))
+# How long finished deliveries are remembered, to recognise rows from reads that were already running.
+OUTBOX_FINISHED_TTL = 60.0
+
+
+def retry_delay(
+    attempt: int,
+    base: float = OUTBOX_RETRY_BASE_DELAY,
+    cap: float = OUTBOX_RETRY_MAX_DELAY,
+) -> float:
+    """Backoff before retry number `attempt` (1-based): capped exponential, jittered to [d/2, d]."""
+    delay = min(cap, base * (2 ** max(0, attempt - 1)))
+    return random.uniform(delay / 2, delay)
+
+
+def destination_key(msg: Dict[str, Any], fallback_user_id: Any) -> str:
+    """Lane key: the thread if there is one, else the channel, else the DM user."""
+    if msg.get("thread_id"):
+        return f"t:{msg['thread_id']}"
+    if msg.get("channel_id"):
+        return f"c:{msg['channel_id']}"
+    return f"u:{fallback_user_id}"
+
+
+def rate_limit_delay(err: BaseException) -> Optional[float]:
+    """Seconds to pause for if err is a rate limit, else None."""
+    retry_after = getattr(err, "retry_after", None)  # discord.RateLimited
+    if retry_after is not None:
+        return float(retry_after)
+    if getattr(err, "status", None) != 429:
+        return None
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    for header in ("Retry-After", "X-RateLimit-Reset-After"):
+        try:
+            return float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return DEFAULT_RATE_LIMIT_DELAY
+
+
+class _Lane:
+    def __init__(self, key: str):
+        self.key = key
+        self.pending: Deque[Dict[str, Any]] = collections.deque()
+        self.task: Optional[asyncio.Task] = None
+        self.blocked_until = 0.0  # time.monotonic() deadline set by a 429
+
+
+class OutboxLanes:
+    """
+    Dispatches outbox rows into ordered per-destination lanes.
+
+    resolve_target(msg) -> Discord messageable or None
+    on_sent(msg)                  called after every page went out
+    on_failed(msg, error)         called when a send fails (caller schedules the retry)
+    on_unresolved(msg)            called when no target could be resolved
+    on_rate_limited(key, delay)   optional; called when a lane is paused by a 429
+    on_progress(msg, pages_sent)  optional; called after each page, so a retry
+                                  can resume at msg["pages_sent"]
+    """
+
+    def __init__(
+        self,
+        resolve_target: Callable[[Dict[str, Any]], Awaitable[Any]],
+        on_sent: Callable[[Dict[str, Any]], Awaitable[None]],
+        on_failed: Callable[[Dict[str, Any], str], Awaitable[None]],
+        on_unresolved: Callable[[Dict[str, Any]], Awaitable[None]],
+        *,
+        fallback_user_id: Any = None,
+        max_concurrent: int = OUTBOX_MAX_CONCURRENT_SENDS,
+        on_rate_limited: Optional[Callable[[str, float], None]] = None,
+        on_progress: Optional[Callable[[Dict[str, Any], int], Awaitable[None]]] = None,
+    ):
+        self.resolve_target = resolve_target
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.on_unresolved = on_unresolved
+        self.fallback_user_id = fallback_user_id
+        self.on_rate_limited = on_rate_limited
+        self.on_progress = on_progress
+        self._send_slots = asyncio.Semaphore(max(1, max_concurrent))
+        self._lanes: Dict[str, _Lane] = {}
+        self._in_flight: Set[str] = set()
+        # id -> time.monotonic() its delivery attempt finished, oldest first
+        self._finished: "collections.OrderedDict[str, float]" = collections.OrderedDict()
+
+    def submit(self, msg: Dict[str, Any], read_at: Optional[float] = None) -> bool:
+        """
+        Queue a row on its lane. Returns False if it is already queued or
+        sending, or if read_at (the time.monotonic() at which the caller's
+        query started) is before the row's last attempt finished: that read
+        may predate mark_delivered and show a sent row as still pending.
+        """
+        msg_id = msg.get("id")
+        if msg_id in self._in_flight:
+            return False
+        if read_at is not None and self._finished.get(msg_id, float("-inf")) >= read_at:
+            return False
+        self._in_flight.add(msg_id)
+        key = destination_key(msg, self.fallback_user_id)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane(key)
+        lane.pending.append(msg)
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.create_task(self._run_lane(lane))
+        return True
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def drain(self) -> None:
+        """Wait until every lane is idle."""
+        while True:
+            tasks = [lane.task for lane in self._lanes.values() if lane.task and not lane.task.done()]
+            if not tasks:
+                return
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        for lane in self._lanes.values():
+            if lane.task and not lane.task.done():
+                lane.task.cancel()
+        await asyncio.gather(*(lane.task for lane in self._lanes.values() if lane.task), return_exceptions=True)
+
+    async def _run_lane(self, lane: _Lane) -> None:
+        while lane.pending:
+            msg = lane.pending.popleft()
+            try:
+                await self._deliver(lane, msg)
+            except Exception as e:
+                print(f"[{time.ctime()}] [Ctx: outbox] Lane {lane.key} error for msg {msg.get('id')}: {e}", flush=True)
+            finally:
+                self._finish(msg.get("id"))
+        if lane.blocked_until <= time.monotonic():
+            self._lanes.pop(lane.key, None)
+
+    def _finish(self, msg_id: str) -> None:
+        now = time.monotonic()
+        self._finished.pop(msg_id, None)
+        self._finished[msg_id] = now
+        while self._finished:
+            oldest_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at <= OUTBOX_FINISHED_TTL:
+                break
+            self._finished.pop(oldest_id)
+        self._in_flight.discard(msg_id)
+
+    async def _deliver(self, lane: _Lane, msg: Dict[str, Any]) -> None:
+        msg_id = msg.get("id", "")
+        pages = plan_pages(msg.get("content") or "")
+        # Pages an earlier attempt already sent are not sent again.
+        done = min(msg.get("pages_sent") or 0, len(pages))
+        if done == len(pages):
+            await self.on_sent(msg)
+            return
+
+        target = await self.resolve_target(msg)
+        if not target:
+            print(f"[{time.ctime()}] [Ctx: outbox] Could not resolve target for msg {msg_id}")
+            await self.on_unresolved(msg)
+            return
+
+        attached = " + attachment" if pages[-1].attachment is not None else ""
+        resumed = f", resuming at page {done + 1}" if done else ""
+        print(f"[{time.ctime()}] [Ctx: outbox] Sending message to {target} "
+              f"({len(pages)} page(s){attached}{resumed})", flush=True)
+        try:
+            for page in pages[done:]:
+                await self._send_page(lane, target, page)
+                done += 1
+                msg["pages_sent"] = done
+                if self.on_progress is not None and done < len(pages):
+                    await self.on_progress(msg, done)
+        except Exception as send_err:
+            print(f"[{time.ctime()}] [Ctx: outbox] Send error for msg {msg_id}: {send_err}")
+            await self.on_failed(msg, str(send_err))
+            return
+        await self.on_sent(msg)
+
+    async def _send_page(self, lane: _Lane, target: Any, page: Page) -> None:
+        rate_limited = 0
+        while True:
+            wait = lane.blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            async with self._send_slots:
+                try:
+                    await send_page(target, page)
+                    return
+                except Exception as err:
+                    delay = rate_limit_delay(err)
+                    if delay is None or rate_limited >= OUTBOX_MAX_RATE_LIMIT_RETRIES:
+                        raise
+                    rate_limited += 1
+                    lane.blocked_until = time.monotonic() + delay
+                    print(f"[{time.ctime()}] [Ctx: outbox] Rate limited on {lane.key}; pausing lane {delay:.2f}s", flush=True)
+                    if self.on_rate_limited is not None:
+                        self.on_rate_limited(lane.key, delay)
@@ -0,0 +1,169 @@
+"""
+Splitting replies into Discord messages.
+
+Every send path (the outbox, scripts/send_message.py and the live-streamed
+replies in process_context) pages text through here. Pages are packed as
+full as DISCORD_MESSAGE_LIMIT allows. The break is the last newline that
+fits, else the last space in the second half of the page, else a hard cut.
+A ``` code fence that is open at a break is closed at the end of the page
+and re-opened (with its info string) at the top of the next one, so code
+blocks render on both sides.
+
+A reply that would take more than DISCORD_MAX_PAGES messages is sent as
+one short preview message with the full text attached as a file instead
+(unless it is over DISCORD_ATTACHMENT_MAX_BYTES): one upload in place of
+dozens of rate-limited sends.
+"""
+import io
+import os
+import re
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+import discord
+
+DISCORD_MESSAGE_LIMIT = 2000
+# 0 disables the attachment fallback.
+DISCORD_MAX_PAGES = int(os.environ.get("DISCORD_MAX_PAGES", "5"))
+DISCORD_ATTACHMENT_MAX_BYTES = int(os.environ.get("DISCORD_ATTACHMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+ATTACHMENT_FILENAME = "reply.md"
+
+# A fence line: up to three spaces of indent, then a run of three or more backticks.
+_FENCE_LINE = re.compile(r"^[ \t]{0,3}(`{3,})([^\n]*)$", re.MULTILINE)
+# A re-opened fence never takes more than this much of a page.
+_MAX_OPENER_CHARS = 64
+
+
+class Page(NamedTuple):
+    content: str
+    attachment: Optional[str] = None  # full text, uploaded as ATTACHMENT_FILENAME
+
+    def file(self) -> discord.File:
+        """A fresh discord.File for the attachment; sending one consumes it, so build one per attempt."""
+        return discord.File(io.BytesIO(self.attachment.encode("utf-8")), filename=ATTACHMENT_FILENAME)
+
+
+async def send_page(target: Any, page: Page) -> Any:
+    """target.send() a single page, with its attachment if it has one."""
+    if page.attachment is None:
+        return await target.send(page.content)
+    return await target.send(page.content or None, file=page.file())
+
+
+def open_fence(text: str, start: int = 0, end: Optional[int] = None, fence: Optional[str] = None) -> Optional[str]:
+    """
+    The code fence still open at `end`, given `fence` open at `start`.
+    Returns the fence's opening line (e.g. "```python"), or None.
+    """
+    end = len(text) if end is None else end
+    if text.find("```", start, end) == -1:
+        return fence
+    for match in _FENCE_LINE.finditer(text, start, end):
+        ticks, info = match.group(1), match.group(2)
+        if fence is None:
+            if "`" not in info:
+                fence = match.group(0).strip()
+        elif not info.strip() and len(ticks) >= _fence_ticks(fence):
+            fence = None
+    return fence
+
+
+def _fence_ticks(fence: str) -> int:
+    return len(fence) - len(fence.lstrip("`"))
+
+
+def _reopen(fence: Optional[str]) -> str:
+    if fence is None:
+        return ""
+    return (fence if len(fence) <= _MAX_OPENER_CHARS else "`" * _fence_ticks(fence)) + "\n"
+
+
+def _close(fence: Optional[str]) -> str:
+    return "" if fence is None else "\n" + "`" * _fence_ticks(fence)
+
+
+def _break(text: str, pos: int, stop: int, end: int) -> Tuple[int, int]:
+    """Where to end a page that may hold text[pos:stop] of text[:end]: (cut, start of the next page)."""
+    if stop <= pos:
+        return pos + 1, pos + 1  # always make progress
+    # A break character just past stop is fine: it is dropped, not put on the page.
+    search_end = min(stop + 1, end)
+    cut = text.rfind("\n", pos + 1, search_end)
+    if cut != -1:
+        return cut, cut + 1
+    cut = text.rfind(" ", pos + (stop - pos) // 2, search_end)
+    if cut > pos:
+        return cut, cut + 1
+    return stop, stop
+
+
+def next_page(
+    text: str,
+    pos: int,
+    fence: Optional[str] = None,
+    limit: int = DISCORD_MESSAGE_LIMIT,
+    end: Optional[int] = None,
+) -> Tuple[str, int, Optional[str]]:
+    """
+    The page starting at text[pos], treating text[:end] as the whole text.
+    `fence` is the code fence open at pos. Returns (page, next pos, fence
+    open at next pos). The page is stripped and may be "" if there was only
+    whitespace left.
+    """
+    end = len(text) if end is None else end
+    prefix = _reopen(fence)
+    room = limit - len(prefix)
+    if end - pos <= room:
+        after = open_fence(text, pos, end, fence)
+        if end - pos + len(_close(after)) <= room:
+            return _render(prefix, text[pos:end], after), end, after
+    stop = min(end, pos + room)
+    while True:
+        cut, next_pos = _break(text, pos, stop, end)
+        after = open_fence(text, pos, cut, fence)
+        if cut - pos + len(_close(after)) <= room or stop <= pos + 1:
+            break
+        # Make room to close the fence; the shorter page may not end inside it any more.
+        stop = pos + room - len(_close(after))
+    return _render(prefix, text[pos:cut], after), min(next_pos, end), after
+
+
+def _render(prefix: str, body: str, fence_after: Optional[str]) -> str:
+    body = body.strip()
+    if not body:
+        return ""
+    return prefix + body + _close(fence_after)
+
+
+def paginate(content: str, limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """Split content into non-empty pages of at most `limit` characters."""
+    text = (content or "").strip()
+    if len(text) <= limit:
+        return [text] if text else []
+    pages = []
+    pos, fence = 0, None
+    while pos < len(text):
+        page, pos, fence = next_page(text, pos, fence, limit)
+        if page:
+            pages.append(page)
+    return pages
+
+
+def plan_pages(
+    content: str,
+    limit: int = DISCORD_MESSAGE_LIMIT,
+    max_pages: int = DISCORD_MAX_PAGES,
+) -> List[Page]:
+    """The messages to send for content: its pages, or a preview plus attachment if there are too many."""
+    pages = paginate(content, limit)
+    if not max_pages or len(pages) <= max_pages:
+        return [Page(page) for page in pages]
+    text = content.strip()
+    if len(text.encode("utf-8")) > DISCORD_ATTACHMENT_MAX_BYTES:
+        return [Page(page) for page in pages]
+    note = attachment_note(text, len(pages))
+    preview = paginate(text[:limit], limit - len(note) - 2)[0]
+    return [Page(f"{preview}\n\n{note}", attachment=text)]
+
+
+def attachment_note(text: str, pages: int) -> str:
+    return f"_(Full reply attached as {ATTACHMENT_FILENAME}: {len(text):,} characters, {pages} messages long.)_"
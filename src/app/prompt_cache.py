@@ -0,0 +1,169 @@
+"""
+Cache of the assembled system rules from prompts/components/*.md.
+
+The rules are the same for every turn of every context, so they are read
+and joined once and shared until a component changes. Changes are detected
+by the directory's mtime (files added, removed or renamed) and each
+component's mtime and size (files edited in place). That check runs at most
+once per check_interval, so a burst of concurrent turns costs one scan.
+
+Every assembled version carries a SHA-256 of its text, so callers can tell
+whether the rules changed between two turns. A resumed Gemini session
+already has the rules it was seeded with: session_rules() returns nothing
+for it when they are unchanged, and only the changed sections when the
+previous version is still known.
+"""
+import collections
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+_DISCORD_BOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROMPT_COMPONENTS_DIR = os.path.join(_DISCORD_BOT_DIR, "prompts", "components")
+PROMPT_CACHE_CHECK_INTERVAL = float(os.environ.get("GEMINI_PROMPT_CACHE_CHECK_INTERVAL", "1.0"))
+PROMPT_CACHE_VERSIONS = 16  # past versions kept for computing deltas
+
+
+@dataclass(frozen=True)
+class PromptRules:
+    text: str  # components joined by "\n"; "" if there are none
+    sha256: str
+    components: Tuple[Tuple[str, str], ...]  # (filename, stripped text), in prompt order
+
+    @property
+    def files(self) -> Tuple[str, ...]:
+        return tuple(name for name, _ in self.components)
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode("utf-8"))
+
+
+_EMPTY = PromptRules(text="", sha256=hashlib.sha256(b"").hexdigest(), components=())
+
+
+def rules_delta(previous: PromptRules, current: PromptRules) -> str:
+    """Text telling a session seeded with `previous` what changed in `current`."""
+    old = dict(previous.components)
+    new = dict(current.components)
+    changed = [text for name, text in current.components if old.get(name) != text]
+    removed = [_title(text) for name, text in previous.components if name not in new]
+    lines = ["--- SYSTEM RULES UPDATE (replaces earlier versions of these sections) ---"]
+    lines.extend(changed)
+    if removed:
+        lines.append("These rule sections no longer apply: " + "; ".join(removed))
+    lines.append("--- END OF SYSTEM RULES UPDATE ---")
+    return "\n".join(lines)
+
+
+def _title(text: str) -> str:
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip().lstrip("#").strip()
+    return "(empty section)"
+
+
+class PromptComponentCache:
+    def __init__(self, components_dir: str = PROMPT_COMPONENTS_DIR, *,
+                 check_interval: float = PROMPT_CACHE_CHECK_INTERVAL):
+        self.components_dir = components_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rules = _EMPTY
+        self._signature: Optional[tuple] = None
+        self._checked_at = float("-inf")
+        self._versions: "collections.OrderedDict[str, PromptRules]" = collections.OrderedDict()
+        self.builds = 0
+
+    def get(self) -> PromptRules:
+        """The current rules; rebuilt only if a component changed since the last check."""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._rules
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                signature = self._scan()
+                if signature != self._signature:
+                    self._rules = self._build(signature)
+                    self._signature = signature
+                    self.builds += 1
+                    self._versions[self._rules.sha256] = self._rules
+                    self._versions.move_to_end(self._rules.sha256)
+                    while len(self._versions) > PROMPT_CACHE_VERSIONS:
+                        self._versions.popitem(last=False)
+                self._checked_at = time.monotonic()
+            return self._rules
+
+    def version(self, sha256: Optional[str]) -> Optional[PromptRules]:
+        """A recently assembled version by hash, if this process still has it."""
+        return self._versions.get(sha256) if sha256 else None
+
+    def session_rules(self, seeded_hash: Optional[str]) -> Tuple[str, PromptRules]:
+        """
+        The rules text to send to a resumed session that was given the
+        version `seeded_hash`, and the current rules: "" if unchanged, a
+        delta if that version is still known (and the delta is smaller), the
+        full rules otherwise.
+        """
+        rules = self.get()
+        if seeded_hash == rules.sha256:
+            return "", rules
+        previous = self.version(seeded_hash)
+        if previous is not None:
+            delta = rules_delta(previous, rules)
+            if len(delta) < len(rules.text):
+                return delta, rules
+        return rules.text, rules
+
+    def invalidate(self) -> None:
+        """Force a re-check on the next get()."""
+        self._checked_at = float("-inf")
+
+    def _scan(self) -> Optional[tuple]:
+        try:
+            dir_mtime = os.stat(self.components_dir).st_mtime_ns
+            entries = []
+            with os.scandir(self.components_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".md"):
+                        st = entry.stat()
+                        entries.append((entry.name, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            return None
+        return (dir_mtime, tuple(sorted(entries)))
+
+    def _build(self, signature: Optional[tuple]) -> PromptRules:
+        if signature is None:
+            return _EMPTY
+        components = []
+        for filename, _, _ in signature[1]:
+            try:
+                with open(os.path.join(self.components_dir, filename), "r") as f:
+                    components.append((filename, f.read().strip()))
+            except Exception as e:
+                print(f"[{time.ctime()}] WARNING: Could not read {filename}: {e}", flush=True)
+        text = "\n".join(part for _, part in components)
+        return PromptRules(text=text, sha256=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                           components=tuple(components))
+
+
+_default_cache: Optional[PromptComponentCache] = None
+
+
+def _cache() -> PromptComponentCache:
+    global _default_cache
+    if _default_cache is None or _default_cache.components_dir != PROMPT_COMPONENTS_DIR:
+        _default_cache = PromptComponentCache(PROMPT_COMPONENTS_DIR)
+    return _default_cache
+
+
+def prompt_rules() -> PromptRules:
+    """The system rules assembled from PROMPT_COMPONENTS_DIR, shared by every turn."""
+    return _cache().get()
+
+
+def session_rules(seeded_hash: Optional[str]) -> Tuple[str, PromptRules]:
+    """PromptComponentCache.session_rules() on the shared cache."""
+    return _cache().session_rules(seeded_hash)
@@ -0,0 +1,95 @@
+"""
+Incremental paging of a streamed Gemini reply into Discord-sized messages.
+
+The reply arrives as many small text events. StreamingReplyBuffer keeps the
+chunks in a list (the full reply is joined once, at the end) and holds only
+the uncommitted tail as the current page, so each append costs time
+proportional to the chunk plus at most one page, however long the reply
+gets.
+
+A page is committed when the model writes the NEW_MESSAGE_MARKER, or when
+the current page grows past page_limit. Pages are cut by the shared
+paginator, so a code fence open at a cut is closed on the committed page
+and re-opened on the current one.
+"""
+from typing import List, Optional
+
+from src.app.paginator import DISCORD_MESSAGE_LIMIT, next_page
+
+NEW_MESSAGE_MARKER = "---NEW_MESSAGE---"
+# The status line shown above a page ("_Running tool: ..._") is cut to this
+# length, and pages leave room for it.
+REPLY_STATUS_CHARS = 90
+REPLY_PAGE_LIMIT = DISCORD_MESSAGE_LIMIT - REPLY_STATUS_CHARS - 10
+
+
+class StreamingReplyBuffer:
+    def __init__(self, page_limit: int = REPLY_PAGE_LIMIT, marker: str = NEW_MESSAGE_MARKER):
+        self.page_limit = page_limit
+        self.marker = marker
+        self._chunks: List[str] = []
+        self._page = ""       # uncommitted text: never more than page_limit + len(marker) - 1
+        self._fence: Optional[str] = None  # code fence carried over from the last committed page
+        self._room = page_limit  # page_limit less the re-opened fence line
+        self.committed = 0    # characters of the reply already committed to pages (markers included)
+        self.pages = 0
+
+    def append(self, chunk: str) -> List[str]:
+        """Add streamed text; return the pages it completed (stripped, possibly empty)."""
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        page = self._page + chunk
+        # The common case: a marker can only be completed by a chunk holding its last character.
+        if len(page) <= self._room and self.marker[-1] not in chunk:
+            self._page = page
+            return []
+        # Only the end of the old page can hold the start of a marker completed by this chunk.
+        search_from = max(0, len(self._page) - len(self.marker) + 1)
+        return self._split(page, search_from, final=False)
+
+    def finish(self) -> List[str]:
+        """No more text is coming: commit any overflow. The last page stays current()."""
+        return self._split(self._page, len(self._page), final=True)
+
+    def current(self) -> str:
+        """The page still being written, stripped."""
+        page = self._page.strip()
+        if self._fence is None or not page:
+            return page
+        return f"{self._fence}\n{page}"
+
+    def text(self) -> str:
+        """The whole reply so far, markers removed and stripped."""
+        return "".join(self._chunks).replace(self.marker, "").strip()
+
+    def __len__(self) -> int:
+        return self.committed + len(self._page)
+
+    def _split(self, text: str, search_from: int, final: bool) -> List[str]:
+        pages = []
+        pos = 0
+        fence = self._fence
+        marker_at = text.find(self.marker, search_from)
+        # Unless the reply is complete, leave room for a marker that is only partly written.
+        slack = 0 if final else len(self.marker) - 1
+        while True:
+            if marker_at != -1 and marker_at < pos:
+                marker_at = text.find(self.marker, pos)
+            if marker_at != -1:
+                # Everything up to the marker is done: page it (a long stretch may take several pages).
+                page, pos, fence = next_page(text, pos, fence, self.page_limit, end=marker_at)
+                pages.append(page)
+                if pos >= marker_at:
+                    pos = marker_at + len(self.marker)
+            else:
+                self._fence = fence
+                self._room = self.page_limit - (len(fence) + 1 if fence else 0)
+                if len(text) - pos <= self._room + slack:
+                    break
+                page, pos, fence = next_page(text, pos, fence, self.page_limit)
+                pages.append(page)
+        self.committed += pos
+        self.pages += len(pages)
+        self._page = text[pos:]
+        return pages
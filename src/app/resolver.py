@@ -0,0 +1,115 @@
+"""
+Shared resolver for Discord channels and users.
+
+Wraps `client.get_channel(...) or await client.fetch_channel(...)` (and the
+user equivalent) with a size-bounded LRU cache whose entries expire after a
+TTL. 404s are cached as misses for a shorter TTL, and concurrent lookups of
+the same id share a single in-flight fetch.
+"""
+import asyncio
+import collections
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import discord
+
+RESOLVER_MAX_ENTRIES = int(os.environ.get("DISCORD_RESOLVER_MAX_ENTRIES", "512"))
+RESOLVER_TTL = float(os.environ.get("DISCORD_RESOLVER_TTL", "600"))
+RESOLVER_NEGATIVE_TTL = float(os.environ.get("DISCORD_RESOLVER_NEGATIVE_TTL", "60"))
+
+_Key = Tuple[str, int]
+
+
+class DiscordResolver:
+    def __init__(
+        self,
+        client: discord.Client,
+        *,
+        max_entries: int = RESOLVER_MAX_ENTRIES,
+        ttl: float = RESOLVER_TTL,
+        negative_ttl: float = RESOLVER_NEGATIVE_TTL,
+    ):
+        self.client = client
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # key -> (value or None for a cached 404, expires_at on time.monotonic())
+        self._cache: "collections.OrderedDict[_Key, Tuple[Any, float]]" = collections.OrderedDict()
+        self._inflight: Dict[_Key, asyncio.Task] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def channel(self, channel_id: Any) -> Optional[Any]:
+        """Resolve a channel, thread or DM channel id. None if Discord says 404."""
+        return await self._resolve("channel", int(channel_id))
+
+    async def user(self, user_id: Any) -> Optional[Any]:
+        """Resolve a user id. None if Discord says 404."""
+        return await self._resolve("user", int(user_id))
+
+    def remember(self, kind: str, obj_id: Any, value: Any) -> None:
+        """Seed the cache with an object we already hold (e.g. a freshly created thread)."""
+        self._store((kind, int(obj_id)), value, self.ttl)
+
+    def invalidate(self, kind: str, obj_id: Any) -> None:
+        self._cache.pop((kind, int(obj_id)), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "size": len(self._cache),
+        }
+
+    async def _resolve(self, kind: str, obj_id: int) -> Optional[Any]:
+        key = (kind, obj_id)
+        entry = self._cache.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                if value is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return value
+            del self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # shield: one cancelled caller must not cancel the fetch for everyone else.
+        return await asyncio.shield(task)
+
+    async def _load(self, key: _Key) -> Optional[Any]:
+        kind, obj_id = key
+        try:
+            if kind == "channel":
+                value = self.client.get_channel(obj_id) or await self.client.fetch_channel(obj_id)
+            else:
+                value = self.client.get_user(obj_id) or await self.client.fetch_user(obj_id)
+        except discord.NotFound:
+            self._store(key, None, self.negative_ttl)
+            return None
+        if value is not None:
+            self._store(key, value, self.ttl)
+        return value
+
+    def _store(self, key: _Key, value: Any, ttl: float) -> None:
+        self._cache[key] = (value, time.monotonic() + ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
@@ -3,10 +3,16 @@ import json
 import os
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, AsyncGenerator
+from typing import Any, Dict, List, Optional, Tuple, AsyncGenerator
 from dotenv import load_dotenv
 
-from src.db.queries import get_messages_for_context, get_context, update_context_session_id
+from src.app.cli_pool import GeminiCliPool, build_cli_args, cli_env
+from src.app.stream_json import JsonlScanner, PromptEchoFilter, loads as json_loads
+from src.app.log_sink import LogSink
+from src.app.trace_store import TraceStore
+from src.app.prompt_cache import PromptRules, prompt_rules, session_rules
+from src.app.history import HistoryWindow, build_history_window, refresh_context_digest, render_history
+from src.db.async_queries import get_context, update_context_session_id, run_read, run_write
 
 load_dotenv()
 
@@ -16,6 +22,29 @@ GEMINI_RESPONSES_LOG = os.path.join(_DISCORD_BOT_DIR, "gemini_responses.log")
 GEMINI_TRACES_DIR = os.path.join(_DISCORD_BOT_DIR, "logs", "gemini_traces")
 GEMINI_RESPONSES_LOG = os.path.join(_DISCORD_BOT_DIR, "gemini_responses.log")
 
+_responses_sink: Optional[LogSink] = None
+_trace_store: Optional[TraceStore] = None
+
+
+def responses_log() -> LogSink:
+    """Background sink for GEMINI_RESPONSES_LOG (re-created if the path is changed)."""
+    global _responses_sink
+    if _responses_sink is None or _responses_sink.path != GEMINI_RESPONSES_LOG:
+        if _responses_sink is not None:
+            _responses_sink.close()
+        _responses_sink = LogSink(GEMINI_RESPONSES_LOG)
+    return _responses_sink
+
+
+def trace_store() -> TraceStore:
+    """Segment store for per-turn traces under GEMINI_TRACES_DIR (re-created if the path is changed)."""
+    global _trace_store
+    if _trace_store is None or _trace_store.root != GEMINI_TRACES_DIR:
+        if _trace_store is not None:
+            _trace_store.close()
+        _trace_store = TraceStore(GEMINI_TRACES_DIR)
+    return _trace_store
+
 @dataclass(frozen=True)
 class GeminiEvent:
     type: str  # "text", "tool_use", "tool_result", "error", "status"
@@ -41,59 +70,43 @@ def render_transcript(messages: List[Dict[str, Any]]) -> str:
     return "\n".join(lines)
 
 
-def build_prompt_text(latest_user_message: Dict[str, Any], context_id: str, ignore_history: bool = False) -> str:
+def load_history_window(latest_user_message: Dict[str, Any], context_id: str) -> Optional[HistoryWindow]:
+    """The history window before this message, or None if it could not be read."""
+    try:
+        before = (float(latest_user_message.get("timestamp", time.time())), latest_user_message.get("id") or "")
+        return build_history_window(context_id, before)
+    except Exception as e:
+        print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Could not load conversation history: {e}", flush=True)
+        return None
+
+
+def build_prompt_text(latest_user_message: Dict[str, Any], context_id: str, ignore_history: bool = False,
+                      rules_text: Optional[str] = None, history: Optional[HistoryWindow] = None) -> str:
+    """
+    Assemble the prompt for one turn. The system rules go first: in full by
+    default, or `rules_text` instead when given (a resumed session only
+    needs the rules it hasn't seen; "" for none). `history` is a window
+    already loaded with load_history_window; otherwise one is loaded here.
+    """
     latest_content = (latest_user_message.get("content") or "").strip()
     turn_start_ts = float(latest_user_message.get("timestamp", time.time()))
 
-    # Fetch previous message for context if in a thread or channel
+    # A cold start has no session memory: include as much history as fits the budget
     context_prefix = ""
     if not ignore_history:
-        try:
-            relevant_messages = get_messages_for_context(context_id)
-        
-            # Find the message right before the current one
-            prev_msg = None
-            current_id = latest_user_message.get("id")
-            
-            idx = -1
-            for i, m in enumerate(relevant_messages):
-                if current_id and m.get("id") == current_id:
-                    idx = i
-                    break
-                elif float(m.get("timestamp", 0)) == turn_start_ts:
-                    idx = i
-                    break
-
-            if idx > 0:
-                prev_msg = relevant_messages[idx - 1]
-            elif idx == -1 and relevant_messages:
-                if float(relevant_messages[-1].get("timestamp", 0)) < turn_start_ts:
-                    prev_msg = relevant_messages[-1]
-
-            if prev_msg:
-                prev_role = "User" if prev_msg.get("source") == "user" else "Bot"
-                prev_text = (prev_msg.get("content") or "").strip()
-                if prev_text:
-                    context_prefix = f"--- PREVIOUS MESSAGE CONTENT FOR CONTEXT ---\n{prev_role}: {prev_text}\n------------------------------------------\n\n"
-        except Exception as e:
-            print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Could not load previous message context: {e}", flush=True)
-
-    # Read modular prompt components
-    system_rules = []
-    components_dir = os.path.join(_DISCORD_BOT_DIR, "prompts", "components")
-    if os.path.exists(components_dir):
-        for filename in sorted(os.listdir(components_dir)):
-            if filename.endswith(".md"):
-                file_path = os.path.join(components_dir, filename)
-                try:
-                    with open(file_path, "r") as f:
-                        system_rules.append(f.read().strip())
-                except Exception as e:
-                    print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Could not read {filename}: {e}", flush=True)
+        if history is None:
+            history = load_history_window(latest_user_message, context_id)
+        if history is not None:
+            context_prefix = render_history(history)
 
+    # Modular prompt components, assembled once and shared (see src/app/prompt_cache.py)
     prompt_parts = []
-    if system_rules:
-        prompt_parts.extend(system_rules)
+    if rules_text is None:
+        system_rules = prompt_rules()
+        if system_rules.files:
+            prompt_parts.append(system_rules.text)
+    elif rules_text:
+        prompt_parts.append(rules_text)
 
     prompt_parts.extend([
         "---",
@@ -125,54 +138,45 @@ async def call_gemini_cli(
     cwd: Optional[str] = None,
     env: Optional[dict] = None,
     session_id: Optional[str] = None,
+    cli_pool: Optional[GeminiCliPool] = None,
 ) -> AsyncGenerator[GeminiEvent, None]:
     print(f"[{time.ctime()}] [Ctx: {context_id}] Invoking Gemini CLI (Streaming): {gemini_cmd}", flush=True)
     print(f"[{time.ctime()}] [Ctx: {context_id}] Prompt length: {len(prompt_text)} chars", flush=True)
-    
-    args = [
-        gemini_cmd,
-    ]
-    if session_id:
-        args.extend(["-r", session_id])
-        
-    args.extend([
-        "--output-format", "stream-json",
-        "--approval-mode", "yolo",
-    ])
-    
-    # Always record responses to the trace directory (one file per turn)
+
+    # Record a sample of turns to the trace directory; after the turn the file
+    # is moved into the trace store's segments (see src/app/trace_store.py).
     os.makedirs(GEMINI_TRACES_DIR, exist_ok=True)
     turn_ts_int = int(time.time() * 1000)
     trace_filename = f"{context_id}_{turn_ts_int}.json"
     responses_path = os.path.join(GEMINI_TRACES_DIR, trace_filename)
     
     dump_dir = os.environ.get("DEBUG_PROMPT_DUMP_DIR")
-    if dump_dir and os.path.isdir(dump_dir):
+    testing_mode = bool(dump_dir and os.path.isdir(dump_dir))
+    if testing_mode:
         # Override to dump dir if in testing mode
         responses_path = os.path.join(dump_dir, "recorded_responses.json")
-        
-    args.extend(["--record-responses", responses_path])
+    record = testing_mode or trace_store().should_record()
 
-    if os.environ.get("GEMINI_RUNNER_DEBUG") == "1":
-        args.append("--debug")
-    
-    if env is None:
-        env = os.environ.copy()
-    
-    # Force non-interactive/dumb terminal behavior
-    env["TERM"] = "dumb"
-    env["GEMINI_CLI_NON_INTERACTIVE"] = "1"
-    env.setdefault("DISCORD_OUTBOX_ONLY", "1")
+    env = cli_env(env)
+
+    # A pre-spawned process skips CLI startup; it records to its own trace file (renamed below).
+    started = time.monotonic()
+    warm = cli_pool.acquire(session_id) if cli_pool is not None and not testing_mode else None
 
     try:
-        proc = await asyncio.create_subprocess_exec(
-            *args,
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=cwd,
-            env=env,
-        )
+        if warm is not None:
+            warm.handoff(env)
+            proc = warm.proc
+            print(f"[{time.ctime()}] [Ctx: {context_id}] Using warm Gemini CLI (pid {proc.pid})", flush=True)
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                *build_cli_args(gemini_cmd, session_id, responses_path if record else None),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                env=env,
+            )
 
         # Yield PID for tracking
         yield GeminiEvent(type="status", content="spawned", metadata={"pid": proc.pid})
@@ -204,29 +208,42 @@ async def call_gemini_cli(
         deadline = time.monotonic() + timeout_s if timeout_s else None
         
         # Read JSONL from stdout manually to avoid readline() limits
-        buffer = bytearray()
-        
-        def process_line(line: str):
+        scanner = JsonlScanner()
+        prompt_echo = PromptEchoFilter(prompt_text)
+        first_event_seen = False
+
+        def note_first_event():
+            nonlocal first_event_seen
+            if first_event_seen:
+                return
+            first_event_seen = True
+            elapsed = time.monotonic() - started
+            print(f"[{time.ctime()}] [Ctx: {context_id}] First CLI event after {elapsed:.2f}s "
+                  f"({'warm' if warm is not None else 'cold'} start)", flush=True)
+            if cli_pool is not None and not testing_mode:
+                cli_pool.record_first_event(warm is not None, elapsed)
+
+        def process_line(line: bytes):
             line = line.strip()
             if not line:
                 return None
-                
+
             try:
-                event = json.loads(line)
-                ev_type = event.get("type")
-                
-                # Raw response logging — single file at discord_bot/gemini_responses.log
                 try:
-                    with open(GEMINI_RESPONSES_LOG, "a") as f:
-                        f.write(f"[{time.ctime()}] [Ctx: {context_id}] {line.strip()}\n")
-                except Exception:
-                    pass
+                    event = json_loads(line)
+                except ValueError:
+                    # Invalid UTF-8: parse what the old decode(errors="replace") path would have seen.
+                    event = json.loads(line.decode("utf-8", errors="replace"))
+                ev_type = event.get("type")
+
+                # Raw response logging — discord_bot/gemini_responses.log, written off the loop
+                responses_log().write(f"[{time.ctime()}] [Ctx: {context_id}] {line.decode('utf-8', errors='replace')}\n")
 
                 if ev_type == "message":
                     chunk_text = event.get("content", "")
-                    
+
                     # Filter out prompt echo (CLI echoes the prompt in stream-json mode)
-                    if chunk_text.strip() == prompt_text.strip():
+                    if prompt_echo.matches(chunk_text):
                         print(f"[{time.ctime()}] [Ctx: {context_id}] Filtering prompt echo.", flush=True)
                         return None
 
@@ -234,7 +251,7 @@ async def call_gemini_cli(
                     role = (event.get("metadata") or {}).get("role")
                     if role == "user":
                         return None
-                        
+
                     if chunk_text:
                         return GeminiEvent(type="text", content=chunk_text)
                 elif ev_type == "init":
@@ -248,8 +265,8 @@ async def call_gemini_cli(
                     return GeminiEvent(type="error", content=event.get("content", ""))
                 elif ev_type == "result":
                     pass
-            except json.JSONDecodeError:
-                print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Non-JSON output from CLI: {line}", flush=True)
+            except ValueError:
+                print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Non-JSON output from CLI: {line.decode('utf-8', errors='replace')}", flush=True)
             return None
 
         while True:
@@ -261,20 +278,18 @@ async def call_gemini_cli(
             else:
                 chunk = await proc.stdout.read(65536)
             if not chunk:
-                if buffer:
-                    line = buffer.decode("utf-8", errors="replace")
-                    ev = process_line(line)
+                tail = scanner.flush()
+                if tail:
+                    ev = process_line(tail)
                     if ev:
+                        note_first_event()
                         yield ev
                 break
-                
-            buffer.extend(chunk)
-            while b'\n' in buffer:
-                line_b, remaining = buffer.split(b'\n', 1)
-                buffer = bytearray(remaining)
-                line = line_b.decode("utf-8", errors="replace")
+
+            for line in scanner.feed(chunk):
                 ev = process_line(line)
                 if ev:
+                    note_first_event()
                     yield ev
 
         if deadline is not None:
@@ -302,6 +317,17 @@ async def call_gemini_cli(
             await stderr_task
         except Exception:
             pass
+        if warm is not None:
+            try:
+                if record:
+                    os.replace(warm.trace_path, responses_path)
+                else:
+                    os.remove(warm.trace_path)
+            except OSError:
+                pass
+            warm.cleanup()
+        if record and not testing_mode:
+            trace_store().submit(responses_path, context_id, turn_ts_int / 1000)
 
     stderr = "".join(stderr_parts).strip()
     if stderr:
@@ -312,18 +338,51 @@ async def call_gemini_cli(
             print(f"[{time.ctime()}] [Ctx: {context_id}] DEBUG STDERR: {stderr}", flush=True)
 
 
+def build_turn_prompt(latest_message: Dict[str, Any], context_id: str, session_id: Optional[str],
+                      seeded_rules_hash: Optional[str]) -> Tuple[str, PromptRules, int, Optional[HistoryWindow]]:
+    """
+    build_prompt_text for run_next_turn. A resumed session gets only the
+    system rules it has not seen yet (see prompt_cache.session_rules).
+    Returns the prompt, the current rules, how many bytes of rules it
+    carries, and the history window a cold start was given (else None).
+    """
+    if not session_id:
+        rules = prompt_rules()
+        history = load_history_window(latest_message, context_id)
+        return build_prompt_text(latest_message, context_id, history=history), rules, rules.size, history
+    rules_text, rules = session_rules(seeded_rules_hash)
+    prompt_text = build_prompt_text(latest_message, context_id, ignore_history=True, rules_text=rules_text)
+    return prompt_text, rules, len(rules_text.encode("utf-8")), None
+
+
+def _log_rules_sent(context_id: str, rules: PromptRules, sent: int) -> None:
+    if sent == rules.size:
+        how = "full"
+    elif sent == 0:
+        how = "none, session already has them"
+    else:
+        how = "delta"
+    print(f"[{time.ctime()}] [Ctx: {context_id}] Prompt rules {rules.sha256[:12]}: {how} "
+          f"({sent} of {rules.size} bytes sent, {max(rules.size - sent, 0)} bytes saved)", flush=True)
+
+
 async def run_next_turn(
     latest_message: Dict[str, Any],
     context_id: str,
     *,
     gemini_cmd: str = "gemini",
     project_root: Optional[str] = None,
+    cli_pool: Optional[GeminiCliPool] = None,
 ):
-    ctx = get_context(context_id)
+    ctx = await get_context(context_id)
     session_id = ctx.get("gemini_session_id") if ctx else None
 
     print(f"[{time.ctime()}] [Ctx: {context_id}] Processing user message... (Session: {session_id or 'None'})", flush=True)
-    prompt_text = build_prompt_text(latest_message, context_id, ignore_history=bool(session_id))
+    # Prompt assembly reads the DB and prompt files, so keep it off the event loop
+    prompt_text, rules, rules_sent, history = await run_read(
+        build_turn_prompt, latest_message, context_id, session_id, ctx.get("prompt_rules_hash") if ctx else None,
+    )
+    _log_rules_sent(context_id, rules, rules_sent)
 
     env = os.environ.copy()
     env.setdefault("DISCORD_OUTBOX_ONLY", "1")
@@ -335,10 +394,13 @@ async def run_next_turn(
 
     buffered_events = []
     session_invalid = False
+    next_session_id = session_id
 
-    async for event in call_gemini_cli(prompt_text, context_id=context_id, gemini_cmd=gemini_cmd, cwd=project_root, env=env, session_id=session_id):
+    async for event in call_gemini_cli(prompt_text, context_id=context_id, gemini_cmd=gemini_cmd, cwd=project_root, env=env, session_id=session_id, cli_pool=cli_pool):
         if event.type == "init":
-            update_context_session_id(context_id, event.content)
+            # Whatever rules were sent, the session is now up to date with them.
+            await update_context_session_id(context_id, event.content, rules.sha256)
+            next_session_id = event.content or next_session_id
             buffered_events.append(event)
         elif event.type == "error" and session_id and "Invalid session identifier" in event.content:
             session_invalid = True
@@ -353,13 +415,29 @@ async def run_next_turn(
 
     if session_invalid:
         print(f"[{time.ctime()}] [Ctx: {context_id}] Session {session_id} invalid. Clearing and falling back to cold start.", flush=True)
-        update_context_session_id(context_id, None)
-        prompt_text = build_prompt_text(latest_message, context_id, ignore_history=False)
-        
-        async for event in call_gemini_cli(prompt_text, context_id=context_id, gemini_cmd=gemini_cmd, cwd=project_root, env=env, session_id=None):
+        await update_context_session_id(context_id, None)
+        prompt_text, rules, rules_sent, history = await run_read(build_turn_prompt, latest_message, context_id, None, None)
+        _log_rules_sent(context_id, rules, rules_sent)
+
+        next_session_id = None
+        async for event in call_gemini_cli(prompt_text, context_id=context_id, gemini_cmd=gemini_cmd, cwd=project_root, env=env, session_id=None, cli_pool=cli_pool):
             if event.type == "init":
-                update_context_session_id(context_id, event.content)
+                await update_context_session_id(context_id, event.content, rules.sha256)
+                next_session_id = event.content or None
             yield event
     else:
         for e in buffered_events:
             yield e
+
+    if history is not None and history.overflow_before is not None:
+        # Fold what this cold start's history window could not fit into the context's digest.
+        try:
+            folded = await run_write(refresh_context_digest, context_id, history.overflow_before)
+            if folded:
+                print(f"[{time.ctime()}] [Ctx: {context_id}] Folded {folded} older message(s) into the context digest.", flush=True)
+        except Exception as e:
+            print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Could not update context digest: {e}", flush=True)
+
+    if cli_pool is not None:
+        # The conversation will most likely continue: have a `-r` process ready for it.
+        cli_pool.prewarm_session(next_session_id)
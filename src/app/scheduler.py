@@ -0,0 +1,116 @@
+"""
+Bounded turn scheduler for gemini_worker.
+
+Every turn runs a Gemini CLI subprocess, so the number of turns in flight is
+capped. Turns past the cap simply stay unclaimed in pending_turns (durable,
+and visible to other processes); whenever a slot frees up the scheduler
+claims the next one. Ordering - priority lane, per-user fairness, FIFO - is
+decided by claim_turn in SQL, so it holds across processes too.
+"""
+import asyncio
+import collections
+import os
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+TURN_MAX_CONCURRENT = int(os.environ.get("GEMINI_MAX_CONCURRENT_TURNS", "3"))
+# How many recent queue-wait samples stats() summarizes.
+TURN_WAIT_WINDOW = 256
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class TurnScheduler:
+    """
+    claim() -> pending_turns row or None    leases the next turn
+    run(row) -> awaitable                   runs it (and completes the lease)
+    """
+
+    def __init__(
+        self,
+        claim: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        run: Callable[[Dict[str, Any]], Awaitable[None]],
+        *,
+        max_concurrent: int = TURN_MAX_CONCURRENT,
+    ):
+        self.claim = claim
+        self.run = run
+        self.max_concurrent = max(1, max_concurrent)
+        self._running: Set[asyncio.Task] = set()
+        self._fill_lock = asyncio.Lock()
+        self._waits: Deque[float] = collections.deque(maxlen=TURN_WAIT_WINDOW)
+        self._closed = False
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    async def fill(self) -> int:
+        """Claim turns until every slot is busy or nothing is claimable. Returns how many started."""
+        started = 0
+        async with self._fill_lock:
+            while not self._closed and len(self._running) < self.max_concurrent:
+                row = await self.claim()
+                if row is None:
+                    break
+                self._start(row)
+                started += 1
+        return started
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        return {
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_p50": _percentile(waits, 0.50),
+            "wait_p95": _percentile(waits, 0.95),
+            "wait_max": max(waits) if waits else None,
+        }
+
+    async def drain(self) -> None:
+        """Wait until no turn is running."""
+        while self._running:
+            await asyncio.gather(*list(self._running), return_exceptions=True)
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*list(self._running), return_exceptions=True)
+
+    def _start(self, row: Dict[str, Any]) -> None:
+        if row.get("claimed_at") is not None and row.get("enqueued_at") is not None:
+            self._waits.append(max(0.0, row["claimed_at"] - row["enqueued_at"]))
+        self.started += 1
+        task = asyncio.create_task(self.run(row))
+        self._running.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed += 1
+            print(f"[{time.ctime()}] ERROR in turn task: {task.exception()}", flush=True)
+        else:
+            self.completed += 1
+        if not self._closed:
+            asyncio.ensure_future(self._refill())
+
+    async def _refill(self) -> None:
+        try:
+            await self.fill()
+        except Exception as e:
+            print(f"[{time.ctime()}] ERROR claiming next turn: {e}", flush=True)
@@ -0,0 +1,86 @@
+"""
+Helpers for reading the Gemini CLI's stream-json (JSONL) output.
+
+JsonlScanner splits a byte stream into lines incrementally: it remembers
+where the previous search stopped and where the unconsumed data starts,
+slices lines out through a memoryview, and compacts its buffer once per
+feed() instead of once per line, so parsing stays linear however many
+events arrive in one read.
+
+loads() uses orjson when it is installed (optional; GEMINI_JSON_BACKEND=json
+forces the standard library), falling back to json.
+
+PromptEchoFilter recognises the CLI echoing the prompt back as a message
+event without re-stripping and comparing the whole prompt for every event.
+"""
+import json
+import os
+from typing import Any, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+if orjson is not None and os.environ.get("GEMINI_JSON_BACKEND", "orjson") != "json":
+    JSON_BACKEND = "orjson"
+    _loads = orjson.loads
+else:
+    JSON_BACKEND = "json"
+    _loads = json.loads
+
+
+def loads(data: bytes) -> Any:
+    """Parse one JSON document from bytes. Raises ValueError on bad input (either backend)."""
+    return _loads(data)
+
+
+class JsonlScanner:
+    def __init__(self):
+        self._buf = bytearray()
+        self._search_from = 0  # everything before this offset has no newline
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Add a chunk; return the complete lines it finished (without the newline)."""
+        buf = self._buf
+        buf += chunk
+        lines = []
+        start = 0
+        newline = buf.find(b"\n", self._search_from)
+        if newline < 0:
+            self._search_from = len(buf)
+            return lines
+        with memoryview(buf) as view:
+            while newline >= 0:
+                lines.append(bytes(view[start:newline]))
+                start = newline + 1
+                newline = buf.find(b"\n", start)
+        del buf[:start]
+        self._search_from = len(buf)
+        return lines
+
+    def flush(self) -> Optional[bytes]:
+        """Return the unterminated tail, if any, and reset."""
+        if not self._buf:
+            return None
+        tail = bytes(self._buf)
+        self._buf.clear()
+        self._search_from = 0
+        return tail
+
+    @property
+    def pending(self) -> int:
+        return len(self._buf)
+
+
+class PromptEchoFilter:
+    def __init__(self, prompt_text: str):
+        self._prompt = prompt_text.strip()
+        self._length = len(self._prompt)
+
+    def matches(self, text: str) -> bool:
+        # Stripping only shortens, so anything shorter than the prompt can't be the echo.
+        if len(text) < self._length:
+            return False
+        stripped = text.strip()
+        return stripped == self._prompt
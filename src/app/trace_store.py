@@ -0,0 +1,267 @@
+"""
+Trace store for Gemini CLI response recordings.
+
+Each turn's `--record-responses` file is folded into an append-only segment
+file and deleted. A segment is a sequence of independent gzip members, one
+per trace, so a single trace can be read back by seeking to its offset and
+decompressing just that member. A sidecar SQLite index (index.db) maps
+context id and turn time to segment, offset and length.
+
+Segments are closed once they reach segment_bytes. Closed segments, and
+their index rows, are deleted when older than retention_days or when the
+store grows past max_bytes. The writer holds an flock on its open segment,
+so a prune from another process (bin/traces.py while the bot is up) skips
+it. sample_rate controls which turns are recorded at all.
+
+Layout under the traces directory:
+    index.db
+    segments/seg-<YYYYmmdd-HHMMSS>-<pid>-<n>.gz
+    <context_id>_<ms>.json      per-turn files waiting to be ingested
+"""
+import concurrent.futures
+import fcntl
+import glob
+import gzip
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TRACE_SAMPLE_RATE = float(os.environ.get("GEMINI_TRACE_SAMPLE_RATE", "1.0"))
+TRACE_RETENTION_DAYS = float(os.environ.get("GEMINI_TRACE_RETENTION_DAYS", "14"))
+TRACE_MAX_BYTES = int(os.environ.get("GEMINI_TRACE_MAX_BYTES", str(2 * 1024 ** 3)))
+TRACE_SEGMENT_BYTES = int(os.environ.get("GEMINI_TRACE_SEGMENT_BYTES", str(64 * 1024 ** 2)))
+
+# <context_id>_<ms>.json, but not a warm pool process's own pool_<token>.json
+_LOOSE_TRACE_RE = re.compile(r"^(?!pool_)(?P<context_id>.+)_(?P<ms>\d+)\.json$")
+
+
+class TraceStore:
+    def __init__(
+        self,
+        root: str,
+        *,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        retention_days: float = TRACE_RETENTION_DAYS,
+        max_bytes: int = TRACE_MAX_BYTES,
+        segment_bytes: int = TRACE_SEGMENT_BYTES,
+    ):
+        self.root = root
+        self.segments_dir = os.path.join(root, "segments")
+        self.index_path = os.path.join(root, "index.db")
+        self.sample_rate = sample_rate
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._segment: Optional[str] = None
+        self._segment_lock_fd: Optional[int] = None  # holds the flock on _segment
+        self._segment_seq = 0
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    # ── recording ────────────────────────────────────────────────────────────
+
+    def should_record(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def submit(self, path: str, context_id: str, turn_ts: float) -> concurrent.futures.Future:
+        """Ingest a finished per-turn file on the store's background thread."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="trace-store")
+        return self._executor.submit(self._ingest_logged, path, context_id, turn_ts)
+
+    def flush(self) -> None:
+        """Wait for submitted ingests to finish."""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result()
+
+    def add(self, context_id: str, turn_ts: float, data: bytes) -> None:
+        """Append one trace to the current segment and index it."""
+        member = gzip.compress(data, compresslevel=6)
+        with self._lock:
+            conn = self._index()
+            segment = self._current_segment(len(member))
+            path = os.path.join(self.segments_dir, segment)
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(member)
+            conn.execute(
+                "INSERT INTO traces (context_id, turn_ts, segment, offset, length, raw_bytes, added_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (context_id, turn_ts, segment, offset, len(member), len(data), time.time()),
+            )
+            conn.commit()
+
+    def add_file(self, path: str, context_id: str, turn_ts: float) -> bool:
+        """Ingest a per-turn file and delete it. False if it does not exist (CLI never wrote it)."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        self.add(context_id, turn_ts, data)
+        os.remove(path)
+        return True
+
+    def import_loose_files(self) -> int:
+        """Ingest per-turn `<context_id>_<ms>.json` files left in the traces directory."""
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(glob.escape(self.root), "*.json"))):
+            match = _LOOSE_TRACE_RE.match(os.path.basename(path))
+            if match and self.add_file(path, match["context_id"], int(match["ms"]) / 1000):
+                imported += 1
+        return imported
+
+    # ── reading ──────────────────────────────────────────────────────────────
+
+    def list(self, context_id: str, since: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Index rows for a context, oldest first (the newest `limit` if given)."""
+        query = "SELECT * FROM traces WHERE context_id = ? AND turn_ts >= ? ORDER BY turn_ts DESC, id DESC"
+        params: Tuple[Any, ...] = (context_id, since or 0)
+        if limit:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = [dict(row) for row in self._index().execute(query, params).fetchall()]
+        return rows[::-1]
+
+    def read(self, row: Dict[str, Any]) -> bytes:
+        """Decompress a single trace: one seek and one member, never the whole segment."""
+        with open(os.path.join(self.segments_dir, row["segment"]), "rb") as f:
+            f.seek(row["offset"])
+            return gzip.decompress(f.read(row["length"]))
+
+    def iter_traces(self, context_id: str, since: Optional[float] = None,
+                    limit: Optional[int] = None) -> Iterator[Tuple[Dict[str, Any], bytes]]:
+        for row in self.list(context_id, since=since, limit=limit):
+            try:
+                yield row, self.read(row)
+            except (OSError, EOFError, gzip.BadGzipFile) as e:
+                print(f"[{time.ctime()}] WARNING: unreadable trace {row['id']} in {row['segment']}: {e}", flush=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._index().execute(
+                "SELECT COUNT(*) AS traces, COUNT(DISTINCT context_id) AS contexts,"
+                " COALESCE(SUM(raw_bytes), 0) AS raw_bytes, MIN(turn_ts) AS oldest FROM traces"
+            ).fetchone()
+        segments = glob.glob(os.path.join(glob.escape(self.segments_dir), "*.gz"))
+        return {
+            **dict(row),
+            "segments": len(segments),
+            "stored_bytes": sum(os.path.getsize(path) for path in segments),
+        }
+
+    # ── retention ────────────────────────────────────────────────────────────
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete closed segments past retention or beyond max_bytes (oldest first). Returns how many."""
+        with self._lock:
+            return self._prune_locked(time.time() if now is None else now)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            self._release_segment()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ── internals ────────────────────────────────────────────────────────────
+
+    def _ingest_logged(self, path: str, context_id: str, turn_ts: float) -> None:
+        try:
+            self.add_file(path, context_id, turn_ts)
+        except Exception as e:
+            print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: could not store trace {path}: {e}", flush=True)
+
+    def _index(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.segments_dir, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS traces (
+                    id         INTEGER PRIMARY KEY,
+                    context_id TEXT NOT NULL,
+                    turn_ts    REAL NOT NULL,
+                    segment    TEXT NOT NULL,
+                    offset     INTEGER NOT NULL,
+                    length     INTEGER NOT NULL,
+                    raw_bytes  INTEGER NOT NULL,
+                    added_at   REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_context ON traces(context_id, turn_ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_segment ON traces(segment)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _prune_locked(self, now: float) -> int:
+        conn = self._index()
+        segments = sorted(
+            (os.path.getmtime(path), os.path.getsize(path), os.path.basename(path))
+            for path in glob.glob(os.path.join(glob.escape(self.segments_dir), "*.gz"))
+        )
+        total = sum(size for _, size, _ in segments)
+        removed = 0
+        for mtime, size, name in segments:
+            if name == self._segment:
+                continue  # still being appended to
+            expired = self.retention_days and now - mtime > self.retention_days * 86400
+            if not expired and total <= self.max_bytes:
+                continue
+            if self._locked_by_writer(os.path.join(self.segments_dir, name)):
+                continue  # another process's open segment
+            conn.execute("DELETE FROM traces WHERE segment = ?", (name,))
+            conn.commit()
+            os.remove(os.path.join(self.segments_dir, name))
+            total -= size
+            removed += 1
+        return removed
+
+    def _current_segment(self, incoming: int) -> str:
+        if self._segment is not None:
+            path = os.path.join(self.segments_dir, self._segment)
+            if os.path.exists(path) and os.path.getsize(path) + incoming <= self.segment_bytes:
+                return self._segment
+        self._release_segment()
+        self._segment_seq += 1
+        self._segment = f"seg-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_seq:04d}.gz"
+        fd = os.open(os.path.join(self.segments_dir, self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self._segment_lock_fd = fd
+        # A segment just closed (or the store just opened): apply retention.
+        self._prune_locked(time.time())
+        return self._segment
+
+    def _release_segment(self) -> None:
+        if self._segment_lock_fd is not None:
+            os.close(self._segment_lock_fd)  # drops the flock
+            self._segment_lock_fd = None
+
+    @staticmethod
+    def _locked_by_writer(path: str) -> bool:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return True  # already gone: nothing to delete
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+        return False
@@ -2,98 +2,129 @@ import asyncio
 import os
 import time
 import discord
-from src.app.runner import run_next_turn
-from src.db.queries import (
+from src.app.runner import run_next_turn, trace_store, GEMINI_TRACES_DIR
+from src.app.outbox import OutboxLanes, OUTBOX_MAX_ATTEMPTS, retry_delay
+from src.app.paginator import DISCORD_MAX_PAGES, DISCORD_MESSAGE_LIMIT, Page, attachment_note, send_page
+from src.app.reply_buffer import REPLY_STATUS_CHARS, StreamingReplyBuffer
+from src.app.scheduler import TurnScheduler
+from src.app.cli_pool import GeminiCliPool, GEMINI_CLI_POOL_SIZE, GEMINI_CLI_POOL_SESSION_SLOTS
+from src.db.async_queries import (
     get_undelivered_bot_messages, mark_delivered, insert_message,
-    mark_failed_delivery,
+    schedule_delivery_retry, record_pages_sent, get_next_outbox_attempt_at,
     add_message_to_context,
-    get_idle_contexts_with_pending_user_messages, update_context_status,
     get_latest_user_message_for_context, get_context, set_context_reply_thread,
+    get_active_contexts, get_stored_discord_message_ids, ingest_user_message,
+    claim_turn, heartbeat_turn, complete_turn, release_expired_turn_leases,
 )
-from src.db.database import get_db
+from src.db.notify import (
+    add_outbox_listener, remove_outbox_listener, serve_outbox_socket,
+    add_turn_listener, remove_turn_listener,
+)
+
+# Writers wake the outbox directly (see src/db/notify.py); this poll is only a safety net.
+OUTBOX_SAFETY_POLL_INTERVAL = float(os.environ.get("OUTBOX_SAFETY_POLL_INTERVAL", "30"))
+# Turns are leased from pending_turns; the holder renews the lease every third of it.
+TURN_LEASE_SECONDS = float(os.environ.get("GEMINI_TURN_LEASE_SECONDS", "60"))
+TURN_MAX_ATTEMPTS = int(os.environ.get("GEMINI_TURN_MAX_ATTEMPTS", "3"))
+# Enqueues wake the worker directly; this poll picks up expired leases and other processes' turns.
+TURN_SAFETY_POLL_INTERVAL = float(os.environ.get("GEMINI_TURN_POLL_INTERVAL", "30"))
 
 async def outbox_watcher(client, user_ids):
     print("Outbox watcher started.")
     await client.wait_until_ready()
-    
-    # Simple cache for User/Channel objects to reduce fetch_* calls
-    cache = {}
-
-    async def get_target(cid=None, tid=None, uid=None):
-        cache_key = f"t:{tid}" if tid else (f"c:{cid}" if cid else f"u:{uid}")
-        if cache_key in cache:
-            return cache[cache_key]
-        
-        target = None
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def wake_from_writer_thread():
+        loop.call_soon_threadsafe(wakeup.set)
+
+    add_outbox_listener(wake_from_writer_thread)
+    socket_transport = await serve_outbox_socket(wakeup.set)
+
+    async def wait_for_wakeup(timeout):
         try:
-            if tid:
-                target = client.get_channel(int(tid)) or await client.fetch_channel(int(tid))
-            elif cid:
-                target = client.get_channel(int(cid)) or await client.fetch_channel(int(cid))
-            elif uid:
-                target = client.get_user(int(uid)) or await client.fetch_user(int(uid))
-            
-            if target:
-                cache[cache_key] = target
-        except Exception:
+            await asyncio.wait_for(wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
             pass
-        return target
 
-    while not client.is_closed():
+    async def resolve_target(msg):
         try:
-            undelivered = get_undelivered_bot_messages()
-            if not undelivered:
-                await asyncio.sleep(1.0)
-                continue
-
-            for msg in undelivered:
-                msg_id = msg.get("id", "")
-                target = await get_target(
-                    cid=msg.get("channel_id"), 
-                    tid=msg.get("thread_id"), 
-                    uid=user_ids[0]
-                )
-                
-                if not target:
-                    print(f"[{time.ctime()}] [Ctx: outbox] Could not resolve target for msg {msg_id}")
-                    continue
-
-                content = (msg.get("content") or "").strip()
-                if not content:
-                    mark_delivered(msg_id, delivered=True, delivered_at=time.time())
-                    continue
-
-                # Chunk content to stay within Discord's 2000-char limit
-                chunks = []
-                remaining = content
-                while len(remaining) > 1900:
-                    split_at = remaining.rfind("\n", 0, 1900)
-                    if split_at < 0: split_at = 1900
-                    chunks.append(remaining[:split_at].rstrip())
-                    remaining = remaining[split_at:].lstrip("\n")
-                if remaining: chunks.append(remaining)
-
-                print(f"[{time.ctime()}] [Ctx: outbox] Sending message to {target} ({len(chunks)} chunk(s))", flush=True)
-                try:
-                    for chunk in chunks:
-                        await target.send(chunk)
-                    mark_delivered(msg_id, delivered=True, delivered_at=time.time())
-                except Exception as send_err:
-                    print(f"[{time.ctime()}] [Ctx: outbox] Send error for msg {msg_id}: {send_err}")
-                    mark_failed_delivery(msg_id, str(send_err))
-            
-            await asyncio.sleep(0.5)
+            if msg.get("thread_id"):
+                return await client.resolver.channel(msg["thread_id"])
+            if msg.get("channel_id"):
+                return await client.resolver.channel(msg["channel_id"])
+            return await client.resolver.user(user_ids[0])
         except Exception as e:
-            print(f"[{time.ctime()}] [Ctx: outbox] Error in outbox_watcher: {e}")
-            await asyncio.sleep(5.0)
+            print(f"[{time.ctime()}] [Ctx: outbox] Error resolving target for msg {msg.get('id')}: {e}", flush=True)
+            return None
+
+    async def on_sent(msg):
+        await mark_delivered(msg["id"], delivered=True, delivered_at=time.time())
+
+    async def schedule_retry(msg, error):
+        attempt = (msg.get("attempts") or 0) + 1
+        status = await schedule_delivery_retry(
+            msg["id"], error, time.time() + retry_delay(attempt), OUTBOX_MAX_ATTEMPTS,
+        )
+        if status == "dead":
+            print(f"[{time.ctime()}] [Ctx: outbox] Giving up on msg {msg['id']} after {attempt} attempts: {error}", flush=True)
+        # Let the watcher re-plan its sleep around the new retry time.
+        wakeup.set()
+
+    async def on_failed(msg, error):
+        await schedule_retry(msg, error)
+
+    async def on_unresolved(msg):
+        await schedule_retry(msg, "could not resolve delivery target")
+
+    async def on_progress(msg, pages_sent):
+        await record_pages_sent(msg["id"], pages_sent)
+
+    def on_rate_limited(key, delay):
+        # Hold streamed-reply edits in the same channel back too, so they don't collide.
+        kind, _, ident = key.partition(":")
+        if kind in ("t", "c"):
+            client.edit_scheduler.block_channel(int(ident), delay)
+
+    lanes = OutboxLanes(
+        resolve_target, on_sent, on_failed, on_unresolved,
+        fallback_user_id=user_ids[0], on_rate_limited=on_rate_limited, on_progress=on_progress,
+    )
+
+    try:
+        while not client.is_closed():
+            try:
+                # Clear before querying so a write landing mid-query still wakes the next wait.
+                wakeup.clear()
+                read_at = time.monotonic()
+                undelivered = await get_undelivered_bot_messages()
+                # Rows already on a lane, or finished since this read started, are skipped;
+                # new rows join the back of their lane.
+                for msg in undelivered:
+                    lanes.submit(msg, read_at=read_at)
+                # Sleep until a write wakes us or the next scheduled retry falls due.
+                timeout = OUTBOX_SAFETY_POLL_INTERVAL
+                next_due = await get_next_outbox_attempt_at()
+                if next_due is not None:
+                    timeout = min(timeout, max(0.0, next_due - time.time()))
+                await wait_for_wakeup(timeout)
+            except Exception as e:
+                print(f"[{time.ctime()}] [Ctx: outbox] Error in outbox_watcher: {e}")
+                await asyncio.sleep(5.0)
+    finally:
+        remove_outbox_listener(wake_from_writer_thread)
+        if socket_transport:
+            socket_transport.close()
+        await lanes.close()
 
 async def check_for_missed_messages(client, user_ids):
     """Fetch recent history for active contexts and inject missing user messages."""
     print(f"[{time.ctime()}] Starting missed message catch-up...")
-    from src.db.queries import get_active_contexts, insert_message, add_message_to_context, get_messages_for_context
     from src.app.message_handlers import _discord_message_to_payload
+    from src.db.payloads import encode_payload_async
 
-    active_ctxs = get_active_contexts(limit=10)
+    active_ctxs = await get_active_contexts(limit=10)
     for ctx in active_ctxs:
         context_id = ctx['id']
         channel_id = ctx.get('reply_thread_id') or ctx.get('reply_channel_id')
@@ -101,58 +132,35 @@ async def check_for_missed_messages(client, user_ids):
             continue
 
         try:
-            channel = client.get_channel(int(channel_id)) or await client.fetch_channel(int(channel_id))
+            channel = await client.resolver.channel(channel_id)
             if not channel: continue
 
-            # Get DB's view of recent messages
-            db_messages = {m['id'] for m in get_messages_for_context(context_id, limit=20)}
-            
-            # Fetch Discord's view
-            async for message in channel.history(limit=20):
-                if str(message.id) in db_messages:
+            # Discord's view, oldest first, checked against the DB in one indexed lookup
+            history = [m async for m in channel.history(limit=20)]
+            history.reverse()
+            stored = await get_stored_discord_message_ids([m.id for m in history])
+
+            for message in history:
+                if message.id in stored:
                     continue
                 
                 if not message.author.bot and str(message.author.id) in user_ids:
                     print(f"[{time.ctime()}] [Ctx: {context_id}] Catching up missed message: {message.id}")
-                    
-                    should_process = False
+
                     is_thread = isinstance(message.channel, discord.Thread)
-                    if isinstance(message.channel, discord.DMChannel):
-                        should_process = True
-                    elif client.user in message.mentions:
-                        should_process = True
-                    elif is_thread:
-                        from src.db.queries import find_context_by_reply_thread
-                        if find_context_by_reply_thread(message.channel.id):
-                            should_process = True
-
-                    raw_payload = _discord_message_to_payload(message)
-                    msg_entry = insert_message(
+                    trigger = isinstance(message.channel, discord.DMChannel) or client.user in message.mentions
+                    await ingest_user_message(
                         author=str(message.author),
                         content=message.content,
-                        source="user",
                         timestamp=message.created_at.timestamp(),
-                        channel_id=message.channel.id if not isinstance(message.channel, discord.Thread) else message.channel.parent_id,
-                        thread_id=message.channel.id if isinstance(message.channel, discord.Thread) else None,
-                        raw_discord_payload=raw_payload,
+                        channel_id=message.channel.parent_id if is_thread else message.channel.id,
+                        thread_id=message.channel.id if is_thread else None,
+                        raw_discord_payload=await encode_payload_async(_discord_message_to_payload(message)),
+                        discord_message_id=message.id,
+                        context_id=context_id,
+                        trigger=trigger,
+                        dm=isinstance(message.channel, discord.DMChannel),
                     )
-                    add_message_to_context(context_id, msg_entry["id"])
-                    
-                    if should_process:
-                        if client.gemini_queue:
-                            client.gemini_queue.put_nowait({"context_id": context_id})
-                    else:
-                        silent_msg = insert_message(
-                            author="system",
-                            content="",
-                            source="bot",
-                            timestamp=time.time(),
-                            channel_id=msg_entry["channel_id"],
-                            thread_id=msg_entry["thread_id"],
-                            delivered=True,
-                            delivered_at=time.time(),
-                        )
-                        add_message_to_context(context_id, silent_msg["id"])
 
         except Exception as e:
             print(f"[{time.ctime()}] [Ctx: {context_id}] Error in catch-up: {e}")
@@ -170,12 +178,12 @@ async def loop_monitor():
 
 async def process_context(context_id: str, client, user_ids, gemini_cmd, project_root):
     try:
-        latest_user_message = get_latest_user_message_for_context(context_id)
+        latest_user_message = await get_latest_user_message_for_context(context_id)
         if not latest_user_message:
             return
 
         # Load context to find reply target
-        ctx = get_context(context_id)
+        ctx = await get_context(context_id)
         reply_thread_id = ctx.get("reply_thread_id") if ctx else None
         reply_channel_id = ctx.get("reply_channel_id") if ctx else None
 
@@ -183,9 +191,9 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
         try:
             if reply_thread_id:
                 # Already have a thread — reply there
-                reply_target = client.get_channel(reply_thread_id) or await client.fetch_channel(reply_thread_id)
+                reply_target = await client.resolver.channel(reply_thread_id)
             elif reply_channel_id:
-                channel = client.get_channel(reply_channel_id) or await client.fetch_channel(reply_channel_id)
+                channel = await client.resolver.channel(reply_channel_id)
                 if isinstance(channel, discord.DMChannel):
                     reply_target = channel
                 else:
@@ -196,69 +204,59 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
                         type=discord.ChannelType.public_thread,
                     )
                     # Register the new thread so future messages route here
-                    set_context_reply_thread(context_id, reply_target.id)
+                    await set_context_reply_thread(context_id, reply_target.id)
+                    client.resolver.remember("channel", reply_target.id, reply_target)
                     reply_thread_id = reply_target.id
         except Exception as e:
             print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Could not resolve reply target: {e}", flush=True)
 
         if not reply_target:
-            reply_target = await client.fetch_user(int(user_ids[0]))
+            reply_target = await client.resolver.user(user_ids[0])
 
-        reply_accumulator = ""
-        full_reply_accumulator = ""
+        reply = StreamingReplyBuffer()
         active_msg = None
-        last_edit_time = 0
-        edit_interval = 1.0
         last_status = ""
-
-        async def sync_discord(force=False):
-            nonlocal active_msg, last_edit_time, reply_accumulator
-
-            # Manual Split
-            if "---NEW_MESSAGE---" in reply_accumulator:
-                parts = reply_accumulator.split("---NEW_MESSAGE---", 1)
-                before = parts[0].strip()
-                after = parts[1]
-                if before or active_msg:
-                    display_before = before or "..."
-                    if last_status:
-                        display_before = f"_{last_status}_\n\n{display_before}"
-                    if active_msg: await active_msg.edit(content=display_before[:1800])
-                    else: active_msg = await reply_target.send(display_before[:1800])
-                active_msg = None
-                reply_accumulator = after
-                last_edit_time = 0
-                return await sync_discord(force=True)
-
-            # Auto Split
-            if len(reply_accumulator) > 1800:
-                split_at = reply_accumulator.rfind("\n", 1500, 1800)
-                if split_at == -1: split_at = 1800
-                before = reply_accumulator[:split_at].strip()
-                after = reply_accumulator[split_at:]
-                display_before = before
-                if last_status:
-                    display_before = f"_{last_status}_\n\n{display_before}"
-                if active_msg: await active_msg.edit(content=display_before[:1800])
-                else: active_msg = await reply_target.send(display_before[:1800])
-                active_msg = None
-                reply_accumulator = after
-                last_edit_time = 0
-                return await sync_discord(force=True)
-
-            now = time.time()
-            if not force and active_msg and (now - last_edit_time < edit_interval):
+        sent_pages = 0
+        # Edits are paced, coalesced and de-duplicated by the shared scheduler.
+        edits = client.edit_scheduler
+
+        def with_status(text):
+            text = f"_{last_status[:REPLY_STATUS_CHARS]}_\n\n{text}" if last_status else text
+            return text[:DISCORD_MESSAGE_LIMIT]
+
+        def attaching():
+            # Past DISCORD_MAX_PAGES the rest is not paged live; the whole reply is attached at the end.
+            return DISCORD_MAX_PAGES and sent_pages >= DISCORD_MAX_PAGES
+
+        async def commit_page(page):
+            # A finished page: the live message gets its final text, the next page starts a new one.
+            nonlocal active_msg, sent_pages
+            if attaching():
+                return
+            if page or active_msg:
+                display = with_status(page or "...")
+                if active_msg: await edits.finalize(active_msg, display)
+                else: await reply_target.send(display)
+                sent_pages += 1
+            active_msg = None
+
+        async def sync_discord(pages=(), force=False):
+            nonlocal active_msg
+            for page in pages:
+                await commit_page(page)
+                force = True
+            if attaching():
+                # The last live page is final; the whole reply follows as one attachment.
                 return
 
-            display_text = reply_accumulator.strip() or "..."
-            if last_status:
-                display_text = f"_{last_status}_\n\n{display_text}"
-
+            display_text = with_status(reply.current() or "...")
             if active_msg is None:
-                active_msg = await reply_target.send(display_text[:1800])
+                active_msg = await reply_target.send(display_text)
+                edits.shown(active_msg, display_text)
+            elif force:
+                await edits.finalize(active_msg, display_text)
             else:
-                await active_msg.edit(content=display_text[:1800])
-            last_edit_time = now
+                edits.submit(active_msg, display_text)
 
         has_output = False
         async for event in run_next_turn(
@@ -266,12 +264,11 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
             context_id=context_id,
             gemini_cmd=gemini_cmd,
             project_root=project_root,
+            cli_pool=client.cli_pool,
         ):
             if event.type == "text":
                 has_output = True
-                reply_accumulator += event.content
-                full_reply_accumulator += event.content
-                await sync_discord()
+                await sync_discord(reply.append(event.content))
             elif event.type == "tool_use":
                 has_output = True
                 last_status = f"Running tool: {event.content}..."
@@ -287,7 +284,7 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
                 # so the polling loop doesn't keep retrying it forever.
                 if any(x in event.content for x in ["Quota", "capacity", "429"]):
                     error_msg_content = f"⚠️ I'm currently over my rate limit or capacity ({event.content}). Please try again later."
-                    bot_msg = insert_message(
+                    bot_msg = await insert_message(
                         author="gemini",
                         content=error_msg_content,
                         source="bot",
@@ -297,16 +294,21 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
                         delivered=True,
                         delivered_at=time.time(),
                     )
-                    add_message_to_context(context_id, bot_msg["id"])
+                    await add_message_to_context(context_id, bot_msg["id"])
                     has_output = True # Prevent the fall-through error handling if this was the only event
 
         last_status = ""
-        await sync_discord(force=True)
+        await sync_discord(reply.finish(), force=True)
 
-        if full_reply_accumulator.strip():
-            clean_content = full_reply_accumulator.replace("---NEW_MESSAGE---", "").strip()
+        clean_content = reply.text()
+        if clean_content and attaching():
+            try:
+                await send_page(reply_target, Page(attachment_note(clean_content, reply.pages + 1), attachment=clean_content))
+            except Exception as e:
+                print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Could not attach full reply: {e}", flush=True)
+        if clean_content:
             # Store bot reply as delivered (was streamed live; outbox must NOT re-send)
-            bot_msg = insert_message(
+            bot_msg = await insert_message(
                 author="gemini",
                 content=clean_content,
                 source="bot",
@@ -316,11 +318,11 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
                 delivered=True,
                 delivered_at=time.time(),
             )
-            add_message_to_context(context_id, bot_msg["id"])
+            await add_message_to_context(context_id, bot_msg["id"])
         elif not has_output:
             # If Gemini returned NO events (e.g. CLI crashed immediately), we still need to break the loop
             print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: Gemini turn produced no output events. Marking as failed to break retry loop.")
-            bot_msg = insert_message(
+            bot_msg = await insert_message(
                 author="gemini",
                 content="⚠️ I encountered an internal error and couldn't generate a response.",
                 source="bot",
@@ -330,65 +332,112 @@ async def process_context(context_id: str, client, user_ids, gemini_cmd, project
                 delivered=True,
                 delivered_at=time.time(),
             )
-            add_message_to_context(context_id, bot_msg["id"])
+            await add_message_to_context(context_id, bot_msg["id"])
 
     except Exception as e:
         print(f"[{time.ctime()}] [Ctx: {context_id}] ERROR in process_context: {e}")
-    finally:
-        update_context_status(context_id, 'idle')
 
-async def polling_fallback(queue):
-    while True:
+async def run_claimed_turn(context_id, client, user_ids, gemini_cmd, project_root):
+    """Run a leased turn, keeping the lease alive, then remove it from pending_turns."""
+    pid = os.getpid()
+
+    async def keep_lease():
+        while True:
+            await asyncio.sleep(TURN_LEASE_SECONDS / 3)
+            try:
+                if not await heartbeat_turn(context_id, pid, TURN_LEASE_SECONDS):
+                    print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: lost the turn lease", flush=True)
+                    return
+            except Exception as e:
+                print(f"[{time.ctime()}] [Ctx: {context_id}] WARNING: lease heartbeat failed: {e}", flush=True)
+
+    heartbeat = asyncio.create_task(keep_lease())
+    try:
+        await process_context(context_id, client, user_ids, gemini_cmd, project_root)
+    finally:
+        heartbeat.cancel()
         try:
-            contexts = get_idle_contexts_with_pending_user_messages()
-            for cid in contexts:
-                await queue.put({"context_id": cid})
+            await complete_turn(context_id, pid)
         except Exception as e:
-            print(f"Error in polling fallback: {e}")
-        await asyncio.sleep(15) # Longer interval
-
-async def gemini_worker(client, queue, user_ids, timestamp_file, gemini_cmd, project_root):
+            # The lease expires on its own and the turn is retried.
+            print(f"[{time.ctime()}] [Ctx: {context_id}] ERROR completing turn: {e}", flush=True)
+
+async def gemini_worker(client, wakeup, user_ids, gemini_cmd, project_root):
+    """
+    Runs turns queued in the pending_turns table.
+
+    `wakeup` (an asyncio.Event) is set by the turn listener when an enqueue
+    commits; pending_turns already holds one row per context, so a single
+    flag covers any number of wakeups between claim passes. Without it the
+    worker still looks for claimable turns every TURN_SAFETY_POLL_INTERVAL
+    (expired leases, other processes). At most GEMINI_MAX_CONCURRENT_TURNS
+    turns run at once (see TurnScheduler).
+    """
     print("Gemini parallel worker started.")
     await client.wait_until_ready()
 
-    # Reset any contexts stuck in 'running' from a previous crashed process
-    try:
-        with get_db() as conn:
-            result = conn.execute("UPDATE contexts SET status = 'idle', current_pid = NULL WHERE status = 'running'")
-            if result.rowcount > 0:
-                print(f"[{time.ctime()}] Reset {result.rowcount} stale 'running' context(s) to 'idle'.", flush=True)
-    except Exception as e:
-        print(f"[{time.ctime()}] WARNING: Could not reset stale contexts: {e}", flush=True)
+    loop = asyncio.get_running_loop()
+
+    def wake_from_writer_thread(context_id):
+        loop.call_soon_threadsafe(wakeup.set)
+
+    add_turn_listener(wake_from_writer_thread)
 
     asyncio.create_task(loop_monitor())
-    asyncio.create_task(polling_fallback(queue))
-    running_tasks = set()
+    pid = os.getpid()
 
-    # Initial catch-up for missed messages
-    # asyncio.create_task(check_for_missed_messages(client, user_ids))
+    async def claim():
+        turn = await claim_turn(pid, TURN_LEASE_SECONDS, TURN_MAX_ATTEMPTS)
+        if turn:
+            waited = turn["claimed_at"] - turn["enqueued_at"]
+            print(f"[{time.ctime()}] [Ctx: {turn['context_id']}] Claimed turn (lane {turn['priority']}, "
+                  f"waited {waited:.1f}s, attempt {turn['attempts']})", flush=True)
+        return turn
 
-    while not client.is_closed():
-        evt = await queue.get()
-        try:
-            context_id = evt.get("context_id")
-            if not context_id:
-                continue
+    async def run(turn):
+        await run_claimed_turn(turn["context_id"], client, user_ids, gemini_cmd, project_root)
+
+    scheduler = TurnScheduler(claim, run)
+    client.turn_scheduler = scheduler
+
+    if GEMINI_CLI_POOL_SIZE > 0 or GEMINI_CLI_POOL_SESSION_SLOTS > 0:
+        client.cli_pool = GeminiCliPool(gemini_cmd, cwd=project_root, traces_dir=GEMINI_TRACES_DIR)
+        await client.cli_pool.start()
+
+    # Fold per-turn trace files left behind by a crash into segments, and apply retention.
+    try:
+        store = trace_store()
+        imported = await asyncio.to_thread(store.import_loose_files)
+        pruned = await asyncio.to_thread(store.prune)
+        if imported or pruned:
+            print(f"[{time.ctime()}] Trace store: imported {imported} loose trace(s), pruned {pruned} segment(s).", flush=True)
+    except Exception as e:
+        print(f"[{time.ctime()}] WARNING: trace store maintenance failed: {e}", flush=True)
 
+    # Initial catch-up for missed messages (ingest is idempotent on the Discord message id)
+    asyncio.create_task(check_for_missed_messages(client, user_ids))
+
+    try:
+        while not client.is_closed():
             try:
-                with get_db() as conn:
-                    cursor = conn.execute("SELECT status FROM contexts WHERE id = ?", (context_id,))
-                    row = cursor.fetchone()
-                    if row and row['status'] == 'idle':
-                        update_context_status(context_id, 'running', os.getpid())
-                        task = asyncio.create_task(
-                            process_context(context_id, client, user_ids, gemini_cmd, project_root)
-                        )
-                        running_tasks.add(task)
-                        task.add_done_callback(running_tasks.discard)
+                # Contexts left 'running' by a crashed process (lease expired or never leased)
+                reset_count = await release_expired_turn_leases()
+                if reset_count > 0:
+                    print(f"[{time.ctime()}] Reset {reset_count} stale 'running' context(s) to 'idle'.", flush=True)
+
+                # Slots freed by finished turns are refilled by the scheduler itself.
+                await scheduler.fill()
             except Exception as e:
-                print(f"DB Error checking context {context_id}: {e}")
+                print(f"[{time.ctime()}] ERROR in gemini_worker loop: {e}")
 
-        except Exception as e:
-            print(f"[{time.ctime()}] ERROR in gemini_worker loop: {e}")
-        finally:
-            queue.task_done()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=TURN_SAFETY_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            # One claim pass serves every wakeup that arrived meanwhile.
+            wakeup.clear()
+    finally:
+        remove_turn_listener(wake_from_writer_thread)
+        await scheduler.close()
+        if client.cli_pool is not None:
+            await client.cli_pool.close()
@@ -0,0 +1,116 @@
+"""
+Async facade over src.db.queries for use from the bot's event loop.
+
+Every sqlite3 call blocks, and an fsync or WAL checkpoint can take tens of
+milliseconds, so coroutines must never call src.db.queries directly.
+Writes are funnelled through a single dedicated writer thread (SQLite only
+admits one writer at a time anyway, so this also keeps write ordering
+deterministic and avoids SQLITE_BUSY retries). Reads fan out over a small
+reader pool, which WAL mode lets run concurrently with the writer.
+
+The function names mirror src.db.queries one-to-one:
+
+    from src.db.async_queries import insert_message
+    msg = await insert_message(author="x", content="hi", source="user")
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, TypeVar
+
+from src.db import queries
+
+T = TypeVar("T")
+
+DB_READER_THREADS = max(1, int(os.environ.get("GEMINI_DB_READER_THREADS", "4")))
+
+# ThreadPoolExecutor starts its threads lazily, so importing this module is free.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=DB_READER_THREADS, thread_name_prefix="db-reader")
+
+
+async def run_write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking DB function on the single writer thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, functools.partial(fn, *args, **kwargs))
+
+
+async def run_read(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking, read-only DB function on the reader pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, functools.partial(fn, *args, **kwargs))
+
+
+def _writer_op(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await run_write(fn, *args, **kwargs)
+    return wrapper
+
+
+def _reader_op(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await run_read(fn, *args, **kwargs)
+    return wrapper
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stop the DB threads. Pending writes are completed when wait=True."""
+    _writer.shutdown(wait=wait)
+    _readers.shutdown(wait=wait)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Messages
+# ─────────────────────────────────────────────────────────────────────────────
+
+insert_message = _writer_op(queries.insert_message)
+mark_delivered = _writer_op(queries.mark_delivered)
+schedule_delivery_retry = _writer_op(queries.schedule_delivery_retry)
+record_pages_sent = _writer_op(queries.record_pages_sent)
+get_undelivered_bot_messages = _reader_op(queries.get_undelivered_bot_messages)
+get_next_outbox_attempt_at = _reader_op(queries.get_next_outbox_attempt_at)
+get_message_payload = _reader_op(queries.get_message_payload)
+get_message_by_discord_id = _reader_op(queries.get_message_by_discord_id)
+get_stored_discord_message_ids = _reader_op(queries.get_stored_discord_message_ids)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Contexts
+# ─────────────────────────────────────────────────────────────────────────────
+
+create_context = _writer_op(queries.create_context)
+set_context_reply_thread = _writer_op(queries.set_context_reply_thread)
+update_context_session_id = _writer_op(queries.update_context_session_id)
+find_context_by_reply_thread = _reader_op(queries.find_context_by_reply_thread)
+find_active_context_by_channel = _reader_op(queries.find_active_context_by_channel)
+get_context = _reader_op(queries.get_context)
+get_active_contexts = _reader_op(queries.get_active_contexts)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Turn queue
+# ─────────────────────────────────────────────────────────────────────────────
+
+enqueue_turn = _writer_op(queries.enqueue_turn)
+claim_turn = _writer_op(queries.claim_turn)
+heartbeat_turn = _writer_op(queries.heartbeat_turn)
+complete_turn = _writer_op(queries.complete_turn)
+release_expired_turn_leases = _writer_op(queries.release_expired_turn_leases)
+get_turn_queue_stats = _reader_op(queries.get_turn_queue_stats)
+get_pending_turn = _reader_op(queries.get_pending_turn)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Context ↔ Message linking
+# ─────────────────────────────────────────────────────────────────────────────
+
+add_message_to_context = _writer_op(queries.add_message_to_context)
+ingest_user_message = _writer_op(queries.ingest_user_message)
+get_messages_for_context = _reader_op(queries.get_messages_for_context)
+get_latest_user_message_for_context = _reader_op(queries.get_latest_user_message_for_context)
+get_context_history_page = _reader_op(queries.get_context_history_page)
+get_context_digest = _reader_op(queries.get_context_digest)
+save_context_digest = _writer_op(queries.save_context_digest)
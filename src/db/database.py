@@ -1,105 +1,542 @@
+import atexit
+import json
 import sqlite3
 import os
 import contextlib
-from typing import Generator
+import threading
+import time
+from typing import Callable, Generator, List, Optional, Set, Tuple
+
+from src.db.ids import is_time_ordered, new_id
+from src.db.payloads import Payload, decode_bytes
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 DB_PATH = os.environ.get("GEMINI_DB_PATH", os.path.join(PROJECT_ROOT, "gemini.db"))
+# Per-connection prepared statement LRU (sqlite3's default is 128).
+DB_CACHED_STATEMENTS = int(os.environ.get("GEMINI_DB_CACHED_STATEMENTS", "256"))
+# Seconds a pooled connection may sit unused before it is pinged on checkout.
+DB_HEALTHCHECK_INTERVAL = float(os.environ.get("GEMINI_DB_HEALTHCHECK_INTERVAL", "30"))
 
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+    # check_same_thread=False only so shutdown can close connections from the
+    # main thread; each connection is otherwise used by the thread that opened it.
+    conn = sqlite3.connect(DB_PATH, cached_statements=DB_CACHED_STATEMENTS, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     conn.execute('PRAGMA journal_mode=WAL')
     conn.execute('PRAGMA foreign_keys=ON')
     return conn
 
+class ConnectionPool:
+    """
+    One long-lived connection per thread, opened lazily with the PRAGMAs
+    applied once. Nested get_db() blocks on the same thread share the
+    connection and only the outermost block commits or rolls back.
+    """
+
+    def __init__(self, healthcheck_interval: float = DB_HEALTHCHECK_INTERVAL):
+        self.healthcheck_interval = healthcheck_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Set[sqlite3.Connection] = set()
+        self.opened = 0
+        self.reconnects = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = get_connection()
+        with self._lock:
+            self._connections.add(conn)
+            self.opened += 1
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        self._local.last_used = time.monotonic()
+        self._local.depth = 0
+        return conn
+
+    def _discard(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is None:
+            return
+        with self._lock:
+            self._connections.discard(conn)
+        with contextlib.suppress(Exception):
+            conn.close()
+
+    def _healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid != os.getpid():
+            # Inherited across fork(); never reuse a parent's SQLite handle.
+            self._local.conn = conn = None
+        if conn is None:
+            conn = self._open()
+        elif (self._local.depth == 0
+              and time.monotonic() - self._local.last_used > self.healthcheck_interval
+              and not self._healthy(conn)):
+            self._discard()
+            self.reconnects += 1
+            conn = self._open()
+        self._local.depth += 1
+        return conn
+
+    def release(self) -> bool:
+        """Drop one nesting level. Returns True when the outermost block exits."""
+        # getattr: close_all() may have reset thread state mid-block during shutdown
+        self._local.depth = getattr(self._local, "depth", 1) - 1
+        self._local.last_used = time.monotonic()
+        return self._local.depth == 0
+
+    def in_block(self) -> bool:
+        return getattr(self._local, "depth", 0) > 0
+
+    def defer(self, callback: Callable[[], None]) -> None:
+        if not hasattr(self._local, "after_commit"):
+            self._local.after_commit = []
+        self._local.after_commit.append(callback)
+
+    def pop_deferred(self) -> List[Callable[[], None]]:
+        callbacks = getattr(self._local, "after_commit", None) or []
+        self._local.after_commit = []
+        return callbacks
+
+    def close_all(self) -> None:
+        """Close every pooled connection. Threads reconnect lazily if used again."""
+        with self._lock:
+            conns, self._connections = self._connections, set()
+        for conn in conns:
+            with contextlib.suppress(Exception):
+                conn.close()
+        self._local = threading.local()
+
+_pool = ConnectionPool()
+atexit.register(_pool.close_all)
+
+def get_pool() -> ConnectionPool:
+    return _pool
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """
+    Run callback once the current get_db() transaction commits (dropped on
+    rollback). Outside a get_db() block it runs immediately.
+    """
+    if _pool.in_block():
+        _pool.defer(callback)
+    else:
+        callback()
+
 @contextlib.contextmanager
 def get_db() -> Generator[sqlite3.Connection, None, None]:
-    conn = get_connection()
+    conn = _pool.acquire()
+    outermost = False
     try:
         yield conn
-        conn.commit()
+        outermost = _pool.release()
+        if outermost:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if not outermost:
+            outermost = _pool.release()
+        if outermost:
+            _pool.pop_deferred()
+            with contextlib.suppress(sqlite3.Error):
+                conn.rollback()
         raise
-    finally:
-        conn.close()
+    if outermost:
+        for callback in _pool.pop_deferred():
+            try:
+                callback()
+            except Exception as e:
+                print(f"[{time.ctime()}] WARNING: after_commit callback failed: {e}", flush=True)
 
-def init_db():
-    with get_db() as conn:
-        # ── contexts ──────────────────────────────────────────────────────────
-        # UUID-keyed sessions. reply_thread_id is the Discord thread that owns
-        # this context — used to route incoming thread messages here.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS contexts (
-                id               TEXT PRIMARY KEY,  -- uuid
-                reply_channel_id INTEGER,           -- channel to reply to (before thread exists)
-                reply_thread_id  INTEGER,           -- Discord thread owned by this context
-                status           TEXT DEFAULT 'idle',
-                current_pid      INTEGER,
-                gemini_session_id TEXT,             -- session ID from Gemini CLI
-                created_at       REAL,
-                updated_at       REAL
-            )
-        ''')
-
-        # ── messages ──────────────────────────────────────────────────────────
-        # Append-only log of every Discord event. channel_id/thread_id are
-        # informational only. Context membership is in context_messages.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id                  TEXT PRIMARY KEY,  -- uuid
-                author              TEXT NOT NULL,
-                content             TEXT NOT NULL,
-                source              TEXT NOT NULL,     -- 'user' | 'bot'
-                timestamp           REAL NOT NULL,
-                channel_id          INTEGER,           -- origin channel
-                thread_id           INTEGER,           -- origin thread
-                delivered           BOOLEAN DEFAULT 0,
-                delivered_at        REAL,
-                delivery_status     TEXT DEFAULT 'pending', -- 'pending' | 'sent' | 'failed'
-                delivery_error      TEXT,
-                raw_discord_payload TEXT               -- full Discord Message JSON
-            )
-        ''')
-
-        # Best-effort schema sync for local/dev DBs created before these columns existed.
-        msg_cols = {row["name"] for row in conn.execute("PRAGMA table_info(messages)").fetchall()}
-        if "delivery_status" not in msg_cols:
-            conn.execute("ALTER TABLE messages ADD COLUMN delivery_status TEXT DEFAULT 'pending'")
-        if "delivery_error" not in msg_cols:
-            conn.execute("ALTER TABLE messages ADD COLUMN delivery_error TEXT")
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+    """
+    The schema as it stood before user_version was tracked. Databases from
+    then are at version 0 whatever they contain, so every step checks first.
+    """
+    # ── contexts ──────────────────────────────────────────────────────────
+    # UUID-keyed sessions (UUIDv7, see src.db.ids; older rows uuid4).
+    # reply_thread_id is the Discord thread that owns this context — used to
+    # route incoming thread messages here.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS contexts (
+            id               TEXT PRIMARY KEY,  -- uuid (v7 for new rows)
+            reply_channel_id INTEGER,           -- channel to reply to (before thread exists)
+            reply_thread_id  INTEGER,           -- Discord thread owned by this context
+            status           TEXT DEFAULT 'idle',
+            current_pid      INTEGER,
+            gemini_session_id TEXT,             -- session ID from Gemini CLI
+            prompt_rules_hash TEXT,             -- sha256 of the system rules that session has seen
+            created_at       REAL,
+            updated_at       REAL,
+            -- Newest linked message, kept in step by add_message_to_context so
+            -- pending-turn detection never has to scan context history.
+            last_message_id     TEXT,
+            last_message_source TEXT,
+            last_message_ts     REAL
+        )
+    ''')
+
+    # ── messages ──────────────────────────────────────────────────────────
+    # Append-only log of every Discord event. channel_id/thread_id are
+    # informational only. Context membership is in context_messages.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id                  TEXT PRIMARY KEY,  -- UUIDv7; uuid4 until rekeyed (bin/rekey_messages.py)
+            author              TEXT NOT NULL,
+            content             TEXT NOT NULL,
+            source              TEXT NOT NULL,     -- 'user' | 'bot'
+            timestamp           REAL NOT NULL,
+            channel_id          INTEGER,           -- origin channel
+            thread_id           INTEGER,           -- origin thread
+            delivered           BOOLEAN DEFAULT 0,
+            delivered_at        REAL,
+            delivery_status     TEXT DEFAULT 'pending', -- 'pending' | 'sent' | 'failed' | 'dead'
+            delivery_error      TEXT,
+            attempts            INTEGER DEFAULT 0, -- failed delivery attempts so far
+            next_attempt_at     REAL,              -- outbox skips the row until this time
+            discord_message_id  INTEGER            -- Discord snowflake of an inbound message
+        )
+    ''')
+
+    # ── message_payloads ─────────────────────────────────────────────────
+    # The full Discord Message JSON of a stored message, compressed (see
+    # src.db.payloads). Kept out of messages so message scans never read it.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_payloads (
+            message_id TEXT PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,
+            codec      TEXT NOT NULL,
+            payload    BLOB NOT NULL,
+            raw_bytes  INTEGER NOT NULL      -- size of the uncompressed JSON
+        )
+    ''')
+
+    # Best-effort schema sync for local/dev DBs created before these columns existed.
+    msg_cols = {row["name"] for row in conn.execute("PRAGMA table_info(messages)").fetchall()}
+    if "delivery_status" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN delivery_status TEXT DEFAULT 'pending'")
+    if "delivery_error" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN delivery_error TEXT")
+    if "attempts" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN attempts INTEGER DEFAULT 0")
+    if "next_attempt_at" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN next_attempt_at REAL")
+    conn.execute(
+        """
+        UPDATE messages
+        SET delivery_status = CASE WHEN delivered = 1 THEN 'sent' ELSE 'pending' END
+        WHERE delivery_status IS NULL OR trim(delivery_status) = ''
+           OR ? -- the column was just added: the DEFAULT filled in 'pending' for delivered rows too
+        """,
+        ("delivery_status" not in msg_cols,),
+    )
+    if "next_attempt_at" not in msg_cols:
+        # Rows queued before retry scheduling existed are due immediately.
+        conn.execute(
+            "UPDATE messages SET next_attempt_at = timestamp WHERE source = 'bot' AND delivery_status = 'pending'"
+        )
+
+    if "raw_discord_payload" in msg_cols:
+        migrate_inline_payloads(conn)
+    if "discord_message_id" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN discord_message_id INTEGER")
+        backfill_discord_message_ids(conn)
+
+    ctx_cols = {row["name"] for row in conn.execute("PRAGMA table_info(contexts)").fetchall()}
+    if "gemini_session_id" not in ctx_cols:
+        conn.execute("ALTER TABLE contexts ADD COLUMN gemini_session_id TEXT")
+    if "prompt_rules_hash" not in ctx_cols:
+        conn.execute("ALTER TABLE contexts ADD COLUMN prompt_rules_hash TEXT")
+    needs_last_message_backfill = "last_message_ts" not in ctx_cols
+    if needs_last_message_backfill:
+        conn.execute("ALTER TABLE contexts ADD COLUMN last_message_id TEXT")
+        conn.execute("ALTER TABLE contexts ADD COLUMN last_message_source TEXT")
+        conn.execute("ALTER TABLE contexts ADD COLUMN last_message_ts REAL")
+
+    # ── context_messages ─────────────────────────────────────────────────
+    # Many-to-many: any message can belong to any context.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS context_messages (
+            context_id  TEXT NOT NULL REFERENCES contexts(id) ON DELETE CASCADE,
+            message_id  TEXT NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+            added_at    REAL NOT NULL,
+            PRIMARY KEY (context_id, message_id)
+        )
+    ''')
+
+    if needs_last_message_backfill:
+        backfill_context_last_message(conn)
+
+    # ── pending_turns ────────────────────────────────────────────────────
+    # Durable turn queue: one row per context waiting for (or running) a
+    # Gemini turn. A worker claims a row by taking a lease; the owner is
+    # contexts.current_pid. Rows whose lease expired are claimable again.
+    has_pending_turns = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pending_turns'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pending_turns (
+            context_id       TEXT PRIMARY KEY REFERENCES contexts(id) ON DELETE CASCADE,
+            user_key         TEXT,               -- requesting user, for fair scheduling
+            priority         INTEGER DEFAULT 1,  -- 0 = DM / active thread lane, 1 = normal
+            enqueued_at      REAL NOT NULL,
+            claimed_at       REAL,
+            lease_expires_at REAL,               -- NULL = waiting to be claimed
+            attempts         INTEGER DEFAULT 0
+        )
+    ''')
+    turn_cols = {row["name"] for row in conn.execute("PRAGMA table_info(pending_turns)").fetchall()}
+    if "user_key" not in turn_cols:
+        conn.execute("ALTER TABLE pending_turns ADD COLUMN user_key TEXT")
+    if "priority" not in turn_cols:
+        conn.execute("ALTER TABLE pending_turns ADD COLUMN priority INTEGER DEFAULT 1")
+    if not has_pending_turns:
+        # Contexts the old in-memory queue would have picked up via polling.
         conn.execute(
             """
-            UPDATE messages
-            SET delivery_status = CASE WHEN delivered = 1 THEN 'sent' ELSE 'pending' END
-            WHERE delivery_status IS NULL OR trim(delivery_status) = ''
+            INSERT OR IGNORE INTO pending_turns (context_id, enqueued_at)
+            SELECT id, COALESCE(last_message_ts, updated_at, 0)
+            FROM contexts
+            WHERE status = 'idle' AND last_message_source = 'user'
             """
         )
 
-        ctx_cols = {row["name"] for row in conn.execute("PRAGMA table_info(contexts)").fetchall()}
-        if "gemini_session_id" not in ctx_cols:
-            conn.execute("ALTER TABLE contexts ADD COLUMN gemini_session_id TEXT")
-
-        # ── context_messages ─────────────────────────────────────────────────
-        # Many-to-many: any message can belong to any context.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS context_messages (
-                context_id  TEXT NOT NULL REFERENCES contexts(id) ON DELETE CASCADE,
-                message_id  TEXT NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
-                added_at    REAL NOT NULL,
-                PRIMARY KEY (context_id, message_id)
-            )
-        ''')
-
-        # ── indices ───────────────────────────────────────────────────────────
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_undelivered ON messages(source, delivered) WHERE source = "bot" AND delivered = 0')
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_delivery_status ON messages(source, delivery_status) WHERE source = 'bot'")
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_contexts_status ON contexts(status)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_contexts_reply_thread ON contexts(reply_thread_id)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_ctx_msg_context ON context_messages(context_id)')
-
-# Initialize the db on import
-init_db()
+    # ── context_summaries ─────────────────────────────────────────────────
+    # Rolling digest of a context's older messages, for cold-start prompts.
+    # Covers every linked message up to (covers_until_ts, covers_until_id).
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS context_summaries (
+            context_id      TEXT PRIMARY KEY REFERENCES contexts(id) ON DELETE CASCADE,
+            summary         TEXT NOT NULL,
+            covers_until_ts REAL NOT NULL,
+            covers_until_id TEXT NOT NULL,
+            message_count   INTEGER NOT NULL DEFAULT 0,  -- messages folded in so far
+            updated_at      REAL NOT NULL
+        )
+    ''')
+
+    # ── indices ───────────────────────────────────────────────────────────
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_discord_id ON messages(discord_message_id) WHERE discord_message_id IS NOT NULL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_undelivered ON messages(source, delivered) WHERE source = "bot" AND delivered = 0')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_delivery_status ON messages(source, delivery_status) WHERE source = 'bot'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_outbox_due ON messages(delivery_status, next_attempt_at) WHERE source = 'bot'")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_contexts_status ON contexts(status)')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_contexts_pending ON contexts(status, last_message_source) WHERE last_message_source = 'user'")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_contexts_reply_thread ON contexts(reply_thread_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ctx_msg_context ON context_messages(context_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_turns_enqueued ON pending_turns(enqueued_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_turns_user ON pending_turns(user_key, lease_expires_at)')
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+    # Lookups by context use the primary key; this one serves lookups by message
+    # (ON DELETE CASCADE from messages, rekey_message_batch).
+    conn.execute('DROP INDEX IF EXISTS idx_ctx_msg_context')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ctx_msg_message ON context_messages(message_id)')
+
+def _migrate_v3(conn: sqlite3.Connection) -> None:
+    # How many pages of a bot message the outbox has sent, so a retry resumes
+    # after them instead of sending them again.
+    msg_cols = {row["name"] for row in conn.execute("PRAGMA table_info(messages)").fetchall()}
+    if "pages_sent" not in msg_cols:
+        conn.execute("ALTER TABLE messages ADD COLUMN pages_sent INTEGER DEFAULT 0")
+
+def _migrate_v4(conn: sqlite3.Connection) -> None:
+    # The linked message's timestamp, copied onto the link: a context's history
+    # pages walk idx_ctx_msg_position newest first instead of joining and
+    # sorting every message in the context (get_context_history_page).
+    link_cols = {row["name"] for row in conn.execute("PRAGMA table_info(context_messages)").fetchall()}
+    if "message_ts" not in link_cols:
+        conn.execute("ALTER TABLE context_messages ADD COLUMN message_ts REAL")
+        conn.execute(
+            "UPDATE context_messages SET message_ts = (SELECT timestamp FROM messages WHERE id = message_id)"
+        )
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS idx_ctx_msg_position ON context_messages(context_id, message_ts, message_id)'
+    )
+    # What history.py keeps is the first line of each older message, not a summary.
+    tables = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    if "context_digests" in tables:
+        conn.execute("DROP TABLE IF EXISTS context_summaries")  # v1 run again over a migrated database
+    elif "context_summaries" in tables:
+        conn.execute("ALTER TABLE context_summaries RENAME TO context_digests")
+        conn.execute("ALTER TABLE context_digests RENAME COLUMN summary TO digest")
+
+# Schema steps in order; PRAGMA user_version counts how many a database has had.
+# Append new steps, never edit or reorder applied ones.
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate() -> int:
+    """
+    Bring the database up to SCHEMA_VERSION, one transaction per step.
+    Safe to race: each step re-reads user_version under the write lock.
+    Returns the number of steps applied.
+    """
+    applied = 0
+    while True:
+        with get_db() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            version = schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                break
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+        applied += 1
+        print(f"[{time.ctime()}] Migrated {DB_PATH} to schema version {version + 1}", flush=True)
+    return applied
+
+def ensure_schema() -> None:
+    """
+    migrate() only if the database is behind: one PRAGMA read when it is
+    current. For helper tools that write; read-only ones skip even this.
+    """
+    with get_db() as conn:
+        current = schema_version(conn) >= SCHEMA_VERSION
+    if not current:
+        migrate()
+
+def init_db() -> None:
+    """Old name for migrate()."""
+    migrate()
+
+def backfill_context_last_message(conn: sqlite3.Connection) -> None:
+    """Recompute contexts.last_message_* from the linked message history."""
+    conn.execute(
+        """
+        UPDATE contexts
+        SET (last_message_id, last_message_source, last_message_ts) = (
+            SELECT m.id, m.source, m.timestamp
+            FROM context_messages cm
+            JOIN messages m ON cm.message_id = m.id
+            WHERE cm.context_id = contexts.id
+            ORDER BY m.timestamp DESC
+            LIMIT 1
+        )
+        """
+    )
+
+def migrate_inline_payloads(conn: sqlite3.Connection, batch_size: int = 1000) -> int:
+    """Move messages.raw_discord_payload into message_payloads, compressed, and drop the column."""
+    moved = 0
+    cursor = conn.execute(
+        "SELECT id, raw_discord_payload FROM messages WHERE raw_discord_payload IS NOT NULL"
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        encoded = [(row["id"], Payload.from_json(row["raw_discord_payload"].encode())) for row in rows]
+        conn.executemany(
+            "INSERT OR REPLACE INTO message_payloads (message_id, codec, payload, raw_bytes) VALUES (?, ?, ?, ?)",
+            [(msg_id, p.codec, p.data, p.raw_bytes) for msg_id, p in encoded],
+        )
+        moved += len(rows)
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.execute("ALTER TABLE messages DROP COLUMN raw_discord_payload")
+    else:
+        conn.execute("UPDATE messages SET raw_discord_payload = NULL WHERE raw_discord_payload IS NOT NULL")
+    print(f"[{time.ctime()}] Moved {moved} Discord payload(s) into message_payloads", flush=True)
+    return moved
+
+def backfill_discord_message_ids(conn: sqlite3.Connection, batch_size: int = 1000) -> int:
+    """
+    Fill messages.discord_message_id from the stored payloads. If a Discord
+    message was stored more than once, only its oldest row gets the id.
+    """
+    seen = set()
+    updates = []
+    cursor = conn.execute(
+        """
+        SELECT p.message_id, p.codec, p.payload
+        FROM message_payloads p
+        JOIN messages m ON m.id = p.message_id
+        WHERE m.discord_message_id IS NULL
+        ORDER BY m.timestamp, m.id
+        """
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            try:
+                discord_id = int(json.loads(decode_bytes(row["codec"], row["payload"]))["id"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if discord_id not in seen:
+                seen.add(discord_id)
+                updates.append((discord_id, row["message_id"]))
+    conn.executemany("UPDATE messages SET discord_message_id = ? WHERE id = ?", updates)
+    print(f"[{time.ctime()}] Backfilled discord_message_id on {len(updates)} message(s)", flush=True)
+    return len(updates)
+
+def rekey_message_batch(
+    conn: sqlite3.Connection,
+    after_rowid: int = 0,
+    batch_size: int = 500,
+    before_ts: Optional[float] = None,
+) -> Tuple[int, int, int]:
+    """
+    Give up to batch_size legacy (uuid4) messages past after_rowid a UUIDv7
+    id minted from their own timestamp, updating every column that refers
+    to them. Rows newer than before_ts and bot messages still waiting in the
+    outbox are left alone, since the running bot may hold their ids.
+    Returns (last rowid scanned, rows scanned, rows rekeyed); a last rowid
+    equal to after_rowid means the table is done. Run it inside a
+    transaction: foreign keys are checked at its commit.
+    """
+    rows = conn.execute(
+        """
+        SELECT rowid, id, timestamp, source, delivery_status FROM messages
+        WHERE rowid > ? ORDER BY rowid LIMIT ?
+        """,
+        (after_rowid, batch_size),
+    ).fetchall()
+    if not rows:
+        return after_rowid, 0, 0
+    mapping = [
+        (new_id(row["timestamp"]), row["id"])
+        for row in rows
+        if not is_time_ordered(row["id"])
+        and (before_ts is None or row["timestamp"] < before_ts)
+        and not (row["source"] == "bot" and row["delivery_status"] == "pending")
+    ]
+    if mapping:
+        conn.execute("PRAGMA defer_foreign_keys = ON")
+        conn.executemany("UPDATE messages SET id = ? WHERE id = ?", mapping)
+        conn.executemany("UPDATE message_payloads SET message_id = ? WHERE message_id = ?", mapping)
+        # Before context_messages moves on: these find their contexts through it.
+        conn.executemany(
+            """
+            UPDATE contexts SET last_message_id = ?1
+            WHERE last_message_id = ?2
+              AND id IN (SELECT context_id FROM context_messages WHERE message_id = ?2)
+            """,
+            mapping,
+        )
+        conn.executemany(
+            """
+            UPDATE context_digests SET covers_until_id = ?1
+            WHERE covers_until_id = ?2
+              AND context_id IN (SELECT context_id FROM context_messages WHERE message_id = ?2)
+            """,
+            mapping,
+        )
+        conn.executemany("UPDATE context_messages SET message_id = ? WHERE message_id = ?", mapping)
+    return rows[-1]["rowid"], len(rows), len(mapping)
@@ -0,0 +1,67 @@
+"""
+Time-ordered primary keys for messages and contexts.
+
+Keys are UUIDv7 strings (RFC 9562): a 48-bit millisecond timestamp followed
+by random bits, in the usual 8-4-4-4-12 hex form. They sort by creation
+time as TEXT, so new rows append to the right edge of the messages and
+context_messages B-trees instead of landing on a random page, and they stay
+the same shape as the uuid4 keys older rows carry. Within one millisecond
+new_id() counts up in the 12-bit rand_a field, so ids from this process are
+strictly increasing.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+UUID7_VERSION_CHAR = "7"  # id[14]; uuid4 keys have "4" there
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_seq = 0
+
+
+def _format(value: int) -> str:
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _pack(unix_ms: int, seq: int) -> str:
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = ((unix_ms & ((1 << 48) - 1)) << 80) | (0x7 << 76) | (seq << 64) | (0b10 << 62) | rand_b
+    return _format(value)
+
+
+def new_id(timestamp: Optional[float] = None) -> str:
+    """
+    A new UUIDv7 string. Pass the row's own unix timestamp to key it by that
+    time (catch-up, rekeying); without one it is now, monotonic per process.
+    """
+    global _last_ms, _last_seq
+    if timestamp is not None:
+        return _pack(int(timestamp * 1000), int.from_bytes(os.urandom(2), "big") & 0xFFF)
+    unix_ms = time.time_ns() // 1_000_000
+    with _lock:
+        if unix_ms <= _last_ms:
+            if _last_seq < 0xFFF:
+                _last_seq += 1
+            else:  # 4096 ids in one millisecond: borrow the next one
+                _last_ms += 1
+                _last_seq = 0
+            unix_ms = _last_ms
+        else:
+            _last_ms = unix_ms
+            # Start low in the field so the counter has room to run.
+            _last_seq = int.from_bytes(os.urandom(2), "big") & 0x3FF
+        seq = _last_seq
+    return _pack(unix_ms, seq)
+
+
+def is_time_ordered(key: str) -> bool:
+    """True for a UUIDv7 key, False for a legacy uuid4 one."""
+    return len(key) == 36 and key[14] == UUID7_VERSION_CHAR
+
+
+def id_time(key: str) -> float:
+    """The unix time (millisecond precision) a UUIDv7 key was minted for."""
+    return int(key[:8] + key[9:13], 16) / 1000
@@ -0,0 +1,124 @@
+"""
+Wakeups for DB-driven workers.
+
+Outbox: tell the outbox watcher that a new bot message is waiting.
+
+Inside the bot process, writers call the registered listeners directly.
+Any other process (scripts/send_message.py, the agent's tools) has no
+listeners, so it sends a one-byte datagram to a Unix socket that the bot
+listens on instead. Both paths are best-effort: the watcher still runs a
+slow safety-net poll, so a lost wakeup only costs latency, never a message.
+
+Turns: tell the gemini worker that a context was added to pending_turns.
+These are in-process only; the table itself is the durable record.
+"""
+import asyncio
+import contextlib
+import os
+import socket
+import threading
+import time
+from typing import Callable, List, Optional
+
+_DISCORD_BOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+OUTBOX_SOCKET_PATH = os.environ.get("GEMINI_OUTBOX_SOCKET", os.path.join(_DISCORD_BOT_DIR, "outbox.sock"))
+
+_listeners: List[Callable[[], None]] = []
+_turn_listeners: List[Callable[[str], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def add_outbox_listener(callback: Callable[[], None]) -> None:
+    """Register an in-process wakeup. Called from whichever thread did the write."""
+    with _listeners_lock:
+        _listeners.append(callback)
+
+
+def remove_outbox_listener(callback: Callable[[], None]) -> None:
+    with _listeners_lock:
+        with contextlib.suppress(ValueError):
+            _listeners.remove(callback)
+
+
+def notify_outbox() -> None:
+    """Wake the outbox watcher, in-process if possible, else via the socket."""
+    with _listeners_lock:
+        listeners = list(_listeners)
+    if listeners:
+        for callback in listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[{time.ctime()}] WARNING: outbox listener failed: {e}", flush=True)
+        return
+    _send_datagram(OUTBOX_SOCKET_PATH)
+
+
+def add_turn_listener(callback: Callable[[str], None]) -> None:
+    """Register an in-process wakeup for newly queued turns; gets the context id."""
+    with _listeners_lock:
+        _turn_listeners.append(callback)
+
+
+def remove_turn_listener(callback: Callable[[str], None]) -> None:
+    with _listeners_lock:
+        with contextlib.suppress(ValueError):
+            _turn_listeners.remove(callback)
+
+
+def notify_turn(context_id: str) -> None:
+    """Wake in-process turn workers. Other processes pick turns up on their safety-net poll."""
+    with _listeners_lock:
+        listeners = list(_turn_listeners)
+    for callback in listeners:
+        try:
+            callback(context_id)
+        except Exception as e:
+            print(f"[{time.ctime()}] WARNING: turn listener failed: {e}", flush=True)
+
+
+def _send_datagram(path: str) -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b"o", path)
+    except OSError:
+        # No bot listening (or its buffer is full, meaning a wakeup is already pending).
+        pass
+
+
+class _WakeupProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        self.callback()
+
+
+async def serve_outbox_socket(
+    callback: Callable[[], None],
+    path: Optional[str] = None,
+) -> Optional[asyncio.BaseTransport]:
+    """
+    Listen for out-of-process wakeups on a Unix datagram socket, calling
+    callback on the event loop for each one. Returns the transport (close it
+    to stop), or None if Unix sockets are unavailable here.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = path or OUTBOX_SOCKET_PATH
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)  # stale socket left by a previous run
+    loop = asyncio.get_running_loop()
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _WakeupProtocol(callback),
+            local_addr=path,
+            family=socket.AF_UNIX,
+        )
+    except OSError as e:
+        print(f"[{time.ctime()}] WARNING: Could not listen on outbox socket {path}: {e}", flush=True)
+        return None
+    return transport
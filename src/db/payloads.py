@@ -0,0 +1,111 @@
+"""
+Compact storage for raw Discord message payloads.
+
+Payloads live in the message_payloads side table, not in messages, so the
+message queries never read them. Each one is compact JSON compressed with
+zlib and a preset dictionary of the keys and values every payload shares.
+A typical payload is a few hundred bytes, too small for plain zlib to find
+much to reuse; the dictionary gives it that. Every row records its codec,
+so the dictionary can change without rewriting old rows: add a new codec
+and keep decoding the old ones.
+
+Encoding is CPU work: callers on the event loop use encode_payload_async()
+so it runs on a worker thread instead of the loop or the DB writer thread.
+Payload.value() decompresses on first use only.
+"""
+import asyncio
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+try:
+    import orjson  # optional, faster and more compact
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+PAYLOAD_COMPRESS_LEVEL = 6
+
+# What _discord_message_to_payload() writes for every message, most common last
+# (zlib favours the end of the dictionary).
+_ZDICT_V1 = json.dumps({
+    "embeds": [{"type": "rich", "title": "", "description": "", "url": "https://", "color": 0,
+                "thumbnail": {"url": "https://", "proxy_url": "https://", "width": 0, "height": 0},
+                "image": {"url": "https://", "proxy_url": "https://", "width": 0, "height": 0},
+                "footer": {"text": ""}, "fields": [{"name": "", "value": "", "inline": False}]}],
+    "attachments": [{"id": "", "filename": "", "url": "https://cdn.discordapp.com/attachments/",
+                     "content_type": "image/png"}],
+    "role_mentions": [{"id": "", "name": ""}],
+    "channel_mentions": [{"id": "", "name": ""}],
+    "mentions": [{"id": "", "username": ""}],
+    "referenced_message": {"id": "", "content": "", "author": ""},
+    "message_reference": {"message_id": "", "channel_id": "", "guild_id": None},
+    "thread_id": "", "parent_channel_id": "",
+    "id": "", "channel_id": "", "author": {"id": "", "username": "", "bot": False},
+    "content": "", "timestamp": "2025-01-01T00:00:00.000000+00:00", "type": "MessageType.default",
+    "pinned": False, "tts": False,
+}, separators=(",", ":")).encode()
+
+CODEC_ZLIB_V1 = "zlib-d1"
+CODEC_JSON = "json"  # uncompressed; only written if compression does not pay off
+
+
+def _dumps(value: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class Payload:
+    """An encoded payload. value() decodes it on first use and keeps the result."""
+
+    __slots__ = ("codec", "data", "raw_bytes", "_value")
+
+    def __init__(self, codec: str, data: bytes, raw_bytes: int, value: Optional[Dict[str, Any]] = None):
+        self.codec = codec
+        self.data = data
+        self.raw_bytes = raw_bytes
+        self._value = value
+
+    @classmethod
+    def encode(cls, value: Dict[str, Any]) -> "Payload":
+        payload = cls.from_json(_dumps(value))
+        payload._value = value
+        return payload
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> "Payload":
+        """Compress already-serialized JSON as is (used to migrate old rows)."""
+        compressor = zlib.compressobj(PAYLOAD_COMPRESS_LEVEL, zdict=_ZDICT_V1)
+        data = compressor.compress(raw) + compressor.flush()
+        if len(data) >= len(raw):
+            return cls(CODEC_JSON, raw, len(raw))
+        return cls(CODEC_ZLIB_V1, data, len(raw))
+
+    def value(self) -> Dict[str, Any]:
+        if self._value is None:
+            self._value = json.loads(decode_bytes(self.codec, self.data))
+        return self._value
+
+    def __repr__(self) -> str:
+        return f"Payload({self.codec!r}, {len(self.data)} of {self.raw_bytes} bytes)"
+
+
+def decode_bytes(codec: str, data: bytes) -> bytes:
+    """The JSON bytes of a stored payload."""
+    if codec == CODEC_ZLIB_V1:
+        decompressor = zlib.decompressobj(zdict=_ZDICT_V1)
+        return decompressor.decompress(data) + decompressor.flush()
+    if codec == CODEC_JSON:
+        return bytes(data)
+    raise ValueError(f"unknown payload codec {codec!r}")
+
+
+def encode_payload(value: Optional[Dict[str, Any]]) -> Optional[Payload]:
+    return Payload.encode(value) if value else None
+
+
+async def encode_payload_async(value: Optional[Dict[str, Any]]) -> Optional[Payload]:
+    """encode_payload() on a worker thread, off the event loop."""
+    if not value:
+        return None
+    return await asyncio.to_thread(Payload.encode, value)
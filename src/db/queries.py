@@ -1,9 +1,17 @@
-import json
 import time
-import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
-from src.db.database import get_db
+from src.db.database import get_db, after_commit
+from src.db.ids import new_id
+from src.db.notify import notify_outbox, notify_turn
+from src.db.payloads import Payload
+
+# Every messages column; queries list them rather than SELECT * (see message_payloads).
+MESSAGE_COLUMNS = (
+    "id, author, content, source, timestamp, channel_id, thread_id, delivered, delivered_at, "
+    "delivery_status, delivery_error, attempts, next_attempt_at, discord_message_id, pages_sent"
+)
+_M_MESSAGE_COLUMNS = ", ".join(f"m.{col.strip()}" for col in MESSAGE_COLUMNS.split(","))
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -19,29 +27,59 @@ def insert_message(
     thread_id: Optional[int] = None,
     delivered: Optional[bool] = None,
     delivered_at: Optional[float] = None,
-    raw_discord_payload: Optional[Dict[str, Any]] = None,
+    raw_discord_payload: Optional[Union[Dict[str, Any], Payload]] = None,
+    discord_message_id: Optional[int] = None,
+    next_attempt_at: Optional[float] = None,
 ) -> Dict[str, Any]:
-    """Insert a raw message into the message log. Returns the stored dict."""
+    """
+    Insert a raw message into the message log. Returns the stored dict.
+    An undelivered bot message is due for the outbox at next_attempt_at
+    (default: now); a later time holds it back for a sender that is
+    delivering it itself, and the outbox is not woken for it.
+    raw_discord_payload goes to message_payloads; pass a Payload encoded
+    beforehand (encode_payload_async) to keep the compression off this thread.
+    A discord_message_id that is already stored is not inserted again: the
+    existing row is returned instead.
+    """
     if source not in {"user", "bot"}:
         raise ValueError("source must be 'user' or 'bot'")
 
+    msg_id = new_id(timestamp)
     timestamp_val = float(timestamp if timestamp is not None else time.time())
-    msg_id = str(uuid.uuid4())
     delivered_val = 1 if delivered else 0
     delivery_status = "sent" if delivered_val else "pending"
-    payload_json = json.dumps(raw_discord_payload) if raw_discord_payload else None
+    if delivered_val:
+        next_attempt_at = None
+    elif next_attempt_at is None:
+        next_attempt_at = timestamp_val
+    payload = raw_discord_payload
+    if payload and not isinstance(payload, Payload):
+        payload = Payload.encode(payload)
 
     with get_db() as conn:
-        conn.execute(
+        cursor = conn.execute(
             """
             INSERT INTO messages
                 (id, author, content, source, timestamp,
-                 channel_id, thread_id, delivered, delivered_at, delivery_status, delivery_error, raw_discord_payload)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 channel_id, thread_id, delivered, delivered_at, delivery_status, delivery_error,
+                 next_attempt_at, discord_message_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (discord_message_id) WHERE discord_message_id IS NOT NULL DO NOTHING
             """,
             (msg_id, str(author), str(content), source, timestamp_val,
-             channel_id, thread_id, delivered_val, delivered_at, delivery_status, None, payload_json),
+             channel_id, thread_id, delivered_val, delivered_at, delivery_status, None,
+             next_attempt_at, discord_message_id),
         )
+        if cursor.rowcount == 0:
+            # A replayed gateway event, or catch-up overlapping live delivery.
+            return get_message_by_discord_id(discord_message_id)
+        if payload:
+            conn.execute(
+                "INSERT INTO message_payloads (message_id, codec, payload, raw_bytes) VALUES (?, ?, ?, ?)",
+                (msg_id, payload.codec, payload.data, payload.raw_bytes),
+            )
+        if source == "bot" and not delivered_val and next_attempt_at <= time.time():
+            after_commit(notify_outbox)
 
     return {
         "id": msg_id,
@@ -53,24 +91,73 @@ def insert_message(
         "thread_id": thread_id,
         "delivered": bool(delivered_val),
         "delivered_at": delivered_at,
-        "raw_discord_payload": raw_discord_payload,
+        "discord_message_id": discord_message_id,
     }
 
 
-def get_undelivered_bot_messages() -> List[Dict[str, Any]]:
-    """Return all undelivered bot messages with their origin channel/thread ids."""
+def get_message_by_discord_id(discord_message_id: int) -> Optional[Dict[str, Any]]:
+    with get_db() as conn:
+        row = conn.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE discord_message_id = ?",
+            (discord_message_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def get_stored_discord_message_ids(discord_message_ids: List[int]) -> Set[int]:
+    """Which of these Discord message ids are already in the log (one indexed lookup)."""
+    ids = list(dict.fromkeys(int(i) for i in discord_message_ids))
+    if not ids:
+        return set()
+    with get_db() as conn:
+        rows = conn.execute(
+            f"SELECT discord_message_id FROM messages WHERE discord_message_id IN ({', '.join('?' * len(ids))})",
+            ids,
+        ).fetchall()
+        return {row[0] for row in rows}
+
+
+def get_message_payload(message_id: str) -> Optional[Payload]:
+    """The stored Discord payload of a message, still compressed: call .value() to decode it."""
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT codec, payload, raw_bytes FROM message_payloads WHERE message_id = ?",
+            (message_id,),
+        ).fetchone()
+    return Payload(row["codec"], row["payload"], row["raw_bytes"]) if row else None
+
+
+def get_undelivered_bot_messages(now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Return undelivered bot messages that are due for a (re)try, oldest first."""
+    now_val = float(now if now is not None else time.time())
     with get_db() as conn:
         cursor = conn.execute(
-            """
-            SELECT *
+            f"""
+            SELECT {MESSAGE_COLUMNS}
             FROM messages
-            WHERE source = 'bot' AND delivery_status = 'pending' AND trim(content) != ''
+            WHERE source = 'bot' AND delivery_status = 'pending' AND next_attempt_at <= ?
             ORDER BY timestamp ASC
-            """
+            """,
+            (now_val,),
         )
         return [dict(row) for row in cursor.fetchall()]
 
 
+def get_next_outbox_attempt_at(after: Optional[float] = None) -> Optional[float]:
+    """Return the earliest retry time of a pending bot message later than `after` (default now)."""
+    after_val = float(after if after is not None else time.time())
+    with get_db() as conn:
+        row = conn.execute(
+            """
+            SELECT MIN(next_attempt_at) AS due
+            FROM messages
+            WHERE source = 'bot' AND delivery_status = 'pending' AND next_attempt_at > ?
+            """,
+            (after_val,),
+        ).fetchone()
+        return row["due"] if row else None
+
+
 def mark_delivered(
     message_id: str,
     delivered: bool = True,
@@ -81,25 +168,52 @@ def mark_delivered(
         cursor = conn.execute(
             """
             UPDATE messages
-            SET delivered = ?, delivered_at = ?, delivery_status = ?, delivery_error = NULL
+            SET delivered = ?, delivered_at = ?, delivery_status = ?, delivery_error = NULL,
+                next_attempt_at = ?
             WHERE id = ?
             """,
-            (1 if delivered else 0, time_val, "sent" if delivered else "pending", message_id),
+            (1 if delivered else 0, time_val, "sent" if delivered else "pending",
+             None if delivered else time.time(), message_id),
         )
+        if cursor.rowcount > 0 and not delivered:
+            after_commit(notify_outbox)
         return cursor.rowcount > 0
 
 
-def mark_failed_delivery(message_id: str, error: Optional[str] = None) -> bool:
+def record_pages_sent(message_id: str, pages_sent: int) -> bool:
+    """Note how many pages of a bot message are out, so a retry resumes after them."""
     with get_db() as conn:
-        cursor = conn.execute(
+        cursor = conn.execute("UPDATE messages SET pages_sent = ? WHERE id = ?", (pages_sent, message_id))
+        return cursor.rowcount > 0
+
+
+
+
+def schedule_delivery_retry(
+    message_id: str,
+    error: Optional[str],
+    next_attempt_at: float,
+    max_attempts: int,
+) -> Optional[str]:
+    """
+    Record a failed delivery attempt. The message stays 'pending' until
+    next_attempt_at, or moves to the 'dead' letter state once it has failed
+    max_attempts times. Returns the new delivery_status (None if not found).
+    """
+    with get_db() as conn:
+        conn.execute(
             """
             UPDATE messages
-            SET delivered = 0, delivery_status = 'failed', delivery_error = ?
+            SET attempts = COALESCE(attempts, 0) + 1,
+                delivery_error = ?,
+                next_attempt_at = ?,
+                delivery_status = CASE WHEN COALESCE(attempts, 0) + 1 >= ? THEN 'dead' ELSE 'pending' END
             WHERE id = ?
             """,
-            ((error or "")[:1000], message_id),
+            ((error or "")[:1000], float(next_attempt_at), max_attempts, message_id),
         )
-        return cursor.rowcount > 0
+        row = conn.execute("SELECT delivery_status FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return row["delivery_status"] if row else None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -110,8 +224,8 @@ def create_context(
     reply_channel_id: Optional[int] = None,
     reply_thread_id: Optional[int] = None,
 ) -> str:
-    """Create a new conversation context, return its UUID id."""
-    context_id = str(uuid.uuid4())
+    """Create a new conversation context, return its id (a UUIDv7 string)."""
+    context_id = new_id()
     now = time.time()
     with get_db() as conn:
         conn.execute(
@@ -162,56 +276,200 @@ def set_context_reply_thread(context_id: str, thread_id: int) -> None:
         )
 
 
-def update_context_status(
-    context_id: str,
-    status: str,
-    pid: Optional[int] = None,
-) -> None:
-    if status not in {"idle", "running"}:
-        raise ValueError("status must be 'idle' or 'running'")
+
+
+def update_context_session_id(context_id: str, session_id: Optional[str],
+                              prompt_rules_hash: Optional[str] = None) -> None:
+    """
+    Update the Gemini session ID for a context, along with the hash of the
+    system rules that session has been given (cleared with the session).
+    """
     with get_db() as conn:
         conn.execute(
-            "UPDATE contexts SET status = ?, current_pid = ?, updated_at = ? WHERE id = ?",
-            (status, pid, time.time(), context_id),
+            "UPDATE contexts SET gemini_session_id = ?, prompt_rules_hash = ?, updated_at = ? WHERE id = ?",
+            (session_id, prompt_rules_hash if session_id else None, time.time(), context_id),
         )
 
 
-def update_context_session_id(context_id: str, session_id: Optional[str]) -> None:
-    """Update the Gemini session ID for a context."""
+
+
+def get_context(context_id: str) -> Optional[Dict[str, Any]]:
+    with get_db() as conn:
+        cursor = conn.execute("SELECT * FROM contexts WHERE id = ?", (context_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Turn queue
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Priority lanes for pending_turns.priority: lower is claimed first.
+TURN_PRIORITY_HIGH = 0    # DMs and threads the bot is already answering in
+TURN_PRIORITY_NORMAL = 1  # mentions that start a new conversation
+
+
+def enqueue_turn(
+    context_id: str,
+    user_key: Optional[str] = None,
+    priority: int = TURN_PRIORITY_NORMAL,
+    now: Optional[float] = None,
+) -> bool:
+    """
+    Queue a Gemini turn for a context. A context has at most one row, so a
+    turn that is already queued or running absorbs the request (a waiting
+    row can still be promoted to a higher-priority lane). Returns True if a
+    new row was added (in-process workers are woken after commit).
+    """
     with get_db() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO pending_turns (context_id, user_key, priority, enqueued_at) VALUES (?, ?, ?, ?)",
+            (context_id, user_key, priority, float(now if now is not None else time.time())),
+        )
+        if cursor.rowcount > 0:
+            after_commit(lambda: notify_turn(context_id))
+            return True
         conn.execute(
-            "UPDATE contexts SET gemini_session_id = ?, updated_at = ? WHERE id = ?",
-            (session_id, time.time(), context_id),
+            "UPDATE pending_turns SET priority = ? WHERE context_id = ? AND priority > ? AND lease_expires_at IS NULL",
+            (priority, context_id, priority),
         )
+        return False
 
 
-def get_idle_contexts_with_pending_user_messages() -> List[str]:
+def claim_turn(
+    owner_pid: int,
+    lease_seconds: float,
+    max_attempts: int = 3,
+    now: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
     """
-    Return context IDs that are idle but whose last linked message is from 'user'.
+    Lease the next claimable turn to owner_pid and mark its context running.
+
+    Claimable means never leased, or the previous owner's lease expired
+    (crashed or stalled process). The next turn is the one in the highest
+    priority lane, then the one whose user has the fewest turns running
+    (so one busy user can't starve the rest), then the oldest. Turns that
+    already burned max_attempts leases are dropped. Returns the
+    pending_turns row, or None.
     """
+    now = float(now if now is not None else time.time())
+    with get_db() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "DELETE FROM pending_turns WHERE attempts >= ? AND lease_expires_at < ?",
+            (max_attempts, now),
+        )
+        row = conn.execute(
+            """
+            SELECT pt.context_id FROM pending_turns pt
+            WHERE pt.lease_expires_at IS NULL OR pt.lease_expires_at < :now
+            ORDER BY pt.priority,
+                     (SELECT COUNT(*) FROM pending_turns r
+                      WHERE r.user_key IS pt.user_key AND r.lease_expires_at >= :now),
+                     pt.enqueued_at
+            LIMIT 1
+            """,
+            {"now": now},
+        ).fetchone()
+        if row is None:
+            return None
+        context_id = row["context_id"]
+        conn.execute(
+            """
+            UPDATE pending_turns
+            SET claimed_at = ?, lease_expires_at = ?, attempts = attempts + 1
+            WHERE context_id = ?
+            """,
+            (now, now + lease_seconds, context_id),
+        )
+        conn.execute(
+            "UPDATE contexts SET status = 'running', current_pid = ?, updated_at = ? WHERE id = ?",
+            (owner_pid, now, context_id),
+        )
+        claimed = conn.execute("SELECT * FROM pending_turns WHERE context_id = ?", (context_id,)).fetchone()
+        return dict(claimed)
+
+
+def heartbeat_turn(context_id: str, owner_pid: int, lease_seconds: float) -> bool:
+    """Extend a held lease. Returns False if owner_pid no longer owns the turn."""
+    now = time.time()
     with get_db() as conn:
         cursor = conn.execute(
             """
-            SELECT c.id
-            FROM contexts c
-            WHERE c.status = 'idle'
-              AND (
-                  SELECT m.source
-                  FROM context_messages cm
-                  JOIN messages m ON cm.message_id = m.id
-                  WHERE cm.context_id = c.id
-                  ORDER BY m.timestamp DESC
-                  LIMIT 1
-              ) = 'user'
+            UPDATE pending_turns SET lease_expires_at = ?
+            WHERE context_id = ?
+              AND lease_expires_at IS NOT NULL
+              AND EXISTS (SELECT 1 FROM contexts WHERE id = ? AND current_pid = ?)
+            """,
+            (now + lease_seconds, context_id, context_id, owner_pid),
+        )
+        return cursor.rowcount > 0
+
+
+def complete_turn(context_id: str, owner_pid: int) -> bool:
+    """Remove a finished turn and idle its context, if owner_pid still owns it."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            "UPDATE contexts SET status = 'idle', current_pid = NULL, updated_at = ? WHERE id = ? AND current_pid = ?",
+            (time.time(), context_id, owner_pid),
+        )
+        if cursor.rowcount == 0:
+            return False
+        conn.execute("DELETE FROM pending_turns WHERE context_id = ?", (context_id,))
+        return True
+
+
+def release_expired_turn_leases(now: Optional[float] = None) -> int:
+    """
+    Idle contexts left 'running' without a live lease (crashed process, or
+    rows from before the turn queue existed). Their pending_turns rows, if
+    any, become claimable again. Returns the number of contexts reset.
+    """
+    with get_db() as conn:
+        cursor = conn.execute(
             """
+            UPDATE contexts SET status = 'idle', current_pid = NULL
+            WHERE status = 'running'
+              AND NOT EXISTS (
+                  SELECT 1 FROM pending_turns pt
+                  WHERE pt.context_id = contexts.id AND pt.lease_expires_at >= ?
+              )
+            """,
+            (float(now if now is not None else time.time()),),
         )
-        return [row["id"] for row in cursor.fetchall()]
+        return cursor.rowcount
 
 
-def get_context(context_id: str) -> Optional[Dict[str, Any]]:
+def get_turn_queue_stats(now: Optional[float] = None) -> Dict[str, Any]:
+    """Queue depth per lane, running turns, and the oldest waiting turn's enqueue time."""
     with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM contexts WHERE id = ?", (context_id,))
-        row = cursor.fetchone()
+        row = conn.execute(
+            """
+            SELECT
+                SUM(CASE WHEN waiting AND priority = :high THEN 1 ELSE 0 END) AS queued_high,
+                SUM(CASE WHEN waiting AND priority != :high THEN 1 ELSE 0 END) AS queued_normal,
+                SUM(CASE WHEN waiting THEN 0 ELSE 1 END) AS running,
+                MIN(CASE WHEN waiting THEN enqueued_at END) AS oldest_enqueued_at
+            FROM (
+                SELECT priority, enqueued_at,
+                       (lease_expires_at IS NULL OR lease_expires_at < :now) AS waiting
+                FROM pending_turns
+            )
+            """,
+            {"now": float(now if now is not None else time.time()), "high": TURN_PRIORITY_HIGH},
+        ).fetchone()
+        return {
+            "queued_high": row["queued_high"] or 0,
+            "queued_normal": row["queued_normal"] or 0,
+            "running": row["running"] or 0,
+            "oldest_enqueued_at": row["oldest_enqueued_at"],
+        }
+
+
+def get_pending_turn(context_id: str) -> Optional[Dict[str, Any]]:
+    with get_db() as conn:
+        row = conn.execute("SELECT * FROM pending_turns WHERE context_id = ?", (context_id,)).fetchone()
         return dict(row) if row else None
 
 
@@ -220,19 +478,142 @@ def get_context(context_id: str) -> Optional[Dict[str, Any]]:
 # ─────────────────────────────────────────────────────────────────────────────
 
 def add_message_to_context(context_id: str, message_id: str) -> None:
-    """Link a message to a context (idempotent)."""
+    """Link a message to a context (idempotent) and advance its last-message state."""
+    now = time.time()
     with get_db() as conn:
         conn.execute(
             """
-            INSERT OR IGNORE INTO context_messages (context_id, message_id, added_at)
-            VALUES (?, ?, ?)
+            INSERT OR IGNORE INTO context_messages (context_id, message_id, added_at, message_ts)
+            VALUES (?, ?, ?, (SELECT timestamp FROM messages WHERE id = ?))
             """,
-            (context_id, message_id, time.time()),
+            (context_id, message_id, now, message_id),
         )
+        msg = conn.execute(
+            "SELECT source, timestamp FROM messages WHERE id = ?", (message_id,)
+        ).fetchone()
+        if msg is None:
+            conn.execute("UPDATE contexts SET updated_at = ? WHERE id = ?", (now, context_id))
+            return
+        # Only a message at least as new as the current last one takes its place
+        # (catch-up can link older messages after newer ones). SET expressions all
+        # see the pre-update row, so the repeated condition is evaluated consistently.
         conn.execute(
-            "UPDATE contexts SET updated_at = ? WHERE id = ?",
-            (time.time(), context_id),
+            """
+            UPDATE contexts
+            SET updated_at = :now,
+                last_message_id = CASE WHEN last_message_ts IS NULL OR last_message_ts <= :ts
+                                       THEN :message_id ELSE last_message_id END,
+                last_message_source = CASE WHEN last_message_ts IS NULL OR last_message_ts <= :ts
+                                           THEN :source ELSE last_message_source END,
+                last_message_ts = CASE WHEN last_message_ts IS NULL OR last_message_ts <= :ts
+                                       THEN :ts ELSE last_message_ts END
+            WHERE id = :context_id
+            """,
+            {"now": now, "message_id": message_id, "source": msg["source"],
+             "ts": msg["timestamp"], "context_id": context_id},
+        )
+
+
+def ingest_user_message(
+    author: str,
+    content: str,
+    *,
+    timestamp: Optional[float] = None,
+    channel_id: Optional[int] = None,
+    thread_id: Optional[int] = None,
+    raw_discord_payload: Optional[Union[Dict[str, Any], Payload]] = None,
+    discord_message_id: Optional[int] = None,
+    context_id: Optional[str] = None,
+    trigger: bool = False,
+    dm: bool = False,
+) -> Dict[str, Any]:
+    """
+    Store an inbound user message and route it, in one atomic transaction.
+
+    Routing: a thread message goes to the context owning that thread, other
+    messages to the channel's latest un-threaded context; a context is
+    created if none matches. Pass context_id to skip routing (catch-up).
+
+    The turn should be processed if `trigger` is set (DM / explicit mention)
+    or the thread already belonged to a context; it is then added to
+    pending_turns in the same transaction, in the high-priority lane for
+    DMs (`dm`) and owned threads. Otherwise a silent, already
+    delivered bot message is linked so the pending-turn scan ignores it.
+
+    A message whose discord_message_id is already stored (a replayed gateway
+    event, or one seen by both live delivery and catch-up) changes nothing:
+    the stored message comes back with "duplicate" set.
+
+    Returns {"message", "context_id", "context_created", "should_process", "duplicate"}.
+    """
+    with get_db() as conn:
+        if not conn.in_transaction:
+            # Take the write lock up front so routing reads and inserts can't interleave
+            # with another writer.
+            conn.execute("BEGIN IMMEDIATE")
+
+        existing = get_message_by_discord_id(discord_message_id) if discord_message_id is not None else None
+        if existing:
+            linked = conn.execute(
+                "SELECT context_id FROM context_messages WHERE message_id = ? LIMIT 1", (existing["id"],)
+            ).fetchone()
+            return {
+                "message": existing,
+                "context_id": linked["context_id"] if linked else None,
+                "context_created": False,
+                "should_process": False,
+                "duplicate": True,
+            }
+
+        owned_thread_context = find_context_by_reply_thread(thread_id) if thread_id else None
+        if context_id is None:
+            if thread_id:
+                context_id = owned_thread_context
+            elif channel_id is not None:
+                context_id = find_active_context_by_channel(channel_id)
+
+        context_created = False
+        if not context_id:
+            context_id = create_context(reply_channel_id=channel_id, reply_thread_id=thread_id)
+            context_created = True
+
+        msg = insert_message(
+            author=author,
+            content=content,
+            source="user",
+            timestamp=timestamp,
+            channel_id=channel_id,
+            thread_id=thread_id,
+            raw_discord_payload=raw_discord_payload,
+            discord_message_id=discord_message_id,
         )
+        add_message_to_context(context_id, msg["id"])
+
+        should_process = bool(trigger or owned_thread_context)
+        if should_process:
+            priority = TURN_PRIORITY_HIGH if (dm or owned_thread_context) else TURN_PRIORITY_NORMAL
+            enqueue_turn(context_id, user_key=author, priority=priority)
+        else:
+            now = time.time()
+            silent_msg = insert_message(
+                author="system",
+                content="",
+                source="bot",
+                timestamp=now,
+                channel_id=channel_id,
+                thread_id=thread_id,
+                delivered=True,
+                delivered_at=now,
+            )
+            add_message_to_context(context_id, silent_msg["id"])
+
+    return {
+        "message": msg,
+        "context_id": context_id,
+        "context_created": context_created,
+        "should_process": should_process,
+        "duplicate": False,
+    }
 
 
 def get_messages_for_context(
@@ -242,10 +623,10 @@ def get_messages_for_context(
     """Return the most recent N messages for this context, oldest->newest."""
     with get_db() as conn:
         cursor = conn.execute(
-            """
+            f"""
             SELECT *
             FROM (
-                SELECT m.*
+                SELECT {_M_MESSAGE_COLUMNS}
                 FROM messages m
                 JOIN context_messages cm ON cm.message_id = m.id
                 WHERE cm.context_id = ?
@@ -265,8 +646,8 @@ def get_latest_user_message_for_context(
     """Return the most recent user message linked to this context."""
     with get_db() as conn:
         cursor = conn.execute(
-            """
-            SELECT m.*
+            f"""
+            SELECT {_M_MESSAGE_COLUMNS}
             FROM messages m
             JOIN context_messages cm ON cm.message_id = m.id
             WHERE cm.context_id = ? AND m.source = 'user'
@@ -279,6 +660,71 @@ def get_latest_user_message_for_context(
         return dict(row) if row else None
 
 
+def get_context_history_page(
+    context_id: str,
+    before: Tuple[float, str],
+    after: Optional[Tuple[float, str]] = None,
+    limit: int = 50,
+) -> List[Dict[str, Any]]:
+    """
+    One page of a context's history, newest first: messages strictly before
+    `before` and strictly after `after`, both (timestamp, id) positions.
+    Pass the last row's (timestamp, id) as `before` to get the next page.
+    Only the columns prompt history needs are read, and only for the page:
+    the range and order come from idx_ctx_msg_position, so a page costs the
+    same however long the context is.
+    """
+    query = """
+        SELECT m.id, m.source, m.content, m.timestamp
+        FROM context_messages cm
+        JOIN messages m ON m.id = cm.message_id
+        WHERE cm.context_id = ? AND (cm.message_ts, cm.message_id) < (?, ?)
+    """
+    params: List[Any] = [context_id, before[0], before[1]]
+    if after is not None:
+        query += " AND (cm.message_ts, cm.message_id) > (?, ?)"
+        params.extend(after)
+    query += " ORDER BY cm.message_ts DESC, cm.message_id DESC LIMIT ?"
+    params.append(limit)
+    with get_db() as conn:
+        return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+def get_context_digest(context_id: str) -> Optional[Dict[str, Any]]:
+    """The digest of a context's older messages (see src/app/history.py), if one has been made."""
+    with get_db() as conn:
+        row = conn.execute(
+            """
+            SELECT digest, covers_until_ts, covers_until_id, message_count, updated_at
+            FROM context_digests WHERE context_id = ?
+            """,
+            (context_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def save_context_digest(
+    context_id: str,
+    digest: str,
+    covers_until: Tuple[float, str],
+    message_count: int,
+) -> None:
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO context_digests (context_id, digest, covers_until_ts, covers_until_id, message_count, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(context_id) DO UPDATE SET
+                digest = excluded.digest,
+                covers_until_ts = excluded.covers_until_ts,
+                covers_until_id = excluded.covers_until_id,
+                message_count = excluded.message_count,
+                updated_at = excluded.updated_at
+            """,
+            (context_id, digest, covers_until[0], covers_until[1], message_count, time.time()),
+        )
+
+
 def get_active_contexts(limit: int = 10) -> List[Dict[str, Any]]:
     """Return the most recently updated contexts."""
     with get_db() as conn:
@@ -0,0 +1,18 @@
+"""
+Shared pytest setup: point the DB layer at a throwaway database before any
+src.db module is imported, so test runs never touch the real gemini.db.
+"""
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # discord_bot/
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="discord_bot_tests_")
+os.environ.setdefault("GEMINI_DB_PATH", os.path.join(_TMP_DIR, "gemini.db"))
+
+from src.db.database import migrate  # noqa: E402
+
+migrate()
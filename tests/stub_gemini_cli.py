@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the `gemini` CLI, for tests and benchmarks (point
+GEMINI_CLI_CMD at this file).
+
+Mimics the parts the runner depends on: it starts up (sleeping
+STUB_GEMINI_STARTUP_S to simulate Node startup), blocks on stdin until the
+prompt is closed, then prints stream-json events - init, the prompt echo, a
+reply naming the turn's context and session - and writes the events to the
+--record-responses file. `-r invalid` fails like an unknown session.
+STUB_GEMINI_REPLY_EVENTS / STUB_GEMINI_REPLY_BYTES add that many extra
+message events of that size, for throughput benchmarks.
+"""
+import json
+import os
+import sys
+import time
+import uuid
+
+
+def arg_value(args, flag):
+    if flag in args:
+        index = args.index(flag)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return None
+
+
+def turn_env():
+    env = {}
+    context_file = os.environ.get("DISCORD_CONTEXT_FILE")
+    if context_file and os.path.exists(context_file):
+        with open(context_file) as f:
+            env.update(json.load(f))
+    for key in ("DISCORD_CONTEXT_ID", "DISCORD_TURN_START_TS"):
+        if os.environ.get(key):
+            env[key] = os.environ[key]
+    return env
+
+
+def main():
+    args = sys.argv[1:]
+    session_id = arg_value(args, "-r")
+    record_path = arg_value(args, "--record-responses")
+    time.sleep(float(os.environ.get("STUB_GEMINI_STARTUP_S", "0")))
+
+    prompt = sys.stdin.read()
+    if session_id == "invalid":
+        sys.stderr.write("Error: Invalid session identifier\n")
+        sys.exit(1)
+
+    env = turn_env()
+    events = [
+        {"type": "init", "session_id": session_id or f"stub-{uuid.uuid4().hex[:8]}"},
+        {"type": "message", "content": prompt, "metadata": {"role": "user"}},
+        {"type": "message", "content": (
+            f"context={env.get('DISCORD_CONTEXT_ID')} turn_start={env.get('DISCORD_TURN_START_TS')} "
+            f"session={session_id} pid={os.getpid()} prompt_chars={len(prompt)}"
+        )},
+    ]
+    filler = "x" * int(os.environ.get("STUB_GEMINI_REPLY_BYTES", "64"))
+    events.extend({"type": "message", "content": filler} for _ in range(int(os.environ.get("STUB_GEMINI_REPLY_EVENTS", "0"))))
+    events.append({"type": "result"})
+    sys.stdout.write("".join(json.dumps(event) + "\n" for event in events))
+    sys.stdout.flush()
+    if record_path:
+        with open(record_path, "w") as f:
+            json.dump(events, f)
+
+
+if __name__ == "__main__":
+    main()
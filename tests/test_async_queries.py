@@ -0,0 +1,37 @@
+"""
+Tests for the async DB facade: writes land on the single writer thread,
+reads on the reader pool, and results match the sync API.
+"""
+import asyncio
+import threading
+
+from src.db import async_queries, queries
+
+
+def test_async_roundtrip_matches_sync_api():
+    async def scenario():
+        ctx_id = await async_queries.create_context(reply_channel_id=4242)
+        msg = await async_queries.insert_message("tester", "hello", "user", channel_id=4242)
+        await async_queries.add_message_to_context(ctx_id, msg["id"])
+        latest = await async_queries.get_latest_user_message_for_context(ctx_id)
+        return ctx_id, msg, latest
+
+    ctx_id, msg, latest = asyncio.run(scenario())
+    assert latest["id"] == msg["id"]
+    assert queries.get_latest_user_message_for_context(ctx_id)["id"] == msg["id"]
+
+
+def test_writes_share_one_thread_and_reads_stay_off_the_loop():
+    def writer_thread():
+        return threading.current_thread().name
+
+    async def scenario():
+        loop_thread = threading.current_thread().name
+        names = await asyncio.gather(*(async_queries.run_write(writer_thread) for _ in range(20)))
+        read_name = await async_queries.run_read(writer_thread)
+        return loop_thread, set(names), read_name
+
+    loop_thread, writer_names, read_name = asyncio.run(scenario())
+    assert len(writer_names) == 1
+    assert loop_thread not in writer_names
+    assert read_name.startswith("db-reader")
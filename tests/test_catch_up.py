@@ -0,0 +1,61 @@
+"""
+Tests for the missed-message catch-up, against a fake channel history.
+"""
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from src.app import workers
+from src.db import queries
+
+
+class FakeChannel:
+    def __init__(self, channel_id, messages):
+        self.id = channel_id
+        self.messages = messages  # newest first, like Discord
+
+    async def history(self, limit):
+        for message in self.messages[:limit]:
+            yield message
+
+
+def _message(snowflake, channel, author_id="42", bot=False):
+    return SimpleNamespace(
+        id=snowflake, channel=channel, content=f"message {snowflake}",
+        author=SimpleNamespace(id=author_id, bot=bot),
+        created_at=datetime.datetime.fromtimestamp(1.7e9 + snowflake % 1000, datetime.timezone.utc),
+        type="MessageType.default", reference=None, referenced_message=None,
+        mentions=[], channel_mentions=[], role_mentions=[], attachments=[], embeds=[],
+        pinned=False, tts=False,
+    )
+
+
+def _client(channel):
+    async def resolve_channel(channel_id):
+        return channel if channel_id == channel.id else None
+
+    return SimpleNamespace(resolver=SimpleNamespace(channel=resolve_channel), user=object())
+
+
+def test_catch_up_ingests_only_unseen_user_messages_in_order():
+    ctx = queries.create_context(reply_channel_id=7101)
+    channel = FakeChannel(7101, [])
+    seen = queries.ingest_user_message("alice", "seen", channel_id=7101, context_id=ctx, timestamp=1.7e9 + 1,
+                                       discord_message_id=1290000000000007001)
+    channel.messages = [
+        _message(1290000000000007004, channel, bot=True),   # the bot's own reply
+        _message(1290000000000007003, channel),
+        _message(1290000000000007002, channel),
+        _message(1290000000000007001, channel),             # already stored
+    ]
+
+    asyncio.run(workers.check_for_missed_messages(_client(channel), ["42"]))
+    stored = [m for m in queries.get_messages_for_context(ctx) if m["source"] == "user"]
+    assert [m["discord_message_id"] for m in stored] == [
+        1290000000000007001, 1290000000000007002, 1290000000000007003]
+    assert stored[0]["id"] == seen["message"]["id"]
+    assert queries.get_message_payload(stored[1]["id"]).value()["id"] == "1290000000000007002"
+
+    # Running it again finds everything already stored.
+    asyncio.run(workers.check_for_missed_messages(_client(channel), ["42"]))
+    assert len([m for m in queries.get_messages_for_context(ctx) if m["source"] == "user"]) == 3
@@ -0,0 +1,119 @@
+"""
+Tests for the warm Gemini CLI pool, run against tests/stub_gemini_cli.py
+instead of the real CLI.
+"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from src.app import runner
+from src.app.cli_pool import GeminiCliPool
+
+STUB_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_gemini_cli.py")
+
+
+@pytest.fixture
+def traces_dir(tmp_path, monkeypatch):
+    traces = tmp_path / "traces"
+    traces.mkdir()
+    monkeypatch.setattr(runner, "GEMINI_TRACES_DIR", str(traces))
+    monkeypatch.setattr(runner, "GEMINI_RESPONSES_LOG", str(tmp_path / "responses.log"))
+    return traces
+
+
+def _pool(tmp_path, traces_dir, **kwargs):
+    kwargs.setdefault("size", 1)
+    kwargs.setdefault("session_slots", 2)
+    return GeminiCliPool(STUB_CLI, traces_dir=str(traces_dir), pool_dir=str(tmp_path / "pool"), **kwargs)
+
+
+async def _run_turn(context_id, pool=None, session_id=None):
+    env = dict(os.environ, DISCORD_CONTEXT_ID=context_id, DISCORD_TURN_START_TS="123.0")
+    events = []
+    async for event in runner.call_gemini_cli(
+        "hello", context_id, gemini_cmd=STUB_CLI, env=env, session_id=session_id, cli_pool=pool,
+    ):
+        events.append(event)
+    return events
+
+
+def _reply(events):
+    return "".join(e.content for e in events if e.type == "text")
+
+
+def test_cold_start_passes_turn_env(traces_dir):
+    events = asyncio.run(_run_turn("ctx-cold"))
+    assert "context=ctx-cold turn_start=123.0" in _reply(events)
+    assert [e.type for e in events if e.type == "error"] == []
+
+
+def test_warm_process_gets_context_by_file_and_trace_is_stored(tmp_path, traces_dir):
+    async def scenario():
+        pool = _pool(tmp_path, traces_dir)
+        await pool.start()
+        warm_pid = pool._generic[0].proc.pid
+        events = await _run_turn("ctx-warm", pool)
+        await asyncio.sleep(0.1)  # let the replacement spawn
+        stats = pool.stats()
+        await pool.close()
+        return warm_pid, events, stats
+
+    warm_pid, events, stats = asyncio.run(scenario())
+    assert f"pid={warm_pid}" in _reply(events)
+    assert "context=ctx-warm turn_start=123.0" in _reply(events)
+    assert (stats["hits"], stats["misses"], stats["idle"]) == (1, 0, 1)
+    assert stats["first_event_warm_p50"] is not None and stats["first_event_cold_p50"] is None
+
+    store = runner.trace_store()
+    store.flush()
+    stored = list(store.iter_traces("ctx-warm"))
+    assert len(stored) == 1
+    assert json.loads(stored[0][1])[0]["type"] == "init"
+    assert not [name for name in os.listdir(traces_dir) if name.endswith(".json")]  # folded into a segment
+    assert os.listdir(tmp_path / "pool") == []  # context handoff file cleaned up
+
+
+def test_session_affinity_and_fallback(tmp_path, traces_dir):
+    async def scenario():
+        pool = _pool(tmp_path, traces_dir, size=0)
+        await pool.start()
+        pool.prewarm_session("sess-1")
+        for _ in range(50):
+            if "sess-1" in pool._sessions:
+                break
+            await asyncio.sleep(0.02)
+        hit = await _run_turn("ctx-a", pool, session_id="sess-1")
+        miss = await _run_turn("ctx-b", pool, session_id="sess-2")
+        stats = pool.stats()
+        await pool.close()
+        return hit, miss, stats
+
+    hit, miss, stats = asyncio.run(scenario())
+    assert "session=sess-1" in _reply(hit)
+    assert "session=sess-2" in _reply(miss)  # cold start with -r
+    assert (stats["session_hits"], stats["hits"], stats["misses"]) == (1, 0, 1)
+
+
+def test_health_check_replaces_dead_and_aged_processes(tmp_path, traces_dir):
+    async def scenario():
+        pool = _pool(tmp_path, traces_dir, size=2, max_idle=3600)
+        await pool.start()
+        first, second = list(pool._generic)
+        first.proc.kill()
+        await first.proc.wait()
+        assert await pool.check_health() == 1
+
+        pool.max_idle = 0.01
+        await asyncio.sleep(0.05)
+        recycled = await pool.check_health()
+        pids = {warm.proc.pid for warm in pool._generic}
+        stats = pool.stats()
+        await pool.close()
+        return second.proc.pid, recycled, pids, stats
+
+    old_pid, recycled, pids, stats = asyncio.run(scenario())
+    assert recycled == 2
+    assert len(pids) == 2 and old_pid not in pids
+    assert stats["recycled"] == 3
@@ -0,0 +1,64 @@
+"""
+Tests for the denormalized contexts.last_message_* state used to find
+contexts with a pending user turn.
+"""
+from src.db import queries
+from src.db.database import backfill_context_last_message, get_db
+
+
+def _pending():
+    """Idle contexts whose newest linked message is from the user."""
+    with get_db() as conn:
+        rows = conn.execute("SELECT id FROM contexts WHERE status = 'idle' AND last_message_source = 'user'")
+        return [row["id"] for row in rows]
+
+
+def _last(context_id):
+    ctx = queries.get_context(context_id)
+    return ctx["last_message_id"], ctx["last_message_source"], ctx["last_message_ts"]
+
+
+def test_linking_tracks_the_newest_message():
+    ctx = queries.create_context(reply_channel_id=8001)
+    user_msg = queries.insert_message("alice", "ping", "user", timestamp=100.0)
+    queries.add_message_to_context(ctx, user_msg["id"])
+    assert _last(ctx) == (user_msg["id"], "user", 100.0)
+    assert ctx in _pending()
+
+    reply = queries.insert_message("gemini", "pong", "bot", timestamp=101.0, delivered=True)
+    queries.add_message_to_context(ctx, reply["id"])
+    assert _last(ctx) == (reply["id"], "bot", 101.0)
+    assert ctx not in _pending()
+
+
+def test_older_message_linked_late_does_not_replace_last():
+    ctx = queries.create_context(reply_channel_id=8002)
+    newer = queries.insert_message("gemini", "newer", "bot", timestamp=200.0, delivered=True)
+    older = queries.insert_message("alice", "older", "user", timestamp=150.0)
+    queries.add_message_to_context(ctx, newer["id"])
+    queries.add_message_to_context(ctx, older["id"])
+    assert _last(ctx) == (newer["id"], "bot", 200.0)
+
+
+def test_running_contexts_are_not_pending():
+    ctx = queries.create_context(reply_channel_id=8003)
+    msg = queries.insert_message("alice", "hi", "user")
+    queries.add_message_to_context(ctx, msg["id"])
+    with get_db() as conn:
+        conn.execute("UPDATE contexts SET status = 'running', current_pid = 1 WHERE id = ?", (ctx,))
+    assert ctx not in _pending()
+
+
+def test_backfill_recomputes_from_history():
+    ctx = queries.create_context(reply_channel_id=8004)
+    first = queries.insert_message("alice", "a", "user", timestamp=10.0)
+    second = queries.insert_message("alice", "b", "user", timestamp=20.0)
+    queries.add_message_to_context(ctx, first["id"])
+    queries.add_message_to_context(ctx, second["id"])
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE contexts SET last_message_id = NULL, last_message_source = NULL, last_message_ts = NULL WHERE id = ?",
+            (ctx,),
+        )
+        backfill_context_last_message(conn)
+    assert _last(ctx) == (second["id"], "user", 20.0)
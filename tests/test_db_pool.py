@@ -0,0 +1,75 @@
+"""
+Tests for the pooled get_db(): per-thread reuse, nested transactions,
+health-check reconnects and shutdown.
+"""
+import threading
+
+import pytest
+
+from src.db import database
+from src.db.database import get_db, get_pool
+
+
+def test_connection_is_reused_within_a_thread():
+    with get_db() as first:
+        pass
+    with get_db() as second:
+        pass
+    assert first is second
+
+
+def test_threads_get_their_own_connections():
+    seen = []
+
+    def grab():
+        with get_db() as conn:
+            seen.append(conn)
+
+    threads = [threading.Thread(target=grab) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with get_db() as main_conn:
+        pass
+    assert len({id(c) for c in seen + [main_conn]}) == 4
+
+
+def test_nested_blocks_commit_or_roll_back_as_one_unit():
+    with get_db() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS pool_probe (v INTEGER)")
+        conn.execute("DELETE FROM pool_probe")
+
+    with pytest.raises(RuntimeError):
+        with get_db() as outer:
+            outer.execute("INSERT INTO pool_probe (v) VALUES (1)")
+            with get_db() as inner:
+                inner.execute("INSERT INTO pool_probe (v) VALUES (2)")
+            raise RuntimeError("abort outer")
+
+    with get_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM pool_probe").fetchone()[0] == 0
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    pool = get_pool()
+    with get_db() as conn:
+        pass
+    conn.close()
+    old_interval = pool.healthcheck_interval
+    pool.healthcheck_interval = 0
+    try:
+        with get_db() as fresh:
+            assert fresh is not conn
+            assert fresh.execute("SELECT 1").fetchone()[0] == 1
+    finally:
+        pool.healthcheck_interval = old_interval
+
+
+def test_close_all_then_lazy_reconnect():
+    with get_db() as before:
+        pass
+    database.get_pool().close_all()
+    with get_db() as after:
+        assert after.execute("SELECT 1").fetchone()[0] == 1
+    assert after is not before
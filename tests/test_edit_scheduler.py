@@ -0,0 +1,138 @@
+"""
+Tests for the shared live-edit scheduler, using a fake channel that records
+edit calls and can answer with 429s.
+"""
+import asyncio
+import time
+
+from src.app.edit_scheduler import EditScheduler
+
+
+class FakeHTTP429(Exception):
+    status = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.response = type("Resp", (), {"headers": {"Retry-After": str(retry_after)}})()
+
+
+class FakeChannel:
+    def __init__(self, channel_id, rate_limits=0, retry_after=0.05, latency=0.0):
+        self.id = channel_id
+        self.edits = []  # (message id, content, monotonic time)
+        self.rate_limits = rate_limits
+        self.retry_after = retry_after
+        self.latency = latency
+        self.next_id = 0
+
+    def message(self):
+        self.next_id += 1
+        return FakeMessage(self, self.id * 1000 + self.next_id)
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, content):
+        await asyncio.sleep(self.channel.latency)
+        if self.channel.rate_limits:
+            self.channel.rate_limits -= 1
+            self.channel.edits.append((self.id, "429", time.monotonic()))
+            raise FakeHTTP429(self.channel.retry_after)
+        self.channel.edits.append((self.id, content, time.monotonic()))
+
+
+def _contents(channel):
+    return [content for _, content, _ in channel.edits]
+
+
+def test_latest_content_wins_and_noops_are_skipped():
+    async def scenario():
+        scheduler = EditScheduler(min_interval=0.05)
+        channel = FakeChannel(1)
+        msg = channel.message()
+        scheduler.shown(msg, "a")
+        scheduler.submit(msg, "a")  # what it already shows
+        for text in ("ab", "abc", "abcd"):
+            scheduler.submit(msg, text)
+        await asyncio.sleep(0.02)
+        scheduler.submit(msg, "abcde")
+        scheduler.submit(msg, "abcdef")
+        await scheduler.finalize(msg, "abcdef")
+        return channel, scheduler.stats()
+
+    channel, stats = asyncio.run(scenario())
+    assert _contents(channel) == ["abcd", "abcdef"]
+    assert stats["edits"] == 2 and stats["skipped"] >= 1 and stats["coalesced"] >= 3
+
+
+def test_edits_are_paced_per_channel_and_finalize_skips_the_wait():
+    async def scenario():
+        scheduler = EditScheduler(min_interval=0.2)
+        busy, other = FakeChannel(1), FakeChannel(2)
+        msg, other_msg = busy.message(), other.message()
+        scheduler.submit(msg, "one")
+        scheduler.submit(other_msg, "elsewhere")
+        await asyncio.sleep(0.01)
+        scheduler.submit(msg, "two")  # must wait for the interval
+        started = time.monotonic()
+        await scheduler.finalize(msg, "final")
+        return busy, other, time.monotonic() - started
+
+    busy, other, finalize_took = asyncio.run(scenario())
+    assert _contents(busy) == ["one", "final"]
+    assert _contents(other) == ["elsewhere"]  # other channels are not held up
+    assert finalize_took < 0.1
+
+
+def test_rate_limits_back_off_and_retry_latest_content():
+    async def scenario():
+        scheduler = EditScheduler(min_interval=0.01, max_interval=1.0)
+        channel = FakeChannel(1, rate_limits=2, retry_after=0.05)
+        msg = channel.message()
+        scheduler.submit(msg, "v1")
+        await asyncio.sleep(0.02)
+        scheduler.submit(msg, "v2")  # arrives while the channel is paused
+        await scheduler.finalize(msg, "v3")
+        interval = scheduler.interval(1)
+        return channel, scheduler.stats(), interval
+
+    channel, stats, interval = asyncio.run(scenario())
+    assert _contents(channel) == ["429", "429", "v3"]
+    first_429, second_429, sent = (t for _, _, t in channel.edits)
+    assert second_429 - first_429 >= 0.05 and sent - second_429 >= 0.05  # Retry-After honoured
+    assert stats["rate_limited"] == 2
+    assert interval > 0.01  # backed off, not yet fully relaxed
+
+
+def test_slow_edits_widen_the_interval_and_outbox_blocks_apply():
+    async def scenario():
+        scheduler = EditScheduler(min_interval=0.01, max_interval=1.0)
+        slow = FakeChannel(1, latency=0.1)
+        await scheduler.finalize(slow.message(), "slow")
+        slow_interval = scheduler.interval(1)
+
+        blocked = FakeChannel(2)
+        scheduler.block_channel(2, 0.15)
+        started = time.monotonic()
+        await scheduler.finalize(blocked.message(), "after block")
+        return slow_interval, time.monotonic() - started
+
+    slow_interval, blocked_wait = asyncio.run(scenario())
+    assert slow_interval >= 0.1
+    assert blocked_wait >= 0.14
+
+
+def test_failed_edit_is_logged_not_raised():
+    class Broken(FakeMessage):
+        async def edit(self, content):
+            raise RuntimeError("Unknown Message")
+
+    async def scenario():
+        scheduler = EditScheduler(min_interval=0.01)
+        await scheduler.finalize(Broken(FakeChannel(1), 1), "x")
+        return scheduler.stats()
+
+    assert asyncio.run(scenario())["failed"] == 1
@@ -9,6 +9,7 @@ REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, REPO_ROOT)
 REPO_ROOT = os.path.dirname(REPO_ROOT)
 
+from src.db.database import ensure_schema
 from src.db.queries import create_context, insert_message, add_message_to_context
 from src.app.runner import build_prompt_text
 
@@ -25,6 +26,7 @@ Do not do anything else. Do not browse the web. Just run that one command and st
 """
 
 async def main():
+    ensure_schema()
     ctx_id = create_context(reply_channel_id=888)
     msg = insert_message("testuser", "run get_new_messages test", "user", channel_id=888)
     add_message_to_context(ctx_id, msg["id"])
@@ -31,6 +31,7 @@ TIMEOUT = 120  # seconds
 
 async def run_test():
     # 1. Set up DB
+    init_db()
     ctx_id = create_context(reply_channel_id=999)
     initial_msg = insert_message(
         "testuser",
@@ -0,0 +1,98 @@
+"""
+Tests for the budgeted cold-start history window and context digests.
+"""
+from src.app import history
+from src.app.history import build_history_window, refresh_context_digest, render_history
+from src.app.runner import build_prompt_text
+from src.db import queries
+
+
+def _context(channel_id, count, start=1000.0, size=40):
+    ctx = queries.create_context(reply_channel_id=channel_id)
+    rows = []
+    for i in range(count):
+        source = "user" if i % 2 == 0 else "bot"
+        msg = queries.insert_message("alice" if source == "user" else "gemini", f"m{i:03d} " + "x" * size,
+                                     source, timestamp=start + i, delivered=source == "bot")
+        queries.add_message_to_context(ctx, msg["id"])
+        rows.append(msg)
+    return ctx, rows
+
+
+def _before(msg):
+    return (msg["timestamp"], msg["id"])
+
+
+def test_window_walks_back_within_budget(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_PAGE_SIZE", 4)
+    ctx, rows = _context(8701, 30)
+    window = build_history_window(ctx, _before(rows[-1]), budget_chars=500)
+    assert window.chars <= 500
+    assert window.lines[-1].startswith("User: m028")  # the current message is excluded
+    first = int(window.lines[0].split()[1][1:])
+    assert [line.split()[1] for line in window.lines] == [f"m{i:03d}" for i in range(first, 29)]
+    assert window.overflow_before == _before(rows[first])
+
+    everything = build_history_window(ctx, _before(rows[-1]), budget_chars=10 ** 6)
+    assert len(everything.lines) == 29 and everything.overflow_before is None
+
+
+def test_long_messages_are_shortened(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_MESSAGE_CHARS", 100)
+    ctx, rows = _context(8702, 3, size=5000)
+    window = build_history_window(ctx, _before(rows[-1]), budget_chars=10 ** 6)
+    assert all(len(line) < 130 and line.endswith("…[truncated]") for line in window.lines)
+
+
+def test_digest_folds_overflow_and_bounds_the_window(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_PAGE_SIZE", 5)
+    ctx, rows = _context(8703, 40)
+    first_window = build_history_window(ctx, _before(rows[20]), budget_chars=300)
+    folded = refresh_context_digest(ctx, first_window.overflow_before)
+    assert folded == int(first_window.lines[0].split()[1][1:])  # everything older than the window
+
+    digest = queries.get_context_digest(ctx)
+    assert digest["message_count"] == folded
+    assert (digest["covers_until_ts"], digest["covers_until_id"]) == _before(rows[folded - 1])
+    assert digest["digest"].splitlines()[0].startswith("User: m000")
+
+    # Later turn: the window stops at the digest's coverage instead of re-reading old rows.
+    window = build_history_window(ctx, _before(rows[-1]), budget_chars=10 ** 6)
+    assert window.digest == digest["digest"]
+    assert window.lines[0].split()[1] == f"m{folded:03d}"
+    assert window.overflow_before is None
+
+    # Folding again only reads and adds the messages between the digest and the new window.
+    window = build_history_window(ctx, _before(rows[-1]), budget_chars=len(digest["digest"]) + 300)
+    pages = []
+    real_page = history.get_context_history_page
+
+    def spy(*args, **kwargs):
+        page = real_page(*args, **kwargs)
+        pages.append(page)
+        return page
+
+    monkeypatch.setattr(history, "get_context_history_page", spy)
+    again = refresh_context_digest(ctx, window.overflow_before)
+    assert 0 < again < 39 - folded
+    assert sum(len(page) for page in pages) == again
+    assert queries.get_context_digest(ctx)["message_count"] == folded + again
+    assert queries.get_context_digest(ctx)["digest"].startswith(digest["digest"])
+
+
+def test_digest_keeps_newest_lines_within_its_budget(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DIGEST_CHARS", 200)
+    ctx, rows = _context(8704, 60)
+    refresh_context_digest(ctx, build_history_window(ctx, _before(rows[-1]), budget_chars=200).overflow_before)
+    digest = queries.get_context_digest(ctx)["digest"]
+    assert len(digest) < 200 + history.HISTORY_DIGEST_LINE_CHARS
+    assert digest.splitlines()[0] == "…"
+
+
+def test_cold_start_prompt_includes_history():
+    ctx, rows = _context(8705, 6)
+    prompt = build_prompt_text(rows[-1], ctx)
+    assert "--- CONVERSATION SO FAR (oldest first) ---\nUser: m000" in prompt
+    assert "User: m004" in prompt and prompt.endswith("m005 " + "x" * 40)
+    assert "CONVERSATION SO FAR" not in build_prompt_text(rows[-1], ctx, ignore_history=True)
+    assert render_history(build_history_window(ctx, _before(rows[0]))) == ""
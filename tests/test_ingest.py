@@ -0,0 +1,99 @@
+"""
+Tests for queries.ingest_user_message: routing, silent replies and atomicity.
+"""
+import sqlite3
+
+import pytest
+
+from src.db import queries
+from src.db.database import backfill_discord_message_ids, get_db
+from src.db.payloads import Payload
+
+
+def _count(table):
+    with get_db() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_new_channel_message_creates_context_and_processes_when_triggered():
+    result = queries.ingest_user_message("alice", "hi bot", channel_id=5001, trigger=True)
+    assert result["context_created"]
+    assert result["should_process"]
+    msgs = queries.get_messages_for_context(result["context_id"])
+    assert [m["source"] for m in msgs] == ["user"]
+    # The next message in the same channel reuses the context.
+    again = queries.ingest_user_message("alice", "follow-up", channel_id=5001, trigger=True)
+    assert again["context_id"] == result["context_id"]
+    assert not again["context_created"]
+
+
+def test_untriggered_message_gets_silent_reply():
+    result = queries.ingest_user_message("bob", "chatter", channel_id=5002)
+    assert not result["should_process"]
+    msgs = queries.get_messages_for_context(result["context_id"])
+    assert [m["source"] for m in msgs] == ["user", "bot"]
+    assert msgs[-1]["delivered"] == 1
+    assert queries.get_context(result["context_id"])["last_message_source"] == "bot"
+
+
+def test_thread_owned_by_context_is_processed_without_mention():
+    ctx = queries.create_context(reply_channel_id=5003, reply_thread_id=6003)
+    result = queries.ingest_user_message("carol", "in thread", channel_id=5003, thread_id=6003)
+    assert result["context_id"] == ctx
+    assert result["should_process"]
+
+
+def test_failure_rolls_back_every_write(monkeypatch):
+    before = (_count("messages"), _count("contexts"), _count("context_messages"))
+
+    def boom(*args, **kwargs):
+        raise RuntimeError("link failed")
+
+    monkeypatch.setattr(queries, "add_message_to_context", boom)
+    with pytest.raises(RuntimeError):
+        queries.ingest_user_message("dave", "lost", channel_id=5004, trigger=True)
+    assert (_count("messages"), _count("contexts"), _count("context_messages")) == before
+
+
+def test_replayed_discord_message_is_ignored():
+    first = queries.ingest_user_message("erin", "once", channel_id=5005, trigger=True,
+                                        discord_message_id=1290000000000005005)
+    before = (_count("messages"), _count("context_messages"))
+    again = queries.ingest_user_message("erin", "once", channel_id=5005, trigger=True,
+                                        discord_message_id=1290000000000005005)
+    assert again["duplicate"] and not again["should_process"]
+    assert again["message"]["id"] == first["message"]["id"]
+    assert again["context_id"] == first["context_id"]
+    assert (_count("messages"), _count("context_messages")) == before
+
+    # insert_message on its own ignores the duplicate too.
+    assert queries.insert_message("erin", "once", "user", discord_message_id=1290000000000005005)["id"] == \
+        first["message"]["id"]
+    assert _count("messages") == before[0]
+
+
+def test_stored_discord_ids_are_found_in_one_lookup():
+    for snowflake in (1290000000000006001, 1290000000000006002):
+        queries.ingest_user_message("frank", "hi", channel_id=5006, discord_message_id=snowflake)
+    found = queries.get_stored_discord_message_ids([1290000000000006001, 1290000000000006002, 1290000000000006003])
+    assert found == {1290000000000006001, 1290000000000006002}
+    assert queries.get_stored_discord_message_ids([]) == set()
+
+
+def test_backfill_takes_ids_from_payloads_and_skips_duplicates():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE messages (id TEXT PRIMARY KEY, timestamp REAL, discord_message_id INTEGER)")
+    conn.execute("CREATE TABLE message_payloads (message_id TEXT PRIMARY KEY, codec TEXT NOT NULL,"
+                 " payload BLOB NOT NULL, raw_bytes INTEGER NOT NULL)")
+    # "b" re-stored the same Discord message later (the old catch-up did this); "c" has no payload.
+    for msg_id, ts, snowflake in (("a", 1.0, "111"), ("b", 2.0, "111"), ("d", 3.0, "222")):
+        payload = Payload.encode({"id": snowflake, "content": "x"})
+        conn.execute("INSERT INTO messages VALUES (?, ?, NULL)", (msg_id, ts))
+        conn.execute("INSERT INTO message_payloads VALUES (?, ?, ?, ?)",
+                     (msg_id, payload.codec, payload.data, payload.raw_bytes))
+    conn.execute("INSERT INTO messages VALUES ('c', 4.0, NULL)")
+    assert backfill_discord_message_ids(conn) == 2
+    ids = dict(conn.execute("SELECT id, discord_message_id FROM messages").fetchall())
+    assert ids == {"a": 111, "b": None, "c": None, "d": 222}
+    conn.execute("CREATE UNIQUE INDEX idx ON messages(discord_message_id) WHERE discord_message_id IS NOT NULL")
@@ -0,0 +1,84 @@
+"""
+Tests for process_context's live-streamed reply, against a fake Discord
+target and a scripted run_next_turn instead of the Gemini CLI.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from src.app import workers
+from src.app.edit_scheduler import EditScheduler
+from src.app.reply_buffer import NEW_MESSAGE_MARKER
+from src.app.runner import GeminiEvent
+from src.db import queries
+
+
+class FakeMessage:
+    def __init__(self, target, message_id, content, file=None):
+        self.channel = target
+        self.id = message_id
+        self.content = content
+        self.file = file
+
+    async def edit(self, content):
+        self.content = content
+
+
+class FakeTarget:
+    """A thread: process_context creates it, sends the reply into it and edits the live page."""
+
+    def __init__(self, target_id):
+        self.id = target_id
+        self.messages = []
+
+    async def send(self, content=None, file=None):
+        message = FakeMessage(self, self.id * 100 + len(self.messages), content, file)
+        self.messages.append(message)
+        return message
+
+    async def create_thread(self, name, type):
+        return self
+
+
+class FakeResolver:
+    def __init__(self, target):
+        self.target = target
+
+    async def channel(self, channel_id):
+        return self.target
+
+    def remember(self, kind, obj_id, value):
+        pass
+
+
+def _scripted_turn(chunks):
+    async def run_next_turn(latest_message, context_id, **kwargs):
+        for chunk in chunks:
+            yield GeminiEvent(type="text", content=chunk)
+            await asyncio.sleep(0)
+
+    return run_next_turn
+
+
+def test_reply_past_max_pages_stops_live_paging_and_attaches(monkeypatch):
+    monkeypatch.setattr(workers, "DISCORD_MAX_PAGES", 3)
+    pages = [f"page {i}" for i in range(6)]
+    monkeypatch.setattr(workers, "run_next_turn", _scripted_turn([page + NEW_MESSAGE_MARKER for page in pages]))
+
+    ctx = queries.create_context(reply_channel_id=8801)
+    msg = queries.insert_message("alice", "write a lot", "user")
+    queries.add_message_to_context(ctx, msg["id"])
+    target = FakeTarget(8802)
+
+    async def scenario():
+        client = SimpleNamespace(resolver=FakeResolver(target), edit_scheduler=EditScheduler(), cli_pool=None)
+        try:
+            await workers.process_context(ctx, client, ["1"], "gemini", None)
+        finally:
+            await client.edit_scheduler.close()
+
+    asyncio.run(scenario())
+    # Three finished pages, then the attachment: no fourth live page left behind.
+    assert [m.content for m in target.messages[:3]] == pages[:3]
+    assert len(target.messages) == 4
+    attachment = target.messages[3]
+    assert attachment.file is not None and "Full reply attached" in attachment.content
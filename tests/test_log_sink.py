@@ -0,0 +1,75 @@
+"""
+Tests for LogSink: batched background writes, size/day rotation with gzip,
+and shedding under backpressure.
+"""
+import glob
+import gzip
+
+from src.app.log_sink import LogSink
+
+
+def _lines(n, prefix="line", width=0):
+    return [f"{prefix} {i} {'x' * width}\n" for i in range(n)]
+
+
+def test_lines_reach_disk_in_order_after_flush(tmp_path):
+    path = tmp_path / "responses.log"
+    sink = LogSink(str(path), flush_interval=60)
+    for line in _lines(100):
+        assert sink.write(line)
+    assert sink.flush()
+    assert path.read_text().splitlines() == [line.rstrip("\n") for line in _lines(100)]
+    sink.close()
+    assert sink.stats()["written"] == 100
+
+
+def test_rotates_by_size_into_gzip_segments_and_prunes(tmp_path):
+    path = tmp_path / "responses.log"
+    sink = LogSink(str(path), max_bytes=2000, backup_count=2, batch_bytes=1)
+    for line in _lines(100, width=90):
+        sink.write(line)
+        sink.flush()
+    sink.close()
+
+    segments = sorted(glob.glob(f"{path}.*.gz"))
+    assert sink.rotations > 2
+    assert len(segments) == 2  # older segments pruned
+    with gzip.open(segments[-1], "rt") as f:
+        assert f.read().startswith("line ")
+    assert path.stat().st_size <= 2000
+
+
+def test_rotates_when_the_day_changes(tmp_path):
+    path = tmp_path / "responses.log"
+    sink = LogSink(str(path))
+    sink.write("yesterday\n")
+    sink.flush()
+    sink._file_day = "19990101"
+    sink.write("today\n")
+    sink.flush()
+    sink.close()
+
+    (segment,) = glob.glob(f"{path}.19990101-*.gz")
+    with gzip.open(segment, "rt") as f:
+        assert f.read() == "yesterday\n"
+    assert path.read_text() == "today\n"
+
+
+def test_samples_then_drops_under_backpressure_without_blocking(tmp_path, monkeypatch):
+    path = tmp_path / "responses.log"
+    sink = LogSink(str(path), queue_size=10, sample_every=2)
+    monkeypatch.setattr(sink, "_ensure_started", lambda: None)  # writer thread stalled
+    results = [sink.write(line) for line in _lines(30)]
+    assert results[:5] == [True] * 5  # below half capacity: everything kept
+    stats = sink.stats()
+    assert stats["accepted"] == 10
+    assert stats["sampled_out"] > 0 and stats["dropped"] > 0
+    assert stats["accepted"] + stats["sampled_out"] + stats["dropped"] == 30
+
+    monkeypatch.undo()
+    sink.write("after\n")
+    sink.flush()
+    sink.close()
+    text = path.read_text()
+    assert "shed under backpressure" in text
+    assert text.endswith("after\n")
@@ -0,0 +1,88 @@
+"""
+Tests for time-ordered ids (src.db.ids) and rekeying legacy uuid4 messages.
+"""
+import time
+import uuid
+
+from src.db import queries
+from src.db.database import get_db, rekey_message_batch
+from src.db.ids import id_time, is_time_ordered, new_id
+
+
+def test_new_ids_are_uuid7_and_sort_by_creation():
+    ids = [new_id() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(uuid.UUID(i).version == 7 and is_time_ordered(i) for i in ids)
+    assert abs(id_time(ids[-1]) - time.time()) < 5
+    assert not is_time_ordered(str(uuid.uuid4()))
+
+
+def test_ids_for_a_timestamp_sort_by_that_timestamp():
+    ids = [new_id(1.7e9 + i * 0.001) for i in range(1000)]
+    assert ids == sorted(ids)
+    assert id_time(ids[0]) == 1.7e9
+
+
+def test_inserted_messages_and_contexts_get_time_ordered_keys():
+    ctx = queries.create_context(reply_channel_id=8101)
+    msg = queries.insert_message("alice", "hi", "user", timestamp=1.7e9)
+    assert is_time_ordered(ctx) and is_time_ordered(msg["id"])
+    assert id_time(msg["id"]) == 1.7e9
+
+
+def _legacy_context(channel_id, count):
+    """A context whose messages carry uuid4 ids, as rows written before UUIDv7."""
+    ctx = queries.create_context(reply_channel_id=channel_id)
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    with get_db() as conn:
+        for i, msg_id in enumerate(ids):
+            source = "user" if i % 2 == 0 else "bot"
+            conn.execute(
+                """
+                INSERT INTO messages (id, author, content, source, timestamp, delivered, delivery_status)
+                VALUES (?, 'alice', ?, ?, ?, 1, 'sent')
+                """,
+                (msg_id, f"message {i}", source, 1.7e9 + i),
+            )
+            conn.execute("INSERT INTO context_messages VALUES (?, ?, ?, ?)", (ctx, msg_id, 1.7e9 + i, 1.7e9 + i))
+        conn.execute(
+            "INSERT INTO message_payloads VALUES (?, 'json', ?, 2)", (ids[0], b"{}")
+        )
+        conn.execute(
+            "UPDATE contexts SET last_message_id = ?, last_message_source = 'bot', last_message_ts = ? WHERE id = ?",
+            (ids[-1], 1.7e9 + count - 1, ctx),
+        )
+        queries.save_context_digest(ctx, "so far", (1.7e9 + 2, ids[2]), 3)
+    return ctx, ids
+
+
+def test_rekey_moves_every_reference_and_keeps_history_order():
+    ctx, old_ids = _legacy_context(8102, 7)
+    before = [m["content"] for m in queries.get_messages_for_context(ctx)]
+    with get_db() as conn:
+        # A bot reply still queued for delivery keeps its id.
+        conn.execute("UPDATE messages SET delivery_status = 'pending', delivered = 0 WHERE id = ?", (old_ids[5],))
+
+    rowid = 0
+    while True:
+        with get_db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            next_rowid, _, _ = rekey_message_batch(conn, rowid, batch_size=3)
+        if next_rowid == rowid:
+            break
+        rowid = next_rowid
+
+    messages = queries.get_messages_for_context(ctx)
+    assert [m["content"] for m in messages] == before
+    new_ids = [m["id"] for m in messages]
+    assert [is_time_ordered(i) for i in new_ids] == [True] * 5 + [False, True]
+    assert new_ids[5] == old_ids[5]
+    assert queries.get_message_payload(new_ids[0]).value() == {}
+    assert queries.get_context_digest(ctx)["covers_until_id"] == new_ids[2]
+    with get_db() as conn:
+        assert conn.execute("SELECT last_message_id FROM contexts WHERE id = ?", (ctx,)).fetchone()[0] == new_ids[-1]
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+        # A second pass has nothing left to move but the queued reply.
+        _, scanned, rekeyed = rekey_message_batch(conn, 0, batch_size=100000)
+    assert scanned > 0 and rekeyed == 0
@@ -0,0 +1,74 @@
+"""
+Tests for compressed Discord payload storage in message_payloads.
+"""
+import asyncio
+import json
+import sqlite3
+import zlib
+
+from src.db import queries
+from src.db.database import get_db, migrate_inline_payloads
+from src.db.payloads import CODEC_ZLIB_V1, Payload, encode_payload_async
+
+PAYLOAD = {
+    "id": "1290000000000000001",
+    "channel_id": "1290000000000000002",
+    "author": {"id": "1290000000000000003", "username": "alice", "bot": False},
+    "content": "can you check why the nightly build failed?",
+    "timestamp": "2026-10-17T06:59:14.123456+00:00",
+    "type": "MessageType.default",
+    "pinned": False,
+    "tts": False,
+}
+
+
+def test_dictionary_compression_beats_plain_zlib_and_round_trips():
+    payload = Payload.encode(PAYLOAD)
+    raw = json.dumps(PAYLOAD, separators=(",", ":")).encode()
+    assert payload.codec == CODEC_ZLIB_V1
+    assert len(payload.data) < len(zlib.compress(raw, 9)) < payload.raw_bytes
+    assert Payload(payload.codec, payload.data, payload.raw_bytes).value() == PAYLOAD
+
+
+def test_payload_is_stored_aside_and_decoded_only_on_request():
+    encoded = asyncio.run(encode_payload_async(PAYLOAD))
+    msg = queries.insert_message("alice", "hi", "user", channel_id=1, raw_discord_payload=encoded)
+    plain = queries.insert_message("alice", "again", "user", channel_id=1, raw_discord_payload=PAYLOAD)
+    assert "raw_discord_payload" not in msg
+
+    stored = queries.get_message_payload(msg["id"])
+    assert stored._value is None  # nothing decompressed yet
+    assert stored.value() == PAYLOAD
+    assert queries.get_message_payload(plain["id"]).value() == PAYLOAD
+    assert queries.get_message_payload("no-such-id") is None
+
+    ctx = queries.create_context(reply_channel_id=1)
+    queries.add_message_to_context(ctx, msg["id"])
+    assert "raw_discord_payload" not in queries.get_messages_for_context(ctx)[0]
+    assert queries.get_latest_user_message_for_context(ctx)["id"] == msg["id"]
+
+
+def test_deleting_a_message_deletes_its_payload():
+    msg = queries.insert_message("alice", "bye", "user", raw_discord_payload=PAYLOAD)
+    with get_db() as conn:
+        conn.execute("DELETE FROM messages WHERE id = ?", (msg["id"],))
+    assert queries.get_message_payload(msg["id"]) is None
+
+
+def test_inline_payloads_are_migrated():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE messages (id TEXT PRIMARY KEY, content TEXT, raw_discord_payload TEXT)")
+    conn.execute("CREATE TABLE message_payloads (message_id TEXT PRIMARY KEY, codec TEXT NOT NULL,"
+                 " payload BLOB NOT NULL, raw_bytes INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO messages VALUES (?, ?, ?)", [
+        ("a", "one", json.dumps(PAYLOAD)),
+        ("b", "two", None),
+        ("c", "three", json.dumps({**PAYLOAD, "content": "three"})),
+    ])
+    assert migrate_inline_payloads(conn, batch_size=1) == 2
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(messages)")}
+    assert cols == {"id", "content"}
+    rows = {row["message_id"]: Payload(row["codec"], row["payload"], row["raw_bytes"])
+            for row in conn.execute("SELECT * FROM message_payloads")}
+    assert rows["a"].value() == PAYLOAD and rows["c"].value()["content"] == "three"
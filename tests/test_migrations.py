@@ -0,0 +1,79 @@
+"""
+Tests for the user_version migration runner, each on its own database file.
+"""
+import sqlite3
+
+import pytest
+
+from src.db import database
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "gemini.db")
+    pool = database.ConnectionPool()
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setattr(database, "_pool", pool)
+    yield path
+    pool.close_all()
+
+
+def _version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_new_database_is_migrated_once(fresh_db):
+    assert database.migrate() == database.SCHEMA_VERSION
+    assert _version(fresh_db) == database.SCHEMA_VERSION
+    assert database.migrate() == 0
+    with database.get_db() as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"contexts", "messages", "message_payloads", "context_messages", "pending_turns"} <= tables
+
+
+def test_database_from_before_user_version_is_brought_up_to_date(fresh_db):
+    conn = sqlite3.connect(fresh_db)
+    conn.executescript(
+        """
+        CREATE TABLE contexts (id TEXT PRIMARY KEY, reply_channel_id INTEGER, reply_thread_id INTEGER,
+                               status TEXT DEFAULT 'idle', current_pid INTEGER, created_at REAL, updated_at REAL);
+        CREATE TABLE messages (id TEXT PRIMARY KEY, author TEXT NOT NULL, content TEXT NOT NULL,
+                               source TEXT NOT NULL, timestamp REAL NOT NULL, channel_id INTEGER,
+                               thread_id INTEGER, delivered BOOLEAN DEFAULT 0, delivered_at REAL);
+        INSERT INTO messages (id, author, content, source, timestamp, delivered) VALUES ('m1', 'gemini', 'hi', 'bot', 1, 1);
+        """
+    )
+    conn.close()
+
+    database.migrate()
+    assert _version(fresh_db) == database.SCHEMA_VERSION
+    with database.get_db() as conn:
+        row = conn.execute("SELECT delivery_status, discord_message_id FROM messages WHERE id = 'm1'").fetchone()
+    assert tuple(row) == ("sent", None)
+
+
+def test_links_get_message_timestamps_and_summaries_become_digests(fresh_db):
+    with database.get_db() as conn:
+        for step in database.MIGRATIONS[:3]:
+            step(conn)
+        conn.execute("PRAGMA user_version = 3")
+        conn.execute("INSERT INTO contexts (id, created_at, updated_at) VALUES ('c1', 1, 1)")
+        conn.execute("INSERT INTO messages (id, author, content, source, timestamp) VALUES ('m1', 'alice', 'hi', 'user', 42)")
+        conn.execute("INSERT INTO context_messages VALUES ('c1', 'm1', 99)")
+        conn.execute("INSERT INTO context_summaries VALUES ('c1', 'User: hi', 42, 'm1', 1, 99)")
+
+    database.migrate()
+    with database.get_db() as conn:
+        assert conn.execute("SELECT message_ts FROM context_messages").fetchone()[0] == 42
+        assert conn.execute("SELECT digest FROM context_digests").fetchone()[0] == "User: hi"
+
+
+def test_ensure_schema_only_migrates_when_behind(fresh_db, monkeypatch):
+    database.ensure_schema()
+    assert _version(fresh_db) == database.SCHEMA_VERSION
+    monkeypatch.setattr(database, "migrate", lambda: pytest.fail("migrated a current database"))
+    database.ensure_schema()
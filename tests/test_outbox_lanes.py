@@ -0,0 +1,263 @@
+"""
+Tests for the per-destination outbox lanes, using a fake Discord target that
+injects latency and 429 responses.
+"""
+import asyncio
+import time
+
+from src.app import outbox
+from src.app.outbox import OutboxLanes, destination_key, rate_limit_delay
+
+
+class FakeHTTP429(Exception):
+    status = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.response = type("Resp", (), {"headers": {"Retry-After": str(retry_after)}})()
+
+
+class FakeTarget:
+    """Records sends; optionally sleeps per send and fails the first N with 429."""
+
+    concurrent = 0
+    max_concurrent = 0
+
+    def __init__(self, name, log, latency=0.0, rate_limits=0, retry_after=0.05):
+        self.name = name
+        self.log = log
+        self.latency = latency
+        self.rate_limits = rate_limits
+        self.retry_after = retry_after
+        self.files = []  # (filename, bytes) of attachments that went out
+
+    async def send(self, content, file=None):
+        FakeTarget.concurrent += 1
+        FakeTarget.max_concurrent = max(FakeTarget.max_concurrent, FakeTarget.concurrent)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.rate_limits:
+                self.rate_limits -= 1
+                self.log.append((self.name, "429", time.monotonic()))
+                raise FakeHTTP429(self.retry_after)
+            self.log.append((self.name, content, time.monotonic()))
+            if file is not None:
+                self.files.append((file.filename, file.fp.read()))
+        finally:
+            FakeTarget.concurrent -= 1
+
+
+def _msg(i, channel_id, content=None):
+    return {"id": f"m{i}", "channel_id": channel_id, "thread_id": None, "content": content or f"msg {i}"}
+
+
+def _run(targets, messages, max_concurrent=4, on_rate_limited=None):
+    FakeTarget.concurrent = FakeTarget.max_concurrent = 0
+    sent, failed, unresolved = [], [], []
+
+    async def resolve(msg):
+        return targets.get(msg["channel_id"])
+
+    async def on_sent(msg):
+        sent.append(msg["id"])
+
+    async def on_failed(msg, error):
+        failed.append((msg["id"], error))
+
+    async def on_unresolved(msg):
+        unresolved.append(msg["id"])
+
+    async def scenario():
+        lanes = OutboxLanes(resolve, on_sent, on_failed, on_unresolved, max_concurrent=max_concurrent,
+                            on_rate_limited=on_rate_limited)
+        for msg in messages:
+            lanes.submit(msg)
+        # Resubmitting an in-flight row is a no-op.
+        assert not lanes.submit(messages[0])
+        await lanes.drain()
+        assert lanes.in_flight == 0
+
+    asyncio.run(scenario())
+    return sent, failed, unresolved
+
+
+def test_lane_keys_prefer_thread_then_channel_then_user():
+    assert destination_key({"thread_id": 3, "channel_id": 2}, 1) == "t:3"
+    assert destination_key({"thread_id": None, "channel_id": 2}, 1) == "c:2"
+    assert destination_key({}, 1) == "u:1"
+
+
+def test_slow_lane_does_not_block_other_lanes_and_order_is_kept():
+    log = []
+    targets = {1: FakeTarget("slow", log, latency=0.2), 2: FakeTarget("fast", log)}
+    messages = [_msg(i, 1) for i in range(3)] + [_msg(10 + i, 2) for i in range(3)]
+    sent, failed, _ = _run(targets, messages)
+
+    assert not failed
+    assert sorted(sent) == sorted(m["id"] for m in messages)
+    fast = [entry for entry in log if entry[0] == "fast"]
+    slow = [entry for entry in log if entry[0] == "slow"]
+    assert [c for _, c, _ in fast] == ["msg 10", "msg 11", "msg 12"]
+    assert [c for _, c, _ in slow] == ["msg 0", "msg 1", "msg 2"]
+    # All fast-lane sends finished before the slow lane's first send returned.
+    assert fast[-1][2] < slow[0][2]
+
+
+def test_concurrency_limit_is_respected():
+    log = []
+    targets = {cid: FakeTarget(f"c{cid}", log, latency=0.02) for cid in range(8)}
+    messages = [_msg(cid, cid) for cid in range(8)]
+    _run(targets, messages, max_concurrent=3)
+    assert FakeTarget.max_concurrent == 3
+
+
+def test_429_pauses_only_that_lane_then_retries():
+    log = []
+    limited = FakeTarget("limited", log, rate_limits=2, retry_after=0.1)
+    targets = {1: limited, 2: FakeTarget("free", log)}
+    messages = [_msg(0, 1, "first"), _msg(1, 1, "second"), _msg(2, 2, "other")]
+    sent, failed, _ = _run(targets, messages)
+
+    assert not failed
+    assert sorted(sent) == ["m0", "m1", "m2"]
+    limited_log = [entry for entry in log if entry[0] == "limited"]
+    assert [c for _, c, _ in limited_log] == ["429", "429", "first", "second"]
+    # The retry honoured Retry-After, while the other lane went straight through.
+    assert limited_log[2][2] - limited_log[0][2] >= 0.2
+    other = next(entry for entry in log if entry[0] == "free")
+    assert other[2] < limited_log[1][2]
+
+
+def test_429_is_reported_to_on_rate_limited():
+    log, reported = [], []
+    targets = {1: FakeTarget("limited", log, rate_limits=1, retry_after=0.01)}
+    sent, failed, _ = _run(targets, [_msg(0, 1)], on_rate_limited=lambda key, delay: reported.append((key, delay)))
+    assert sent == ["m0"] and not failed
+    assert reported == [("c:1", 0.01)]
+
+
+def test_persistent_429_eventually_fails_the_message(monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_RATE_LIMIT_RETRIES", 1)
+    log = []
+    targets = {1: FakeTarget("limited", log, rate_limits=10, retry_after=0.01)}
+    sent, failed, _ = _run(targets, [_msg(0, 1)])
+    assert sent == []
+    assert [mid for mid, _ in failed] == ["m0"]
+
+
+def test_long_message_is_paged_or_attached():
+    log = []
+    target = FakeTarget("t", log, rate_limits=1, retry_after=0.01)
+    long_text = "\n".join(f"line {i} " + "x" * 60 for i in range(200))  # ~14k chars
+    sent, failed, _ = _run({1: target}, [_msg(0, 1, long_text)])
+    assert sent == ["m0"] and not failed
+    # One preview message carrying the whole reply as a file, rebuilt for the retry after the 429.
+    assert [c for _, c, _ in log][0] == "429" and len(log) == 2
+    assert target.files == [("reply.md", long_text.encode())]
+
+    # Up to DISCORD_MAX_PAGES (5) it is sent as pages.
+    log.clear()
+    target = FakeTarget("t", log)
+    _run({1: target}, [_msg(0, 1, long_text[:9000])])
+    assert len(log) == 5 and not target.files
+    assert all(len(c) <= 2000 for _, c, _ in log)
+
+
+class FailingTarget(FakeTarget):
+    """Raises a non-rate-limit error on the given (1-based) sends."""
+
+    def __init__(self, name, log, fail_on):
+        super().__init__(name, log)
+        self.fail_on = set(fail_on)
+        self.calls = 0
+
+    async def send(self, content, file=None):
+        self.calls += 1
+        if self.calls in self.fail_on:
+            raise RuntimeError("503 Service Unavailable")
+        await super().send(content, file=file)
+
+
+def test_retry_after_partial_send_resumes_without_resending_pages():
+    log = []
+    target = FailingTarget("t", log, fail_on={3})
+    text = "\n".join(f"line {i} " + "x" * 60 for i in range(120))  # ~5 pages
+    msg = _msg(0, 1, text)
+    sent, failed, progress = [], [], []
+
+    async def resolve(_msg):
+        return target
+
+    async def on_sent(m):
+        sent.append(m["id"])
+
+    async def on_failed(m, error):
+        failed.append(m["id"])
+
+    async def on_unresolved(m):
+        pass
+
+    async def on_progress(m, pages_sent):
+        progress.append(pages_sent)
+
+    async def scenario():
+        lanes = OutboxLanes(resolve, on_sent, on_failed, on_unresolved, on_progress=on_progress)
+        lanes.submit(msg)
+        await lanes.drain()
+        assert failed == ["m0"] and not sent and msg["pages_sent"] == 2
+        # The retry: the row comes back from the DB with the recorded progress.
+        lanes.submit({**_msg(0, 1, text), "pages_sent": progress[-1]})
+        await lanes.drain()
+
+    asyncio.run(scenario())
+    pages = [c for _, c, _ in log]
+    assert sent == ["m0"]
+    assert len(pages) == len(set(pages)) == 5
+    assert "".join(pages).replace("\n", "") == text.replace("\n", "")
+    assert progress == [1, 2, 3, 4]
+
+
+def test_row_from_a_read_that_started_before_delivery_finished_is_not_resent():
+    log = []
+    target = FakeTarget("t", log)
+    sent = []
+
+    async def resolve(_msg):
+        return target
+
+    async def on_sent(m):
+        sent.append(m["id"])
+
+    async def ignore(*_args):
+        pass
+
+    async def scenario():
+        lanes = OutboxLanes(resolve, on_sent, ignore, ignore)
+        msg = _msg(0, 1)
+        lanes.submit(msg)
+        # The watcher's next read starts while the send is still in flight...
+        stale_read_at = time.monotonic()
+        await lanes.drain()
+        # ...and returns after mark_delivered, still showing the row as pending.
+        assert not lanes.submit(dict(msg), read_at=stale_read_at)
+        await lanes.drain()
+        assert sent == ["m0"] and len(log) == 1
+        # A read that starts afterwards (a scheduled retry) is accepted.
+        assert lanes.submit(dict(msg), read_at=time.monotonic())
+        await lanes.drain()
+
+    asyncio.run(scenario())
+    assert sent == ["m0", "m0"]
+
+
+def test_unresolved_and_empty_messages():
+    sent, failed, unresolved = _run({}, [_msg(0, 99), _msg(1, 99, "   ")])
+    assert unresolved == ["m0"]
+    assert sent == ["m1"]
+
+
+def test_rate_limit_delay_parsing():
+    assert rate_limit_delay(FakeHTTP429(2.5)) == 2.5
+    assert rate_limit_delay(ValueError("nope")) is None
+    err = type("RateLimited", (Exception,), {"retry_after": 4.0})()
+    assert rate_limit_delay(err) == 4.0
@@ -0,0 +1,76 @@
+"""
+Tests for outbox wakeups: after-commit delivery of in-process notifications
+and the Unix socket path used by other processes.
+"""
+import asyncio
+import os
+import socket
+import tempfile
+import time
+
+import pytest
+
+from src.db import notify, queries
+from src.db.database import get_db
+
+
+@pytest.fixture
+def listener():
+    calls = []
+    callback = lambda: calls.append(1)  # noqa: E731
+    notify.add_outbox_listener(callback)
+    yield calls
+    notify.remove_outbox_listener(callback)
+
+
+def test_pending_bot_message_notifies_after_commit(listener):
+    with get_db():
+        queries.insert_message("gemini", "queued reply", "bot")
+        assert listener == []  # not committed yet
+    assert listener == [1]
+
+
+def test_rolled_back_insert_does_not_notify(listener):
+    with pytest.raises(RuntimeError):
+        with get_db():
+            queries.insert_message("gemini", "never sent", "bot")
+            raise RuntimeError("abort")
+    assert listener == []
+
+
+def test_delivered_and_user_messages_do_not_notify(listener):
+    queries.insert_message("gemini", "already streamed", "bot", delivered=True)
+    queries.insert_message("alice", "hello", "user")
+    assert listener == []
+
+
+def test_claimed_message_waits_for_its_sender(listener):
+    # send_message.py delivering directly: the outbox must neither wake for nor pick up the row.
+    now = time.time()
+    msg = queries.insert_message("send_message.py", "direct", "bot", timestamp=now, next_attempt_at=now + 300)
+    assert listener == []
+    assert msg["id"] not in {m["id"] for m in queries.get_undelivered_bot_messages()}
+    # Handing it back after a failed send makes it due and wakes the outbox.
+    queries.mark_delivered(msg["id"], delivered=False)
+    assert listener == [1]
+    assert msg["id"] in {m["id"] for m in queries.get_undelivered_bot_messages()}
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_out_of_process_writers_wake_the_socket(monkeypatch):
+    path = os.path.join(tempfile.mkdtemp(), "outbox.sock")
+    monkeypatch.setattr(notify, "OUTBOX_SOCKET_PATH", path)
+
+    async def scenario():
+        woke = asyncio.Event()
+        transport = await notify.serve_outbox_socket(woke.set, path=path)
+        try:
+            # No listeners registered here, so this takes the datagram path.
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: queries.insert_message("send_message.py", "hi", "bot")
+            )
+            await asyncio.wait_for(woke.wait(), timeout=2.0)
+        finally:
+            transport.close()
+
+    asyncio.run(scenario())
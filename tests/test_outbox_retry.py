@@ -0,0 +1,57 @@
+"""
+Tests for outbox retry scheduling: due-time selection, backoff and the
+dead-letter state.
+"""
+import time
+
+from src.app.outbox import retry_delay
+from src.db import queries
+
+
+def _pending_ids(now=None):
+    return {m["id"] for m in queries.get_undelivered_bot_messages(now=now)}
+
+
+def test_new_bot_message_is_due_immediately():
+    msg = queries.insert_message("gemini", "reply", "bot")
+    assert msg["id"] in _pending_ids()
+
+
+def test_retry_hides_message_until_due():
+    msg = queries.insert_message("gemini", "flaky", "bot")
+    due = time.time() + 60
+    assert queries.schedule_delivery_retry(msg["id"], "boom", due, max_attempts=5) == "pending"
+    assert msg["id"] not in _pending_ids()
+    assert msg["id"] in _pending_ids(now=due + 1)
+    assert queries.get_next_outbox_attempt_at() <= due
+
+
+def test_message_is_dead_lettered_after_max_attempts():
+    msg = queries.insert_message("gemini", "poison", "bot")
+    statuses = [
+        queries.schedule_delivery_retry(msg["id"], f"fail {i}", time.time(), max_attempts=3)
+        for i in range(3)
+    ]
+    assert statuses == ["pending", "pending", "dead"]
+    assert msg["id"] not in _pending_ids(now=time.time() + 3600)
+
+
+def test_empty_bot_message_is_still_picked_up():
+    # The lane marks it sent without a Discord call; filtering it out left it pending forever.
+    msg = queries.insert_message("gemini", "   ", "bot")
+    assert msg["id"] in _pending_ids()
+
+
+def test_pages_sent_is_returned_with_the_row():
+    msg = queries.insert_message("gemini", "long reply", "bot")
+    assert queries.record_pages_sent(msg["id"], 2)
+    queries.schedule_delivery_retry(msg["id"], "boom", time.time(), max_attempts=5)
+    row = next(m for m in queries.get_undelivered_bot_messages() if m["id"] == msg["id"])
+    assert row["pages_sent"] == 2
+
+
+def test_backoff_grows_exponentially_with_jitter_and_cap():
+    for attempt in range(1, 12):
+        expected = min(300.0, 2.0 * 2 ** (attempt - 1))
+        delay = retry_delay(attempt, base=2.0, cap=300.0)
+        assert expected / 2 <= delay <= expected
@@ -0,0 +1,115 @@
+"""
+Property tests for the shared Discord paginator: random markdown documents
+(prose, lists, code fences, over-long lines) are paged at random limits and
+every page is checked against the invariants below.
+"""
+import random
+
+from src.app.paginator import (
+    ATTACHMENT_FILENAME,
+    DISCORD_MESSAGE_LIMIT,
+    open_fence,
+    paginate,
+    plan_pages,
+)
+
+SEEDS = range(100)
+
+
+def _word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyzé→") for _ in range(rng.randint(1, 12)))
+
+
+def _line(rng, long=False):
+    if long and rng.random() < 0.5:
+        return "x" * rng.randint(300, 3000)  # nowhere to break
+    return " ".join(_word(rng) for _ in range(rng.randint(0, 400 if long else 25)))
+
+
+def _document(rng, fences=True, long_lines=True):
+    lines = []
+    for _ in range(rng.randint(0, 120)):
+        roll = rng.random()
+        if fences and roll < 0.1:
+            ticks = "`" * rng.choice((3, 3, 3, 4))
+            lines.append(ticks + rng.choice(("", "python", "json", "bash")))
+            lines.extend("    " + _line(rng, long=long_lines and rng.random() < 0.05)
+                         for _ in range(rng.randint(0, 60)))
+            lines.append(ticks)
+        elif roll < 0.25:
+            lines.append(f"{rng.choice('-*')} {_line(rng)}")
+        elif roll < 0.35:
+            lines.append("")
+        else:
+            lines.append(_line(rng, long=long_lines and rng.random() < 0.05))
+    return "\n".join(lines)
+
+
+def _split_code(text):
+    """(code, prose): the non-whitespace characters inside and outside code fences, fence lines left out."""
+    code, prose = [], []
+    fence = None
+    for line in text.split("\n"):
+        after = open_fence(line + "\n", 0, None, fence)
+        if line.lstrip().startswith("```") and after != fence:
+            fence = after
+            continue
+        (code if fence else prose).append("".join(line.split()))
+    return "".join(code), "".join(prose)
+
+
+def test_pages_fit_and_keep_every_character_in_place():
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        text = _document(rng)
+        limit = rng.choice((200, 500, 1000, DISCORD_MESSAGE_LIMIT))
+        pages = paginate(text, limit)
+        assert all(0 < len(page) <= limit for page in pages), seed
+        assert all(page == page.strip() for page in pages), seed
+        # Every page closes what it opens, so each renders on its own.
+        assert all(open_fence(page) is None for page in pages), seed
+        # Nothing is lost or reordered, and code stays code: re-split per page, the
+        # characters inside and outside fences match the original's.
+        per_page = [_split_code(page) for page in pages]
+        assert "".join(c for c, _ in per_page) == _split_code(text)[0], seed
+        assert "".join(p for _, p in per_page) == _split_code(text)[1], seed
+
+
+def test_pages_are_packed_tightly():
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        text = "\n".join(line for line in _document(rng, fences=False, long_lines=False).split("\n") if line)
+        limit = rng.choice((500, 1000, DISCORD_MESSAGE_LIMIT))
+        pages = paginate(text, limit)
+        for page, following in zip(pages, pages[1:]):
+            # The next page's first line did not fit on this one.
+            assert len(page) + 1 + len(following.split("\n", 1)[0]) > limit, seed
+
+
+def test_reopened_fence_keeps_its_info_string():
+    code = "\n".join(f"print({i})" for i in range(300))
+    pages = paginate(f"Here you go:\n```python\n{code}\n```\nDone.", 500)
+    assert len(pages) > 2
+    assert pages[0].startswith("Here you go:\n```python\n") and pages[0].endswith("\n```")
+    for page in pages[1:-1]:
+        assert page.startswith("```python\nprint(") and page.endswith("\n```")
+    assert pages[-1].endswith("```\nDone.")
+
+
+def test_short_content_is_one_page_as_is():
+    assert paginate("  hello\n```\nunclosed  ") == ["hello\n```\nunclosed"]
+    assert paginate(" \n ") == [] and paginate(None) == []
+
+
+def test_long_replies_become_one_attachment():
+    rng = random.Random(7)
+    text = _document(rng) * 5
+    assert len(paginate(text)) > 5
+    pages = plan_pages(text, max_pages=5)
+    assert len(pages) == 1
+    assert pages[0].attachment == text.strip()
+    assert len(pages[0].content) <= DISCORD_MESSAGE_LIMIT and ATTACHMENT_FILENAME in pages[0].content
+    assert pages[0].file().filename == ATTACHMENT_FILENAME
+
+    assert [page.content for page in plan_pages(text, max_pages=0)] == paginate(text)
+    assert all(page.attachment is None for page in plan_pages("short", max_pages=1))
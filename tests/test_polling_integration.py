@@ -11,6 +11,7 @@ Exit 0 = PASS, Exit 1 = FAIL
 import json, os, subprocess, sys, time
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from src.db.database import ensure_schema
 from src.db.queries import create_context, insert_message, add_message_to_context
 
 GEMINI_CMD = os.environ.get("GEMINI_CLI_CMD", "gemini")
@@ -25,6 +26,7 @@ PROMPT = (
 
 def main():
     # Set up a DB context so the script has something to query
+    ensure_schema()
     ctx = create_context(reply_channel_id=0)
     msg = insert_message("user", PROMPT, "user")
     add_message_to_context(ctx, msg["id"])
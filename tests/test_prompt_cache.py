@@ -0,0 +1,137 @@
+"""
+Tests for the prompt component cache, build_prompt_text's use of it and
+session-aware rule deltas.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+
+from src.app import prompt_cache, runner
+from src.app.prompt_cache import PromptComponentCache
+from src.db import queries
+
+
+def _write(path, text, mtime=None):
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_assembles_sorted_markdown_components(tmp_path):
+    _write(tmp_path / "b.md", "second\n")
+    _write(tmp_path / "a.md", "  first  ")
+    _write(tmp_path / "notes.txt", "ignored")
+    rules = PromptComponentCache(str(tmp_path), check_interval=0).get()
+    assert rules.text == "first\nsecond"
+    assert rules.files == ("a.md", "b.md")
+    assert rules.sha256 == hashlib.sha256(b"first\nsecond").hexdigest()
+    assert rules.size == len("first\nsecond")
+
+
+def test_rebuilds_only_on_change(tmp_path):
+    _write(tmp_path / "a.md", "one", mtime=1_000_000_000)
+    cache = PromptComponentCache(str(tmp_path), check_interval=0)
+    first = cache.get()
+    assert cache.get() is first
+    assert cache.builds == 1
+
+    _write(tmp_path / "a.md", "two", mtime=2_000_000_000)  # edited in place
+    assert cache.get().text == "two"
+    _write(tmp_path / "b.md", "three")  # added
+    assert cache.get().text == "two\nthree"
+    os.remove(tmp_path / "a.md")  # removed
+    assert cache.get().text == "three"
+    assert cache.builds == 4
+
+
+def test_check_interval_shares_result(tmp_path):
+    _write(tmp_path / "a.md", "one")
+    cache = PromptComponentCache(str(tmp_path), check_interval=3600)
+    first = cache.get()
+    _write(tmp_path / "b.md", "two")
+    assert cache.get() is first  # not re-checked yet
+    cache.invalidate()
+    assert cache.get().text == "one\ntwo"
+
+
+def test_concurrent_gets_build_once(tmp_path):
+    for i in range(20):
+        _write(tmp_path / f"{i:02d}.md", f"rule {i}")
+    cache = PromptComponentCache(str(tmp_path), check_interval=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.builds == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_missing_directory_is_empty(tmp_path):
+    rules = PromptComponentCache(str(tmp_path / "nope"), check_interval=0).get()
+    assert (rules.text, rules.files) == ("", ())
+
+
+def test_build_prompt_text_uses_components(tmp_path, monkeypatch):
+    _write(tmp_path / "rules.md", "Be helpful.")
+    monkeypatch.setattr(prompt_cache, "PROMPT_COMPONENTS_DIR", str(tmp_path))
+    prompt = runner.build_prompt_text({"content": "hi", "timestamp": 5.0}, "ctx", ignore_history=True)
+    assert prompt == (
+        "Be helpful.\n---\nIMPORTANT: The current turn started at timestamp 5.0.\nLatest user message:\nhi"
+    )
+
+
+def test_session_rules_unchanged_delta_and_unknown(tmp_path):
+    _write(tmp_path / "a.md", "# Tone\nBe brief. " * 20, mtime=1_000_000_000)
+    _write(tmp_path / "b.md", "# Tools\nUse tools. " * 20, mtime=1_000_000_000)
+    _write(tmp_path / "c.md", "# Old\nGoing away.", mtime=1_000_000_000)
+    cache = PromptComponentCache(str(tmp_path), check_interval=0)
+    seeded = cache.get()
+
+    assert cache.session_rules(seeded.sha256) == ("", seeded)
+    assert cache.session_rules(None)[0] == seeded.text  # session from before hashes were tracked
+    assert cache.session_rules("f" * 64)[0] == seeded.text  # version this process never built
+
+    _write(tmp_path / "b.md", "# Tools\nNever use tools.", mtime=2_000_000_000)
+    os.remove(tmp_path / "c.md")
+    delta, current = cache.session_rules(seeded.sha256)
+    assert current.sha256 != seeded.sha256
+    assert "Never use tools." in delta and "Be brief." not in delta
+    assert "no longer apply: Old" in delta
+    assert cache.session_rules(current.sha256)[0] == ""
+
+
+def test_resumed_turns_send_only_new_rules(tmp_path, monkeypatch):
+    stub_cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_gemini_cli.py")
+    components = tmp_path / "components"
+    components.mkdir()
+    _write(components / "rules.md", "Follow the house rules. " * 100)
+    monkeypatch.setattr(prompt_cache, "PROMPT_COMPONENTS_DIR", str(components))
+    monkeypatch.setattr(runner, "GEMINI_TRACES_DIR", str(tmp_path / "traces"))
+    monkeypatch.setattr(runner, "GEMINI_RESPONSES_LOG", str(tmp_path / "responses.log"))
+    rules = prompt_cache.prompt_rules()
+
+    ctx = queries.create_context(reply_channel_id=8601)
+    message = queries.insert_message("alice", "hello", "user", timestamp=1000.0)
+    queries.add_message_to_context(ctx, message["id"])
+
+    async def turn():
+        events = [e async for e in runner.run_next_turn(message, ctx, gemini_cmd=stub_cli)]
+        reply = "".join(e.content for e in events if e.type == "text")
+        return int(reply.split("prompt_chars=")[1].split()[0])
+
+    cold = asyncio.run(turn())
+    assert cold > len(rules.text)
+    assert queries.get_context(ctx)["prompt_rules_hash"] == rules.sha256
+
+    resumed = asyncio.run(turn())
+    assert resumed < cold - len(rules.text) + 10
+
+    queries.update_context_session_id(ctx, "invalid", rules.sha256)
+    assert asyncio.run(turn()) == cold  # invalid session: cold start with the full rules
+    assert queries.get_context(ctx)["prompt_rules_hash"] == rules.sha256
+
+    queries.update_context_session_id(ctx, None, rules.sha256)
+    assert queries.get_context(ctx)["prompt_rules_hash"] is None
@@ -0,0 +1,88 @@
+"""
+Tests for StreamingReplyBuffer's incremental paging of streamed replies.
+"""
+import random
+
+from src.app.paginator import open_fence
+from src.app.reply_buffer import NEW_MESSAGE_MARKER, StreamingReplyBuffer
+
+
+def _stream(text, chunk_sizes, **kwargs):
+    buffer = StreamingReplyBuffer(**kwargs)
+    pages = []
+    pos = 0
+    sizes = iter(chunk_sizes)
+    while pos < len(text):
+        size = next(sizes)
+        pages.extend(buffer.append(text[pos:pos + size]))
+        pos += size
+    pages.extend(buffer.finish())
+    return pages + [buffer.current()], buffer
+
+
+def _reply(rng, length):
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        roll = rng.random()
+        if roll < 0.01:
+            words.append(NEW_MESSAGE_MARKER)
+        elif roll < 0.08:
+            words.append("\n")
+        elif roll < 0.09:
+            words.append("\n```\n")  # opens or closes a code block
+        else:
+            words.append("w" * rng.randint(1, 12))
+    return " ".join(words)
+
+
+def test_marker_splits_even_across_chunks():
+    text = f"first part{NEW_MESSAGE_MARKER}second part"
+    for cut in range(1, len(text)):
+        pages, _ = _stream(text, [cut, len(text)])
+        assert pages == ["first part", "second part"]
+
+
+def test_overflow_splits_at_newline_near_the_limit():
+    text = "a" * 90 + "\n" + "b" * 50
+    pages, _ = _stream(text, [7] * 100, page_limit=100)
+    assert pages == ["a" * 90, "b" * 50]
+    pages, _ = _stream("c" * 250, [7] * 100, page_limit=100)
+    assert pages == ["c" * 100, "c" * 100, "c" * 50]
+
+
+def test_paging_does_not_depend_on_chunking():
+    rng = random.Random(2024)
+    for _ in range(30):
+        text = _reply(rng, rng.randint(0, 3000))
+        whole, _ = _stream(text, [len(text) or 1], page_limit=200)
+        chunked, buffer = _stream(text, [rng.randint(1, 40) for _ in range(len(text) + 1)],
+                                  page_limit=200)
+        assert chunked == whole
+        assert all(len(page) <= 200 for page in chunked)
+        assert all(open_fence(page) is None for page in chunked[:-1])  # committed pages are closed
+        assert buffer.text() == text.replace(NEW_MESSAGE_MARKER, "").strip()
+        # Nothing is lost: pages hold every non-whitespace character, in order (fences
+        # closed and re-opened at page breaks aside).
+        def visible(s):
+            return "".join(s.replace("`", "").split())
+        assert visible("".join(chunked)) == visible(text.replace(NEW_MESSAGE_MARKER, ""))
+
+
+def test_committed_tracks_progress():
+    buffer = StreamingReplyBuffer(page_limit=50)
+    assert buffer.append("x" * 40) == []
+    assert buffer.committed == 0 and len(buffer) == 40
+    assert buffer.append("y" * 40 + NEW_MESSAGE_MARKER) == ["x" * 40 + "y" * 10, "y" * 30]
+    assert buffer.committed == 80 + len(NEW_MESSAGE_MARKER)
+    assert buffer.append("z") == [] and buffer.finish() == []
+    assert buffer.current() == "z" and buffer.pages == 2
+
+
+def test_code_fence_is_reopened_on_the_next_page():
+    code = "\n".join(f"x = {i}" for i in range(60))
+    text = f"Code:\n```python\n{code}\n```\nAfter{NEW_MESSAGE_MARKER}Next"
+    pages, _ = _stream(text, [5] * 1000, page_limit=200)
+    assert len(pages) > 3 and all(len(page) <= 200 for page in pages)
+    assert pages[0].startswith("Code:\n```python\n") and pages[0].endswith("\n```")
+    assert all(page.startswith("```python\nx = ") for page in pages[1:-2])
+    assert pages[-2].endswith("```\nAfter") and pages[-1] == "Next"
@@ -0,0 +1,100 @@
+"""
+Tests for DiscordResolver: LRU bounds, TTL expiry, negative caching of 404s
+and coalescing of concurrent fetches.
+"""
+import asyncio
+
+import discord
+
+from src.app.resolver import DiscordResolver
+
+
+class FakeClient:
+    def __init__(self, missing=(), delay=0.0):
+        self.missing = set(missing)
+        self.delay = delay
+        self.fetches = []
+
+    def get_channel(self, channel_id):
+        return None  # force the REST path
+
+    def get_user(self, user_id):
+        return None
+
+    async def fetch_channel(self, channel_id):
+        self.fetches.append(("channel", channel_id))
+        await asyncio.sleep(self.delay)
+        if channel_id in self.missing:
+            raise discord.NotFound(type("Resp", (), {"status": 404, "reason": "Not Found"})(), "Unknown Channel")
+        return f"channel-{channel_id}"
+
+    async def fetch_user(self, user_id):
+        self.fetches.append(("user", user_id))
+        return f"user-{user_id}"
+
+
+def test_concurrent_lookups_share_one_fetch():
+    client = FakeClient(delay=0.05)
+    resolver = DiscordResolver(client)
+
+    async def scenario():
+        return await asyncio.gather(*(resolver.channel(7) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert results == ["channel-7"] * 10
+    assert client.fetches == [("channel", 7)]
+    assert resolver.stats()["misses"] == 1
+    assert resolver.stats()["coalesced"] == 9
+
+
+def test_hits_expire_after_ttl():
+    client = FakeClient()
+    resolver = DiscordResolver(client, ttl=0.05)
+
+    async def scenario():
+        await resolver.user(1)
+        await resolver.user(1)
+        await asyncio.sleep(0.06)
+        await resolver.user(1)
+
+    asyncio.run(scenario())
+    assert client.fetches == [("user", 1), ("user", 1)]
+    assert resolver.stats()["hits"] == 1
+
+
+def test_lru_evicts_least_recently_used():
+    client = FakeClient()
+    resolver = DiscordResolver(client, max_entries=2)
+
+    async def scenario():
+        await resolver.channel(1)
+        await resolver.channel(2)
+        await resolver.channel(1)  # 1 is now most recent
+        await resolver.channel(3)  # evicts 2
+        await resolver.channel(1)
+        await resolver.channel(2)
+
+    asyncio.run(scenario())
+    assert client.fetches.count(("channel", 1)) == 1
+    assert client.fetches.count(("channel", 2)) == 2
+    assert resolver.stats()["evictions"] >= 1
+
+
+def test_404s_are_negatively_cached():
+    client = FakeClient(missing={404})
+    resolver = DiscordResolver(client, negative_ttl=60)
+
+    async def scenario():
+        return [await resolver.channel(404) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [None, None, None]
+    assert client.fetches == [("channel", 404)]
+    assert resolver.stats()["negative_hits"] == 2
+
+
+def test_remember_seeds_the_cache():
+    client = FakeClient()
+    resolver = DiscordResolver(client)
+    resolver.remember("channel", 55, "new-thread")
+    assert asyncio.run(resolver.channel(55)) == "new-thread"
+    assert client.fetches == []
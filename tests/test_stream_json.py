@@ -0,0 +1,48 @@
+"""
+Tests for the stream-json helpers: incremental line scanning, the JSON
+backend and the prompt-echo filter.
+"""
+import json
+
+import pytest
+
+from src.app.stream_json import JsonlScanner, PromptEchoFilter, loads
+
+
+def test_scanner_handles_lines_split_across_and_packed_into_chunks():
+    events = [{"type": "message", "content": f"part {i} é"} for i in range(50)]
+    stream = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events).encode("utf-8")
+
+    for size in (1, 7, 64, len(stream)):
+        scanner = JsonlScanner()
+        lines = []
+        for start in range(0, len(stream), size):
+            lines.extend(scanner.feed(stream[start:start + size]))
+        assert scanner.flush() is None
+        assert [loads(line) for line in lines] == events
+
+
+def test_scanner_keeps_unterminated_tail_until_flush():
+    scanner = JsonlScanner()
+    assert scanner.feed(b'{"a": 1}\n{"b"') == [b'{"a": 1}']
+    assert scanner.pending == 4
+    assert scanner.feed(b": 2}") == []
+    assert scanner.feed(b"\n\n") == [b'{"b": 2}', b""]
+    scanner.feed(b"tail")
+    assert scanner.flush() == b"tail"
+    assert scanner.flush() is None
+
+
+def test_loads_rejects_bad_json_with_value_error():
+    with pytest.raises(ValueError):
+        loads(b"not json")
+
+
+def test_echo_filter_matches_only_the_stripped_prompt():
+    prompt = "  rules...\nLatest user message:\nhello  \n"
+    echo = PromptEchoFilter(prompt)
+    assert echo.matches("rules...\nLatest user message:\nhello")
+    assert echo.matches("\n" + prompt + "\n")
+    assert not echo.matches("hello")
+    assert not echo.matches("rules...\nLatest user message:\nhellO")
+    assert not echo.matches(prompt + " and more")
@@ -0,0 +1,113 @@
+"""
+Tests for the segment-based trace store and its CLI.
+"""
+import gzip
+import os
+import time
+
+from bin import traces as traces_cli
+from src.app.trace_store import TraceStore
+
+
+def _segments(store):
+    return sorted(os.listdir(store.segments_dir))
+
+
+def test_add_and_read_back_by_context(tmp_path):
+    store = TraceStore(str(tmp_path))
+    store.add("ctx-a", 100.0, b'[{"type": "init"}]')
+    store.add("ctx-b", 101.0, b"other")
+    store.add("ctx-a", 102.0, b"second")
+
+    assert [data for _, data in store.iter_traces("ctx-a")] == [b'[{"type": "init"}]', b"second"]
+    assert [data for _, data in store.iter_traces("ctx-a", since=101.0)] == [b"second"]
+    assert [data for _, data in store.iter_traces("ctx-a", limit=1)] == [b"second"]
+    assert len(_segments(store)) == 1
+
+    # Members are independent gzip streams: the segment is still valid as a whole.
+    with gzip.open(os.path.join(store.segments_dir, _segments(store)[0])) as f:
+        assert f.read() == b'[{"type": "init"}]othersecond'
+    store.close()
+
+
+def test_segments_roll_at_size_limit(tmp_path):
+    store = TraceStore(str(tmp_path), segment_bytes=200)
+    for i in range(20):
+        store.add("ctx", float(i), os.urandom(64))
+    assert len(_segments(store)) > 1
+    assert len(list(store.iter_traces("ctx"))) == 20
+    store.close()
+
+
+def test_add_file_ingests_and_removes(tmp_path):
+    store = TraceStore(str(tmp_path))
+    path = tmp_path / "ctx_1000.json"
+    path.write_bytes(b"trace")
+    store.submit(str(path), "ctx", 1.0)
+    store.submit(str(tmp_path / "missing.json"), "ctx", 2.0)  # CLI never wrote it: ignored
+    store.flush()
+    assert not path.exists()
+    assert [(row["turn_ts"], data) for row, data in store.iter_traces("ctx")] == [(1.0, b"trace")]
+    store.close()
+
+
+def test_import_loose_files_skips_pool_files(tmp_path):
+    (tmp_path / "123_456_1700000000000.json").write_bytes(b"loose")
+    (tmp_path / "pool_1234.json").write_bytes(b"warm process, not a turn")
+    store = TraceStore(str(tmp_path))
+    assert store.import_loose_files() == 1
+    rows = store.list("123_456")
+    assert [row["turn_ts"] for row in rows] == [1700000000.0]
+    assert (tmp_path / "pool_1234.json").exists()
+    store.close()
+
+
+def test_prune_by_age_and_size(tmp_path):
+    store = TraceStore(str(tmp_path), segment_bytes=100, retention_days=1, max_bytes=10 ** 9)
+    for i in range(6):
+        store.add(f"ctx-{i}", float(i), os.urandom(80))
+    segments = _segments(store)
+    assert len(segments) == 6
+    old = time.time() - 3 * 86400
+    for name in segments[:2]:
+        os.utime(os.path.join(store.segments_dir, name), (old, old))
+
+    assert store.prune() == 2
+    assert store.list("ctx-0") == [] and store.list("ctx-1") == []
+
+    store.max_bytes = 1
+    assert store.prune() == 3  # everything but the segment still being written
+    assert _segments(store) == [store._segment]
+    assert len(store.list("ctx-5")) == 1
+    store.close()
+
+
+def test_prune_from_another_process_skips_the_open_segment(tmp_path):
+    bot = TraceStore(str(tmp_path), max_bytes=1)
+    bot.add("ctx-live", 1.0, os.urandom(80))
+    cli = TraceStore(str(tmp_path), max_bytes=1)  # bin/traces.py prune, while the bot is up
+    assert cli.prune() == 0
+    assert _segments(cli) == [bot._segment]
+    bot.add("ctx-live", 2.0, b"still appending")
+    assert len(list(cli.iter_traces("ctx-live"))) == 2
+
+    bot.close()  # closing the store releases the segment
+    assert cli.prune() == 1
+    cli.close()
+
+
+def test_sample_rate(tmp_path):
+    assert TraceStore(str(tmp_path), sample_rate=1).should_record()
+    assert not TraceStore(str(tmp_path), sample_rate=0).should_record()
+
+
+def test_cli_cat_and_list(tmp_path, capsys):
+    store = TraceStore(str(tmp_path))
+    store.add("ctx", 10.0, b"first")
+    store.add("ctx", 20.0, b"second")
+    store.close()
+
+    traces_cli.main(["--dir", str(tmp_path), "cat", "ctx", "--last", "1"])
+    assert capsys.readouterr().out == "second\n"
+    traces_cli.main(["--dir", str(tmp_path), "list", "ctx"])
+    assert len(capsys.readouterr().out.splitlines()) == 2
@@ -0,0 +1,168 @@
+"""
+Tests for the durable pending_turns queue: enqueue, lease, heartbeat,
+completion and recovery from a crashed lease holder.
+"""
+import threading
+
+import pytest
+
+from src.db import notify, queries
+from src.db.database import get_db
+
+
+@pytest.fixture(autouse=True)
+def empty_turn_queue():
+    with get_db() as conn:
+        conn.execute("DELETE FROM pending_turns")
+        conn.execute("UPDATE contexts SET status = 'idle', current_pid = NULL")
+    yield
+
+
+def test_triggered_ingest_enqueues_one_turn_per_context():
+    first = queries.ingest_user_message("alice", "hi", channel_id=9001, trigger=True)
+    queries.ingest_user_message("alice", "again", channel_id=9001, trigger=True)
+    turn = queries.get_pending_turn(first["context_id"])
+    assert turn is not None and turn["lease_expires_at"] is None
+    with get_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM pending_turns").fetchone()[0] == 1
+
+    silent = queries.ingest_user_message("bob", "chatter", channel_id=9002)
+    assert queries.get_pending_turn(silent["context_id"]) is None
+
+
+def test_enqueue_wakes_listeners_after_commit():
+    woken = []
+    notify.add_turn_listener(woken.append)
+    try:
+        ctx = queries.create_context(reply_channel_id=9003)
+        with get_db():
+            assert queries.enqueue_turn(ctx)
+            assert woken == []  # not visible to other connections yet
+        assert woken == [ctx]
+        assert not queries.enqueue_turn(ctx)
+        assert woken == [ctx]
+    finally:
+        notify.remove_turn_listener(woken.append)
+
+
+def test_claim_leases_oldest_turn_and_marks_context_running():
+    older = queries.create_context(reply_channel_id=9004)
+    newer = queries.create_context(reply_channel_id=9005)
+    queries.enqueue_turn(newer, now=200.0)
+    queries.enqueue_turn(older, now=100.0)
+
+    turn = queries.claim_turn(owner_pid=111, lease_seconds=60)
+    assert turn["context_id"] == older
+    assert turn["attempts"] == 1
+    ctx = queries.get_context(older)
+    assert (ctx["status"], ctx["current_pid"]) == ("running", 111)
+
+    assert queries.claim_turn(owner_pid=222, lease_seconds=60)["context_id"] == newer
+    assert queries.claim_turn(owner_pid=222, lease_seconds=60) is None
+
+
+def test_complete_removes_turn_only_for_the_owner():
+    ctx = queries.create_context(reply_channel_id=9006)
+    queries.enqueue_turn(ctx)
+    queries.claim_turn(owner_pid=111, lease_seconds=60)
+
+    assert not queries.complete_turn(ctx, owner_pid=222)
+    assert queries.get_pending_turn(ctx) is not None
+    assert queries.complete_turn(ctx, owner_pid=111)
+    assert queries.get_pending_turn(ctx) is None
+    assert queries.get_context(ctx)["status"] == "idle"
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_is_fenced_off():
+    ctx = queries.create_context(reply_channel_id=9007)
+    queries.enqueue_turn(ctx, now=0.0)
+    queries.claim_turn(owner_pid=111, lease_seconds=10, now=1000.0)
+
+    assert queries.claim_turn(owner_pid=222, lease_seconds=10, now=1005.0) is None
+    turn = queries.claim_turn(owner_pid=222, lease_seconds=10, now=1011.0)
+    assert turn["context_id"] == ctx and turn["attempts"] == 2
+
+    assert not queries.heartbeat_turn(ctx, owner_pid=111, lease_seconds=10)
+    assert queries.heartbeat_turn(ctx, owner_pid=222, lease_seconds=10)
+    assert not queries.complete_turn(ctx, owner_pid=111)
+
+
+def test_turn_is_dropped_after_max_attempts():
+    ctx = queries.create_context(reply_channel_id=9008)
+    queries.enqueue_turn(ctx, now=0.0)
+    for attempt in range(2):
+        assert queries.claim_turn(owner_pid=111, lease_seconds=10, max_attempts=2, now=attempt * 100.0)
+    assert queries.claim_turn(owner_pid=111, lease_seconds=10, max_attempts=2, now=500.0) is None
+    assert queries.get_pending_turn(ctx) is None
+
+
+def test_release_expired_leases_idles_orphaned_running_contexts():
+    leased = queries.create_context(reply_channel_id=9009)
+    orphan = queries.create_context(reply_channel_id=9010)
+    queries.enqueue_turn(leased)
+    queries.claim_turn(owner_pid=111, lease_seconds=60)
+    with get_db() as conn:
+        conn.execute("UPDATE contexts SET status = 'running', current_pid = 999 WHERE id = ?", (orphan,))
+
+    assert queries.release_expired_turn_leases() == 1
+    assert queries.get_context(orphan)["status"] == "idle"
+    assert queries.get_context(leased)["status"] == "running"
+
+
+def test_concurrent_claims_hand_out_each_turn_once():
+    contexts = [queries.create_context(reply_channel_id=9100 + i) for i in range(20)]
+    for ctx in contexts:
+        queries.enqueue_turn(ctx)
+
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(pid):
+        while True:
+            turn = queries.claim_turn(owner_pid=pid, lease_seconds=60)
+            if turn is None:
+                return
+            with lock:
+                claimed.append(turn["context_id"])
+
+    threads = [threading.Thread(target=worker, args=(1000 + i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(contexts)
+
+
+def test_priority_lane_is_claimed_first_and_waiting_rows_can_be_promoted():
+    normal = queries.create_context(reply_channel_id=9201)
+    dm = queries.create_context(reply_channel_id=9202)
+    queries.enqueue_turn(normal, user_key="alice", now=100.0)
+    queries.enqueue_turn(dm, user_key="bob", priority=queries.TURN_PRIORITY_HIGH, now=200.0)
+    stats = queries.get_turn_queue_stats()
+    assert (stats["queued_high"], stats["queued_normal"], stats["running"]) == (1, 1, 0)
+    assert stats["oldest_enqueued_at"] == 100.0
+
+    assert queries.claim_turn(owner_pid=111, lease_seconds=60)["context_id"] == dm
+    later = queries.create_context(reply_channel_id=9203)
+    queries.enqueue_turn(later, user_key="carol", now=300.0)
+    queries.enqueue_turn(later, user_key="carol", priority=queries.TURN_PRIORITY_HIGH)
+    assert queries.claim_turn(owner_pid=111, lease_seconds=60)["context_id"] == later
+
+
+def test_user_with_fewest_running_turns_goes_next():
+    alice = [queries.create_context(reply_channel_id=9210 + i) for i in range(3)]
+    bob = queries.create_context(reply_channel_id=9220)
+    for i, ctx in enumerate(alice):
+        queries.enqueue_turn(ctx, user_key="alice", now=100.0 + i)
+    queries.enqueue_turn(bob, user_key="bob", now=200.0)
+
+    order = [queries.claim_turn(owner_pid=111, lease_seconds=60)["context_id"] for _ in range(4)]
+    # alice's first turn is oldest; then bob (0 running) beats alice's backlog.
+    assert order == [alice[0], bob, alice[1], alice[2]]
+    assert queries.get_turn_queue_stats()["running"] == 4
+
+
+def test_dm_ingest_uses_priority_lane():
+    result = queries.ingest_user_message("dave", "hey", channel_id=9230, trigger=True, dm=True)
+    turn = queries.get_pending_turn(result["context_id"])
+    assert (turn["priority"], turn["user_key"]) == (queries.TURN_PRIORITY_HIGH, "dave")
@@ -0,0 +1,68 @@
+"""
+Tests for TurnScheduler: the concurrency cap, refilling freed slots and
+queue-wait stats, using an in-memory stand-in for claim_turn.
+"""
+import asyncio
+
+from src.app.scheduler import TurnScheduler
+
+
+def _rows(n):
+    return [{"context_id": f"c{i}", "enqueued_at": 0.0, "claimed_at": float(i)} for i in range(n)]
+
+
+def test_never_runs_more_than_max_concurrent_and_refills_freed_slots():
+    async def scenario():
+        queued = _rows(10)
+        running = 0
+        peak = 0
+        done = []
+
+        async def claim():
+            return queued.pop(0) if queued else None
+
+        async def run(row):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            done.append(row["context_id"])
+
+        scheduler = TurnScheduler(claim, run, max_concurrent=3)
+        assert await scheduler.fill() == 3
+        assert await scheduler.fill() == 0  # every slot is busy
+        while len(done) < 10:
+            await scheduler.drain()
+            await asyncio.sleep(0)
+        return scheduler, peak, done
+
+    scheduler, peak, done = asyncio.run(scenario())
+    assert peak == 3
+    assert sorted(done) == sorted(f"c{i}" for i in range(10))
+    stats = scheduler.stats()
+    assert (stats["started"], stats["completed"], stats["failed"]) == (10, 10, 0)
+    assert stats["wait_max"] == 9.0
+    assert stats["wait_p50"] == 5.0
+
+
+def test_failed_turn_frees_its_slot():
+    async def scenario():
+        queued = _rows(2)
+
+        async def claim():
+            return queued.pop(0) if queued else None
+
+        async def run(row):
+            if row["context_id"] == "c0":
+                raise RuntimeError("cli crashed")
+
+        scheduler = TurnScheduler(claim, run, max_concurrent=1)
+        await scheduler.fill()
+        for _ in range(5):
+            await scheduler.drain()
+            await asyncio.sleep(0)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["started"], stats["completed"], stats["failed"]) == (2, 1, 1)